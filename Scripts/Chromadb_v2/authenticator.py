@@ -1,7 +1,13 @@
 import os
-import time
 from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright
+import sys
+
+# The session store lives with the ingestion scripts
+# Appended, not prepended, so the Chromadb_v2 modules next to this file win over
+# the backend copies with the same name (authenticator, ingest_to_cerebro_collection_VDS_v2)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend", "scripts")))
+from session_store import load_session, save_session, clear_session, is_login_url
 
 # Load credentials from .env
 load_dotenv()
@@ -14,6 +20,13 @@ PASSWORD = os.getenv("PASSWORD")
 
 BASE_URL = "https://brandcentral.verizonwireless.com/signin"
 ENTERPRISE_LOGIN_URL = "https://ilogin.verizon.com/ngauth/verifyusercontroller?method=validateuser"
+# Each step waits for the element the next step needs instead of sleeping a fixed time
+STEP_TIMEOUT = 30000  # ms
+EMPLOYEES_BUTTON = "//*[@id='bc-root']/main/div[2]/div[1]/button"
+# Logged-in sessions are saved here and reused until they stop working
+SESSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "cache", "playwright_session.json")
+SESSION_CHECK_URL = "https://brandcentral.verizonwireless.com"
+SESSION_DOMAINS = ["verizon.com", "verizonwireless.com"]
 
 
 def login_to_verizon_with_playwright(playwright):
@@ -25,23 +38,19 @@ def login_to_verizon_with_playwright(playwright):
     try:
         # Step 1: Navigate to login page
         print(f"Navigating to {BASE_URL}...")
-        page.goto(BASE_URL)
-        page.wait_for_load_state("networkidle")
-        time.sleep(3)
+        page.goto(BASE_URL, wait_until="domcontentloaded")
 
         # Step 2: Click "Verizon Employees" button
         print("Clicking 'Verizon Employees' button...")
-        page.locator("//*[@id='bc-root']/main/div[2]/div[1]/button").click()
-        page.wait_for_load_state("networkidle")
-        time.sleep(3)
+        page.locator(EMPLOYEES_BUTTON).click(timeout=STEP_TIMEOUT)
 
 
         # Step 3: Enter User Name and Password
         print("Entering USER Name and Pass..")
-        page.fill("#idToken1", USER_ID)
+        page.fill("#idToken1", USER_ID, timeout=STEP_TIMEOUT)
         page.fill("#idToken2", PASSWORD)
-        page.click("#loginButton_0")
-        time.sleep(3)
+        with page.expect_navigation(timeout=STEP_TIMEOUT):
+            page.click("#loginButton_0")
 
         # # Step 3: Enter Last Name and User ID
         # print("Entering Last Name and User ID...")
@@ -81,10 +90,48 @@ def login_to_verizon_with_playwright(playwright):
 
     except Exception as e:
         print(f"Error during login: {e}")
-        context.close()
+        browser.close()
+        return None
+
+
+def session_is_valid(playwright, storage_state):
+    """Open SESSION_CHECK_URL with a saved session and check it is not sent back to a login page."""
+    browser = playwright.chromium.launch(headless=True)
+    try:
+        context = browser.new_context(storage_state=storage_state)
+        page = context.new_page()
+        page.goto(SESSION_CHECK_URL, wait_until="domcontentloaded", timeout=STEP_TIMEOUT)
+        return not is_login_url(page.url)
+    except Exception as e:
+        print(f"Error checking saved session: {e}")
+        return False
+    finally:
+        browser.close()
+
+
+def get_authenticated_state(playwright, session_file=SESSION_FILE, force_login=False):
+    """
+    Return the storage_state of a logged-in session, reusing the saved one while
+    it is valid and logging in again (and saving the new session) only when not.
+    :return: storage_state dict for browser.new_context(), or None if login failed.
+    """
+    if not force_login:
+        storage_state = load_session(session_file, SESSION_DOMAINS)
+        if storage_state and session_is_valid(playwright, storage_state):
+            print(f"Reusing saved session from {session_file}")
+            return storage_state
+        clear_session(session_file)
+
+    login = login_to_verizon_with_playwright(playwright)
+    if not login:
         return None
+    context, page = login
+    storage_state = context.storage_state()
+    context.browser.close()  # The headed browser the login launched
+    save_session(session_file, storage_state)
+    return storage_state
 
 
 if __name__ == "__main__":
     with sync_playwright() as playwright:
-        login_to_verizon_with_playwright(playwright)
+        get_authenticated_state(playwright)
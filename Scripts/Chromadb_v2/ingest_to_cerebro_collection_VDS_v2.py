@@ -1,6 +1,7 @@
 import os
+import sys
+import base64
 from pathlib import Path
-from PyPDF2 import PdfReader
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 # from langchain_chroma import Chroma
@@ -8,40 +9,61 @@ from langchain.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document  # Import Document object
 
+# Shared embedding cache and document parser live with the ingestion scripts
+# Appended, not prepended, so the Chromadb_v2 modules next to this file win over
+# the backend copies with the same name (authenticator, ingest_to_cerebro_collection_VDS_v2)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend", "scripts")))
+from embedding_cache import open_cache, close_cache, cache_stats, cached_langchain_embeddings, model_identifier
+from document_parser import parse_document, parse_documents, list_documents, HTML_EXTENSIONS
+
 # Configuration
-PDF_FOLDERS = ["../../data/converted_downloads_test", "../../data/pages_as_pdf_test"]
+# Scraped pages are read from their saved HTML; only downloaded documents are PDFs
+PDF_FOLDERS = ["../../data/converted_downloads_test"]
+HTML_FOLDERS = ["../../data/scraped_pages_test"]
 CHROMA_DB_DIR = "../../data/cerebro_chroma_db_v2"
 SENTENCE_MODEL_PATH = "../../models/all-mpnet-base-v2"
 CACHE_FOLDER = "../../cache"
 COLLECTION_NAME = "cerebro_vds_v2"
+MULTI_PROCESS = True  # Encode documents on one worker process per core
 
 
 def extract_text_from_pdf(pdf_path):
     """
     Extract text from a PDF file.
     """
-    try:
-        reader = PdfReader(pdf_path)
-        text = " ".join(page.extract_text() for page in reader.pages if page.extract_text())
-        return text
-    except Exception as e:
-        print(f"Error extracting text from {pdf_path}: {e}")
-        return None
+    record = parse_document(str(pdf_path))
+    return None if record["error"] else record["text"]
 
 
-def load_pdfs_from_folders(folders):
+def load_pdfs_from_folders(folders, processes=None):
     """
     Load all PDFs from the specified folders and format them correctly as Document objects.
+    PDFs are parsed on a worker pool.
+    """
+    documents = []
+    for record in parse_documents(list_documents(folders), processes):
+        print(f"Processing: {record['source']}")
+        if record["text"]:
+            # Create Document objects
+            documents.append(Document(page_content=record["text"], metadata={"source": record["source"]}))
+    return documents
+
+
+def load_html_pages(folders, processes=None):
+    """
+    Load saved HTML pages as Document objects, keeping only each page's main content.
     """
     documents = []
-    for folder in folders:
-        folder_path = Path(folder)
-        for pdf_file in folder_path.glob("*.pdf"):
-            print(f"Processing: {pdf_file}")
-            content = extract_text_from_pdf(pdf_file)
-            if content:
-                # Create Document objects
-                documents.append(Document(page_content=content, metadata={"source": str(pdf_file)}))
+    for record in parse_documents(list_documents(folders, HTML_EXTENSIONS), processes):
+        if not record["text"]:
+            continue
+        metadata = {"source": record["source"], "title": record["pages"][0].get("title", "")}
+        try:
+            # Scraped pages are saved under their base64 encoded URL
+            metadata["webpage"] = base64.urlsafe_b64decode(os.path.splitext(record["file_name"])[0]).decode()
+        except Exception:
+            pass
+        documents.append(Document(page_content=record["text"], metadata=metadata))
     return documents
 
 
@@ -64,21 +86,32 @@ def initialize_chroma_vectorstore(documents):
     # Ensure the ChromaDB directory exists
     os.makedirs(CHROMA_DB_DIR, exist_ok=True)
 
-    # Set up embedding model
-    embedding_model = HuggingFaceEmbeddings(
-        model_name=SENTENCE_MODEL_PATH, 
-        cache_folder=CACHE_FOLDER
+    # Set up embedding model. Chunks already in the embedding cache are not
+    # re-encoded, and the model is only loaded when one is missing.
+    cache = open_cache()
+    embedding_model = cached_langchain_embeddings(
+        lambda: HuggingFaceEmbeddings(
+            model_name=SENTENCE_MODEL_PATH,
+            cache_folder=CACHE_FOLDER,
+            multi_process=MULTI_PROCESS,
+        ),
+        model_identifier(SENTENCE_MODEL_PATH),
+        cache,
     )
 
     # Initialize Chroma vector store
-    vectorstore = Chroma.from_documents(
-        documents=documents,
-        embedding=embedding_model,
-        collection_name=COLLECTION_NAME,
-        persist_directory=CHROMA_DB_DIR,
-        collection_metadata={"hnsw:space":"cosine"}
-    )
-    vectorstore.persist()
+    try:
+        vectorstore = Chroma.from_documents(
+            documents=documents,
+            embedding=embedding_model,
+            collection_name=COLLECTION_NAME,
+            persist_directory=CHROMA_DB_DIR,
+            collection_metadata={"hnsw:space":"cosine"}
+        )
+        vectorstore.persist()
+    finally:
+        print(f"Embedding cache: {cache_stats(cache)}")
+        close_cache(cache)
     print(f"Vectorstore created and persisted at {CHROMA_DB_DIR}")
     return vectorstore
 
@@ -86,9 +119,9 @@ def initialize_chroma_vectorstore(documents):
 
 
 def main():
-    # Step 1: Load PDFs from the specified folders
-    print("Loading PDFs from folders...")
-    documents = load_pdfs_from_folders(PDF_FOLDERS)
+    # Step 1: Load scraped pages and PDFs from the specified folders
+    print("Loading pages and PDFs from folders...")
+    documents = load_html_pages(HTML_FOLDERS) + load_pdfs_from_folders(PDF_FOLDERS)
 
     if not documents:
         print("No documents found. Exiting.")
@@ -1,14 +1,15 @@
 import os
-import json
-from scraper_vds import scrape_site, load_progress_file, save_progress_file
+from scraper_vds import crawl_site, load_progress_file, save_progress_file, progress_exists
 from convert_to_pdf_vds import convert_to_pdf
-from authenticator import login_to_verizon_with_playwright
-from ingest_to_cerebro_collection_VDS_v2 import extract_text_from_pdf, initialize_chroma_vectorstore, load_pdfs_from_folders, chunk_documents
+from authenticator import get_authenticated_state, SESSION_FILE
+from ingest_to_cerebro_collection_VDS_v2 import extract_text_from_pdf, initialize_chroma_vectorstore, load_pdfs_from_folders, load_html_pages, chunk_documents
 from initialize_chroma_db_v2 import initialize_chroma_db
 from query_cerebro_chromadb_v2 import query_chroma_vds
 
 # Configuration
 LIMIT = 500  # Limit on the number of pages to scrape in each run
+CONCURRENCY = 4  # Pages scraped at the same time to start with; adapts to how fast the site responds
+RECRAWL = True  # Revisit scraped pages and refresh only the ones that changed
 DATA_DIR = "../../data/"
 CHROMA_DB_DIR = os.path.join(DATA_DIR, "cerebro_chroma_db_v2")
 PROGRESS_FILE = os.path.join(DATA_DIR, "progress_summary_vds_v2.json")
@@ -18,7 +19,10 @@ CONVERTED_DIR = os.path.join(DATA_DIR, "converted_downloads_test")
 
 
 COLLECTION_NAME = "cerebro_vds_v2"
-PDF_FOLDERS = ["../../data/converted_downloads_test", "../../data/pages_as_pdf_test"]
+# Scraped pages are ingested from their HTML; set RENDER_PDF to also keep a PDF copy of each page
+RENDER_PDF = False
+PDF_FOLDERS = ["../../data/converted_downloads_test"]
+HTML_FOLDERS = ["../../data/scraped_pages_test"]
 CHUNK_SIZE = 1000  # Adjust chunk size as needed
 LOCAL_MODEL_PATH = "../../models/all-mpnet-base-v2"  # Path to the locally downloaded model
 
@@ -29,7 +33,7 @@ os.makedirs(CONVERTED_DIR, exist_ok=True)
 os.makedirs(CHROMA_DB_DIR, exist_ok=True)
 
 # Check if PROGRESS_FILE exists, if not create a sample file with provided data
-if not os.path.exists(PROGRESS_FILE):
+if not progress_exists(PROGRESS_FILE):
     sample_data = [
         {
             "page_id": 1,
@@ -53,8 +57,7 @@ if not os.path.exists(PROGRESS_FILE):
             "saved_images_list": []
         }
     ]
-    with open(PROGRESS_FILE, 'w') as file:
-        json.dump(sample_data, file, indent=4)
+    save_progress_file(sample_data, PROGRESS_FILE)
     print(f"Sample progress file created at {PROGRESS_FILE}")
 
 
@@ -62,9 +65,9 @@ def ingest_documents_and_initialize_vectorstore():
     """
     Load PDFs, chunk documents, and initialize or update the ChromaDB vector store.
     """
-    # Step 1: Load PDFs from folders
-    print("Loading PDFs from folders...")
-    documents = load_pdfs_from_folders(PDF_FOLDERS)
+    # Step 1: Load scraped pages and downloaded PDFs
+    print("Loading pages and PDFs from folders...")
+    documents = load_html_pages(HTML_FOLDERS) + load_pdfs_from_folders(PDF_FOLDERS)
 
     if not documents:
         print("No documents found for ingestion. Exiting Step 7.")
@@ -92,31 +95,30 @@ def main():
     progress_data = load_progress_file(PROGRESS_FILE)
     last_page_id = progress_data[-1]["page_id"] if progress_data else 0
 
-    # Step 2: Authenticate using Playwright and start scraping
+    # Step 2: Authenticate using Playwright, reusing the saved session while it is valid
     from playwright.sync_api import sync_playwright
     with sync_playwright() as playwright:
-        context, page = login_to_verizon_with_playwright(playwright)
-        if not context or not page:
-            print("Authentication failed. Exiting pipeline.")
-            return
-
-        try:
-            # Step 3: Start scraping
-            print(f"Scraping with limit: {LIMIT}")
-            progress_data = scrape_site(
-                page=page,
-                start_url=BASE_URL,
-                base_url=BASE_URL,
-                progress_data=progress_data,
-                limit=LIMIT,
-                last_page_id=last_page_id,
-            )
-        finally:
-            # Ensure context is closed
-            context.close()
-
-    # Step 4: Save updated progress summary
-    save_progress_file(progress_data, PROGRESS_FILE)
+        storage_state = get_authenticated_state(playwright)
+    if not storage_state:
+        print("Authentication failed. Exiting pipeline.")
+        return
+
+    # Step 3: Start scraping
+    print(f"Scraping with limit: {LIMIT}")
+    progress_data = crawl_site(
+        start_url=BASE_URL,
+        base_url=BASE_URL,
+        progress_data=progress_data,
+        limit=LIMIT,
+        last_page_id=last_page_id,
+        storage_state=storage_state,
+        session_file=SESSION_FILE,
+        concurrency=CONCURRENCY,
+        render_pdf=RENDER_PDF,
+        recrawl=RECRAWL,
+    )
+
+    # Step 4: Progress was journaled page by page and compacted by the crawler
 
     # Step 5: Convert scraped pages to PDF
     convert_to_pdf(DOWNLOAD_DIR, CONVERTED_DIR)
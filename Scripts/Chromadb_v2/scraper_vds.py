@@ -1,8 +1,17 @@
 import os
-import json
 import requests
 from urllib.parse import urljoin, urlparse
 from playwright.sync_api import sync_playwright
+import sys
+
+# The image registry and concurrent crawler live with the ingestion scripts
+# Appended, not prepended, so the Chromadb_v2 modules next to this file win over
+# the backend copies with the same name (authenticator, ingest_to_cerebro_collection_VDS_v2)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend", "scripts")))
+from image_registry import open_image_registry, close_image_registry, register_image, registry_stats
+from async_crawler import run_crawl, CONCURRENCY, MAX_CONCURRENCY, SCAN_SCRIPT, DOWNLOAD_BUTTON_SELECTOR
+from crawl_frontier import new_frontier, push, push_all, pop, frontier_size
+from progress_journal import iter_progress, write_progress, journal_path, progress_exists, open_journal, append_progress, close_journal
 import base64
 
 DATA_DIR = "../../data"
@@ -10,8 +19,18 @@ OUTPUT_DIR = os.path.join(DATA_DIR, "scraped_pages_test")
 PDF_OUTPUT_DIR = os.path.join(DATA_DIR, "pages_as_pdf_test")
 DOWNLOAD_DIR = os.path.join(DATA_DIR, "downloads_test")
 IMAGE_DIR = os.path.join(DATA_DIR, "saved_images_test")
+IMAGE_REGISTRY_FILE = os.path.join(DATA_DIR, "image_registry.sqlite")
+PAGE_STATE_FILE = os.path.join(DATA_DIR, "page_state_vds.sqlite")
+FRONTIER_FILE = os.path.join(DATA_DIR, "crawl_frontier_vds.json")
 PROGRESS_FILE = os.path.join(DATA_DIR, "progress_summary_vds_v2.json")
 SIGNOUT_KEYWORDS = ["signout", "logout", "print", "mailto", "@verizon", "webex", "email"]
+# Pages are ingested from their saved HTML. Rendering each page to PDF as well is
+# the slowest step of a crawl, so it is off unless a PDF copy is needed.
+RENDER_PDF = False
+DOWNLOAD_EXTENSIONS = (".pdf", ".ppt", ".pptx", ".docx")
+# Requests to other domains than these are aborted by the concurrent crawler,
+# e.g. ("verizon.com",). None only aborts known analytics and ad domains.
+ALLOWED_DOMAINS = None
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(PDF_OUTPUT_DIR, exist_ok=True)
@@ -30,28 +49,18 @@ def decode_base64_to_url(b64_string):
     return base64.urlsafe_b64decode(b64_string.encode()).decode()
 
 def load_progress_file(file_path):
-    """Load progress data from a JSON file."""
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            return json.load(f)
-    else:
-        return {
-            "last_scraped_page": 0,
-            "total_pages_scraped": 0,
-            "status": "not started",
-            "pages": []
-        }
+    """Load progress data, streamed from the progress journal."""
+    return list(iter_progress(file_path))
 
 
 def save_progress_file(data, file_path):
-    """Save progress data to a JSON file."""
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
-    print(f"Progress saved to {file_path}")
+    """Replace the progress journal with the given entries."""
+    write_progress(file_path, data)
+    print(f"Progress saved to {journal_path(file_path)}")
 
 
-def save_page_content(page, url):
-    """Save page content as HTML and PDF."""
+def save_page_content(page, url, render_pdf=RENDER_PDF):
+    """Save page content as HTML and, if render_pdf is set, PDF."""
     # html_filename = os.path.join(OUTPUT_DIR, f"{url.replace('/', '_').replace(':', '')}.html")
     # pdf_filename = os.path.join(PDF_OUTPUT_DIR, f"{url.replace('/', '_').replace(':', '')}.pdf")
     # html_filename = os.path.join(OUTPUT_DIR, f"{encode_url_to_base64(url)}.html")
@@ -63,7 +72,10 @@ def save_page_content(page, url):
     with open(html_filename, "w", encoding="utf-8") as f:
         f.write(page.content())
     print(f"Saved HTML: {html_filename}")
-    
+
+    if not render_pdf:
+        return html_filename, None
+
     # Save PDF
     page.pdf(path=pdf_filename, format="A4", print_background=True)
     print(f"Saved PDF: {pdf_filename}")
@@ -88,80 +100,80 @@ def download_file(file_url, save_dir):
         return None
 
 
+def fetch_bytes(file_url):
+    """Download a file into memory."""
+    response = requests.get(file_url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+
+def save_images(image_registry, images, page_url):
+    """Save a page's images, storing each distinct image only once across the crawl."""
+    return [register_image(image_registry, img, page_url, fetch_bytes) for img in dict.fromkeys(images)]
+
+
 def extract_links_and_assets(page, url):
-    """Extract all links, images, and downloadable files from the page."""
-    links = page.evaluate("""Array.from(document.querySelectorAll('a[href]')).map(a => a.href);""")
-    images = page.evaluate("""Array.from(document.querySelectorAll('img[src]')).map(img => img.src);""")
-    downloads = [
-        link for link in links
-        if link.lower().endswith(('.pdf', '.ppt', '.pptx', '.docx'))
-    ]
+    """
+    Extract all links, images, downloadable files and download buttons from the
+    page in a single evaluate.
+    :return: (links, images, downloads, buttons), where each button is {"index", "label"}.
+    """
+    found = page.evaluate(SCAN_SCRIPT, [DOWNLOAD_BUTTON_SELECTOR, list(DOWNLOAD_EXTENSIONS)])
 
     # Convert relative URLs to absolute URLs
-    links = [urljoin(url, link) for link in links]
-    images = [urljoin(url, img) for img in images]
-    downloads = [urljoin(url, dl) for dl in downloads]
+    links = [urljoin(url, link) for link in found["links"]]
+    images = [urljoin(url, img) for img in found["images"]]
+    downloads = [urljoin(url, dl) for dl in found["downloads"]]
 
-    return links, images, downloads
+    return links, images, downloads, found["buttons"]
 
 
-def handle_downloads(page, progress_entry):
-    """Find and click buttons to download files."""
+def handle_downloads(page, buttons, progress_entry):
+    """Click the download buttons found by extract_links_and_assets() and save the files."""
     os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-    file_extensions = [".pdf", ".ppt", ".pptx", ".docx"]
-    buttons = page.query_selector_all("button, div, a")
-
     for button in buttons:
         try:
-            aria_label = button.get_attribute("aria-label")
-            role = button.get_attribute("role")
-            data_testid = button.get_attribute("data-testid")
-            button_type = button.get_attribute("type")
-
-            if (
-                aria_label
-                and any(aria_label.lower().endswith(ext) for ext in file_extensions)
-                and role == "button"
-                and data_testid == "download-file-text-button"
-                and button_type == "button"
-            ):
-                print(f"Found download button for file: {aria_label}")
-
-                with page.expect_download() as download_info:
-                    button.click()
-                download = download_info.value
-
-                save_path = os.path.join(DOWNLOAD_DIR, download.suggested_filename)
-                download.save_as(save_path)
-                print(f"Downloaded: {save_path}")
-
-                progress_entry["download_list"].append(save_path)
+            print(f"Found download button for file: {button['label']}")
+
+            with page.expect_download() as download_info:
+                page.locator(DOWNLOAD_BUTTON_SELECTOR).nth(button["index"]).click()
+            download = download_info.value
+
+            save_path = os.path.join(DOWNLOAD_DIR, download.suggested_filename)
+            download.save_as(save_path)
+            print(f"Downloaded: {save_path}")
+
+            progress_entry["download_list"].append(save_path)
 
         except Exception as e:
             print(f"Error clicking button or downloading: {e}")
 
 
-def scrape_site(page, start_url, base_url, progress_data, limit, last_page_id):
+def scrape_site(page, start_url, base_url, progress_data, limit, last_page_id, render_pdf=RENDER_PDF):
     """Scrape the site recursively and update progress summary."""
-    to_visit = [start_url]
-    visited = {entry["page_link"] for entry in progress_data}
+    frontier = new_frontier(entry["page_link"] for entry in progress_data)
     count = 0
 
     print(f"Starting from URL: {start_url}")
     print(f"Base URL: {base_url}")
     print(f"Scraping limit: {limit}")
-    print(f"Skip links count: {len(visited)}")
+    print(f"Skip links count: {len(frontier['visited'])}")
+    # Allow scraping the start_url even if it is in visited
+    push(frontier, start_url, force=True)
+
+    # Images are deduplicated by URL and perceptual hash across runs
+    image_registry = open_image_registry(IMAGE_REGISTRY_FILE, IMAGE_DIR)
+    journal = open_journal(PROGRESS_FILE)
 
-    while to_visit:
+    while frontier_size(frontier):
         if limit and count >= limit:
             print(f"Visited limit of {limit} pages reached. Stopping.")
             break
 
-        current_url = to_visit.pop(0)
-        
-        # Allow scraping the start_url even if it is in visited
-        if current_url != start_url and (current_url in visited or any(keyword in current_url.lower() for keyword in SIGNOUT_KEYWORDS)):
+        current_url, depth = pop(frontier)
+
+        if any(keyword in current_url.lower() for keyword in SIGNOUT_KEYWORDS):
             print(f"Skipping URL: {current_url}")
             continue
 
@@ -170,8 +182,8 @@ def scrape_site(page, start_url, base_url, progress_data, limit, last_page_id):
             page.goto(current_url)
             page.wait_for_load_state("networkidle")
 
-            saved_as_html, saved_as_pdf = save_page_content(page, current_url)
-            child_links, images, downloads = extract_links_and_assets(page, current_url)
+            saved_as_html, saved_as_pdf = save_page_content(page, current_url, render_pdf)
+            child_links, images, downloads, buttons = extract_links_and_assets(page, current_url)
             
             filtered_child_links = [link for link in child_links if "designsystem" in link]
 
@@ -179,7 +191,7 @@ def scrape_site(page, start_url, base_url, progress_data, limit, last_page_id):
 
             # Download assets
             downloaded_files = [download_file(dl, DOWNLOAD_DIR) for dl in downloads]
-            saved_images = [download_file(img, IMAGE_DIR) for img in images]
+            saved_images = save_images(image_registry, images, current_url)
 
             progress_entry = {
                 "page_id": last_page_id + count + 1,
@@ -192,21 +204,56 @@ def scrape_site(page, start_url, base_url, progress_data, limit, last_page_id):
                 "saved_images_list": saved_images,
             }
 
-            handle_downloads(page, progress_entry)
+            handle_downloads(page, buttons, progress_entry)
 
             progress_data.append(progress_entry)
-            visited.add(current_url)
-            to_visit.extend(link for link in filtered_child_links if link not in visited)
+            append_progress(journal, progress_entry)
+            push_all(frontier, filtered_child_links, depth + 1)
             count += 1
 
-            # Save intermediate progress after each page
-            save_progress_file(progress_data, PROGRESS_FILE)
-
             print(f"Scraped {count}/{limit} pages so far.")
 
         except Exception as e:
             print(f"Error scraping {current_url}: {e}")
             continue
 
+    close_journal(journal)
+    print(f"Image registry: {registry_stats(image_registry)}")
+    close_image_registry(image_registry)
     print("Scraping completed!")
     return progress_data
+
+
+def site_config(render_pdf=RENDER_PDF):
+    """Settings the concurrent crawler (async_crawler.py) needs for this site."""
+    return {
+        "output_dir": OUTPUT_DIR,
+        "pdf_output_dir": PDF_OUTPUT_DIR,
+        "download_dir": DOWNLOAD_DIR,
+        "image_dir": IMAGE_DIR,
+        "image_registry_file": IMAGE_REGISTRY_FILE,
+        "progress_file": PROGRESS_FILE,
+        "frontier_file": FRONTIER_FILE,
+        "page_state_file": PAGE_STATE_FILE,
+        "skip_keywords": SIGNOUT_KEYWORDS,
+        "download_extensions": DOWNLOAD_EXTENSIONS,
+        "file_stem": encode_url_to_base64,
+        "keep_link": lambda link: "designsystem" in link,
+        "render_pdf": render_pdf,
+        "allowed_domains": ALLOWED_DOMAINS,
+    }
+
+
+def crawl_site(start_url, base_url, progress_data, limit, last_page_id, storage_state=None,
+               concurrency=CONCURRENCY, render_pdf=RENDER_PDF, recrawl=False, session_file=None,
+               max_concurrency=MAX_CONCURRENCY):
+    """
+    Concurrent version of scrape_site(): crawl with `concurrency` pages sharing one
+    browser context authenticated from storage_state (see async_crawler.crawl),
+    adapting the number of pages at once up to max_concurrency.
+    With recrawl, pages scraped before are revisited and saved again only if they changed.
+    session_file is the saved session storage_state came from; it is cleared if the session expires.
+    """
+    return run_crawl(start_url, base_url, progress_data, limit, last_page_id, site_config(render_pdf),
+                     storage_state=storage_state, concurrency=concurrency, recrawl=recrawl,
+                     session_file=session_file, max_concurrency=max_concurrency)
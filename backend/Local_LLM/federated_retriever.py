@@ -0,0 +1,317 @@
+import os
+import sys
+import time
+import base64
+import logging
+import psycopg2
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.vectorstores import Chroma
+
+# Model switch records are kept by the ingestion scripts. Appended so their
+# generic module names cannot shadow installed packages.
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../scripts"))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+from embedding_migrations import active_model, lock_for_read
+
+# Logging configuration
+logging.basicConfig(level=logging.WARN)
+logger = logging.getLogger(__name__)
+
+# Configuration
+CACHE_FOLDER = "../../cache"
+DEFAULT_MODEL_PATH = "../../models/all-mpnet-base-v2"
+DEFAULT_DEADLINE = 2.0  # Seconds each backend gets before it is dropped from the answer
+DEFAULT_TOP_K = 5
+MAX_WORKERS = 8
+MODEL_REFRESH_SECONDS = 60  # How often queries re-check a pgvector table's model before embedding (searches re-check it anyway)
+PG_CONFIG = {
+    "dbname": "postgres",
+    "user": "ahsamo6",
+    "password": "your_password",
+    "host": "localhost",
+    "port": 5432,
+}
+
+# Backends queried by default. Each entry is searched concurrently and must
+# answer within its own deadline, counted from when the query has been
+# embedded; slow backends are reported but not waited on. Every backend scores
+# its hits by cosine similarity to the query, so hits from different backends
+# can be ranked against each other. Chroma returns distances in the space its
+# collection was created with ("distance_space", Chroma's default is "l2"),
+# which are converted to cosine similarity. That is exact because the models
+# used here (all-mpnet-base-v2) produce unit-length embeddings.
+BACKENDS = [
+    {
+        "name": "brandcentral",
+        "type": "chroma",
+        "persist_directory": "../../data/cerebro_chroma_db",
+        "collection_name": "cerebro_v3",
+        "distance_space": "l2",
+        "model_path": DEFAULT_MODEL_PATH,
+        "deadline": DEFAULT_DEADLINE,
+    },
+    {
+        "name": "designsystem_chroma",
+        "type": "chroma",
+        "persist_directory": "../../data/cerebro_chroma_db_v2",
+        "collection_name": "cerebro_vds_v2",
+        "distance_space": "cosine",
+        "model_path": DEFAULT_MODEL_PATH,
+        "deadline": DEFAULT_DEADLINE,
+    },
+    {
+        "name": "designsystem",
+        "type": "pgvector",
+        "table_name": "vds_documents",
+        "model_path": DEFAULT_MODEL_PATH,
+        "deadline": DEFAULT_DEADLINE,
+    },
+]
+
+# Chroma distance -> cosine similarity, per collection space, for unit-length embeddings.
+# Chroma's "l2" is the squared distance, 2 - 2 * cosine; "ip" is 1 - dot product.
+DISTANCE_TO_COSINE = {
+    "cosine": lambda distance: 1 - distance,
+    "ip": lambda distance: 1 - distance,
+    "l2": lambda distance: 1 - distance / 2,
+}
+
+# Shared pool so a query does not pay thread start-up; a backend that misses its
+# deadline keeps its worker until it returns, but the caller no longer waits on it.
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="federated")
+
+# table name -> (checked_at, model_path) for pgvector backends
+_pgvector_models = {}
+# model path -> embedding function, shared with the app that already loaded one
+_embedding_functions = {}
+
+
+def register_embedding_function(model_path, embedding_function):
+    """Reuse an embedding function the caller has already loaded instead of loading the model again."""
+    _embedding_functions[os.path.normpath(model_path)] = embedding_function
+
+
+def get_embedding_function(model_path):
+    """Load an embedding model once per model path."""
+    key = os.path.normpath(model_path)
+    if key not in _embedding_functions:
+        _embedding_functions[key] = HuggingFaceEmbeddings(model_name=model_path, cache_folder=CACHE_FOLDER)
+    return _embedding_functions[key]
+
+
+def preload_embedding_functions(backends=None):
+    """Load the models of all backends up front, so the first query does not pay for it."""
+    for backend in backends or BACKENDS:
+        get_embedding_function(backend_model_path(backend))
+
+
+@lru_cache(maxsize=None)
+def get_chroma_vectorstore(persist_directory, collection_name, model_path):
+    """Open a Chroma collection once per directory/collection pair."""
+    return Chroma(
+        persist_directory=persist_directory,
+        collection_name=collection_name,
+        embedding_function=get_embedding_function(model_path),
+    )
+
+
+def decode_base64_to_url(b64_string):
+    """Decode a base64 encoded file name back to the page URL."""
+    try:
+        if b64_string.endswith(".pdf"):
+            b64_string = b64_string[:-4]
+        return base64.urlsafe_b64decode(b64_string.encode()).decode()
+    except Exception:
+        return "Unknown source"
+
+
+def pgvector_model_path(backend):
+    """
+    Return the model a pgvector table's live embeddings were built with, so
+    queries follow a model switch once reembed_pgvector.py has cut over.
+    """
+    table_name = backend["table_name"]
+    default = backend.get("model_path", DEFAULT_MODEL_PATH)
+    checked_at, model_path = _pgvector_models.get(table_name, (0, default))
+    if time.monotonic() - checked_at < MODEL_REFRESH_SECONDS:
+        return model_path
+
+    try:
+        conn = psycopg2.connect(**backend.get("db_config", PG_CONFIG))
+        try:
+            with conn.cursor() as cursor:
+                model_path, _ = active_model(cursor, table_name, default, None)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Could not check the embedding model for '{table_name}': {e}")
+    _pgvector_models[table_name] = (time.monotonic(), model_path)
+    return model_path
+
+
+def backend_model_path(backend):
+    """Return the embedding model a backend's query vectors must come from."""
+    if backend["type"] == "pgvector":
+        return pgvector_model_path(backend)
+    return backend.get("model_path", DEFAULT_MODEL_PATH)
+
+
+def search_chroma(backend, query, query_embedding, model_path, top_k):
+    """
+    Search a Chroma collection and return (context, metadata, similarity) tuples.
+    The distances Chroma returns are converted to cosine similarity for the
+    collection's distance space.
+    """
+    vectorstore = backend.get("vectorstore") or get_chroma_vectorstore(
+        backend["persist_directory"], backend["collection_name"], backend["model_path"]
+    )
+    to_cosine = DISTANCE_TO_COSINE[backend.get("distance_space", "l2")]
+    hits = vectorstore.similarity_search_by_vector_with_relevance_scores(query_embedding, k=top_k)
+    return [(doc.page_content or "", doc.metadata or {}, to_cosine(distance)) for doc, distance in hits]
+
+
+def search_pgvector(backend, query, query_embedding, model_path, top_k):
+    """
+    Search a pgvector table by cosine distance and return (context, metadata, similarity) tuples.
+    The live model is read in the same transaction as the search, under the
+    migration lock, so a cutover since model_path was looked up is noticed: the
+    query is then embedded again with the new model instead of being compared
+    with vectors of another model or dimension.
+    """
+    table_name = backend["table_name"]
+    conn = psycopg2.connect(**backend.get("db_config", PG_CONFIG))
+    cursor = conn.cursor()
+    try:
+        lock_for_read(cursor, table_name)
+        live_model_path, _ = active_model(cursor, table_name, backend.get("model_path", DEFAULT_MODEL_PATH), None)
+        if live_model_path != model_path:
+            logger.warning(f"Embedding model of '{table_name}' changed to {live_model_path}; re-embedding the query.")
+            _pgvector_models[table_name] = (time.monotonic(), live_model_path)
+            query_embedding = get_embedding_function(live_model_path).embed_query(query)
+
+        # No ivfflat/hnsw index is built on the embedding column (the model
+        # switch in reembed_pgvector.py replaces the column), so this scans
+        # and scores every row.
+        cursor.execute(f"""
+            SELECT file_name, content, (embedding <=> %s::VECTOR) AS distance
+            FROM {table_name}
+            ORDER BY distance
+            LIMIT %s;
+        """, (query_embedding, top_k))
+        return [
+            (content, {"source": file_name, "webpage": decode_base64_to_url(file_name)}, 1 - distance)
+            for file_name, content, distance in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+SEARCH_FUNCTIONS = {
+    "chroma": search_chroma,
+    "pgvector": search_pgvector,
+}
+
+
+def timed_search(backend, query, query_embedding, model_path, top_k):
+    """
+    Run one backend search and return its hits along with the elapsed time.
+    :param model_path: Model query_embedding was made with.
+    """
+    start = time.perf_counter()
+    hits = SEARCH_FUNCTIONS[backend["type"]](backend, query, query_embedding, model_path, top_k)
+    return hits, time.perf_counter() - start
+
+
+def federated_search(query, backends=None, top_k=DEFAULT_TOP_K):
+    """
+    Search several vector backends concurrently and merge the results.
+
+    Every backend is given its own deadline, counted once the query has been
+    embedded. Backends that fail or miss the deadline are reported in the status
+    map and the remaining results are returned, so search latency is bounded by
+    the slowest backend within its deadline. Hits are ranked by cosine similarity.
+
+    :param query: User question.
+    :param backends: List of backend configs (defaults to BACKENDS).
+    :param top_k: Number of merged results to return, and of hits requested from
+                  each backend unless its config sets its own "top_k".
+    :return: Dict with merged "results", each backend's own hits in "backend_results"
+             and per-backend "status".
+    """
+    backends = backends or BACKENDS
+    request_start = time.monotonic()
+
+    # Embed once per model, not once per backend
+    model_paths = {backend["name"]: backend_model_path(backend) for backend in backends}
+    query_embeddings = {}
+    for model_path in model_paths.values():
+        if model_path not in query_embeddings:
+            query_embeddings[model_path] = get_embedding_function(model_path).embed_query(query)
+
+    start = time.monotonic()
+    futures = {
+        backend["name"]: executor.submit(
+            timed_search,
+            backend,
+            query,
+            query_embeddings[model_paths[backend["name"]]],
+            model_paths[backend["name"]],
+            backend.get("top_k", top_k),
+        )
+        for backend in backends
+    }
+
+    merged = []
+    backend_results = {}
+    status = {}
+    for backend in sorted(backends, key=lambda b: b.get("deadline", DEFAULT_DEADLINE)):
+        name = backend["name"]
+        remaining = start + backend.get("deadline", DEFAULT_DEADLINE) - time.monotonic()
+        try:
+            hits, elapsed = futures[name].result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            futures[name].cancel()
+            status[name] = {"status": "timeout", "count": 0}
+            logger.warning(f"Backend '{name}' missed its deadline; returning partial results.")
+            continue
+        except Exception as e:
+            status[name] = {"status": "error", "count": 0, "error": str(e)}
+            logger.error(f"Backend '{name}' failed: {e}")
+            continue
+
+        backend_results[name] = [
+            {
+                "backend": name,
+                "type": backend["type"],
+                "context": context,
+                "metadata": metadata,
+                "score": similarity,
+            }
+            for context, metadata, similarity in hits
+        ]
+        merged.extend(backend_results[name])
+        status[name] = {"status": "ok", "count": len(hits), "latency": round(elapsed, 4)}
+
+    merged.sort(key=lambda result: result["score"], reverse=True)
+    return {
+        "query": query,
+        "results": merged[:top_k],
+        "backend_results": backend_results,
+        "status": status,
+        "latency": round(time.monotonic() - request_start, 4),
+    }
+
+
+if __name__ == "__main__":
+    response = federated_search("What are the components of a toggle?")
+    for name, backend_status in response["status"].items():
+        print(f"{name}: {backend_status}")
+    for idx, result in enumerate(response["results"], start=1):
+        print(f"\nResult {idx} [{result['backend']}] score={round(result['score'], 4)}")
+        print(f"  - Context: {result['context'][:500]}{'...' if len(result['context']) > 500 else ''}")
+        print(f"  - Metadata: {result['metadata']}")
+    print(f"\nTotal latency: {response['latency']}s")
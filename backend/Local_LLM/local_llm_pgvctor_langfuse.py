@@ -1,13 +1,12 @@
 import os
 import streamlit as st
 from flask import Flask, request, jsonify
-import psycopg2
-import numpy as np
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langfuse import Langfuse  # Ensure you have Langfuse installed
+from federated_retriever import federated_search, register_embedding_function, preload_embedding_functions
 
 # Configuration
 CHROMA_DB_DIR = "../../data/cerebro_chroma_db_v2"
@@ -32,6 +31,8 @@ app = Flask(__name__)
 
 # Initialize embedding function
 embedding_function = HuggingFaceEmbeddings(model_name=MODEL_PATH, cache_folder=CACHE_FOLDER)
+# Federated searches embed queries with the model loaded here
+register_embedding_function(MODEL_PATH, embedding_function)
 
 # Load ChromaDB collection
 vectorstore = Chroma(
@@ -40,54 +41,26 @@ vectorstore = Chroma(
     embedding_function=embedding_function
 )
 
-# Function to connect to PostgreSQL
-def connect_to_db():
-    try:
-        conn = psycopg2.connect(
-            dbname=PG_DB,
-            user=PG_USER,
-            password=PG_PASSWORD,
-            host=PG_HOST,
-            port=PG_PORT
-        )
-        conn.autocommit = True
-        return conn
-    except Exception as e:
-        print(f"Error connecting to database: {e}")
-        exit()
-
-# Function to perform similarity search using PGVector
-def similarity_search_pg(sentence, vector_dim=768, top_k=10):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    try:
-        query_embedding = np.random.rand(vector_dim).tolist()
-
-        cursor.execute(f"""
-            WITH similarity_scores AS (
-                SELECT file_name, content,
-                    (embedding <-> %s::VECTOR) AS raw_score
-                FROM {PG_TABLE}
-            ),
-            normalized_scores AS (
-                SELECT file_name, content,
-                    (1 - (raw_score - MIN(raw_score) OVER ()) /
-                    (MAX(raw_score) OVER () - MIN(raw_score) OVER ())) AS similarity_score
-                FROM similarity_scores
-            )
-            SELECT file_name, content, similarity_score
-            FROM normalized_scores
-            ORDER BY similarity_score DESC
-            LIMIT {top_k};
-        """, (query_embedding,))
-        results = cursor.fetchall()
-        return results
-    except Exception as e:
-        print(f"Error performing similarity search: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+# Backends searched concurrently for every query
+FEDERATED_BACKENDS = [
+    {
+        "name": "chromadb",
+        "type": "chroma",
+        "vectorstore": vectorstore,
+        "model_path": MODEL_PATH,
+        "deadline": 2.0,
+    },
+    {
+        "name": "pgvector",
+        "type": "pgvector",
+        "table_name": PG_TABLE,
+        "db_config": {"dbname": PG_DB, "user": PG_USER, "password": PG_PASSWORD, "host": PG_HOST, "port": PG_PORT},
+        "model_path": MODEL_PATH,
+        "deadline": 2.0,
+    },
+]
+# Load any other model a backend needs (e.g. after a pgvector model switch) before the first query
+preload_embedding_functions(FEDERATED_BACKENDS)
 
 # Flask API for similarity search
 @app.route("/query", methods=["POST"])
@@ -98,19 +71,19 @@ def query_llm():
     if not user_query:
         return jsonify({"error": "Query cannot be empty"}), 400
 
-    # Retrieve context from PGVector
-    pg_results = similarity_search_pg(user_query, top_k=5)
-
-    # Retrieve context from ChromaDB
-    chroma_results = vectorstore.similarity_search(user_query, k=5)
+    # Retrieve context from PGVector and ChromaDB concurrently
+    federated = federated_search(user_query, backends=FEDERATED_BACKENDS, top_k=5)
+    pg_results = federated["backend_results"].get("pgvector", [])
+    chroma_results = federated["backend_results"].get("chromadb", [])
 
     # Track query using LangFuse
-    langfuse.track("user_query", {"query": user_query, "pg_results": len(pg_results), "chroma_results": len(chroma_results)})
+    langfuse.track("user_query", {"query": user_query, "pg_results": len(pg_results), "chroma_results": len(chroma_results), "backend_status": federated["status"]})
 
     response = {
         "query": user_query,
-        "pgvector_results": [{"file": res[0], "context": res[1], "score": res[2]} for res in pg_results],
-        "chromadb_results": [{"context": res.page_content, "metadata": res.metadata} for res in chroma_results]
+        "pgvector_results": [{"file": res["metadata"]["source"], "context": res["context"], "score": res["score"]} for res in pg_results],
+        "chromadb_results": [{"context": res["context"], "metadata": res["metadata"]} for res in chroma_results],
+        "backend_status": federated["status"],
     }
     
     return jsonify(response)
@@ -1,3 +1,5 @@
+import os
+import sys
 import psycopg2
 import numpy as np
 import base64
@@ -5,6 +7,13 @@ import logging
 import getpass
 from rich import print
 
+# The FAISS query service lives with the ingestion scripts. Appended, not
+# prepended, so their generic module names (parser, embedding, indexer) cannot
+# shadow installed packages.
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../scripts"))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
 # Importing local LLM and prompt configuration
 from local_llm import call_llm
 from prompts import SYSTEM_PROMPT
@@ -28,6 +37,8 @@ PG_PASSWORD = "your_password"
 PG_PORT = 5432
 VECTOR_DIM = 768
 TABLE_NAME = "your_pgvector_table"
+FAISS_DATA_DIR = os.path.join(SCRIPTS_DIR, "../data")
+FAISS_MODEL_PATH = os.path.join(SCRIPTS_DIR, "../models/all-MiniLM-L6-v2")
 
 # Function to connect to PostgreSQL
 def connect_to_db():
@@ -148,11 +159,25 @@ def relevance_search(sentence, table_name, vector_dim=VECTOR_DIM, top_k=10):
         cursor.close()
         conn.close()
 
+# Function to perform similarity search over the local FAISS index
+def faiss_search(sentence, top_k=10):
+    from query_faiss import load_search_service, similarity_search as faiss_similarity_search
+
+    service = load_search_service(
+        index_dir=os.path.join(FAISS_DATA_DIR, "indexes"),
+        chunked_dir=os.path.join(FAISS_DATA_DIR, "chunked_text_files"),
+        model_path=FAISS_MODEL_PATH,
+        progress_file=os.path.join(FAISS_DATA_DIR, "progress_summary.json"),
+    )
+    return faiss_similarity_search(sentence, top_k=top_k, service=service)
+
 # Function to process query using RAG and LLM
 def answer_rag_question(question, search_type="similarity"):
     """Retrieve context from the vectorstore and answer the question using the local LLM."""
     if search_type == "similarity":
         retrieved_docs = similarity_search(question, TABLE_NAME, top_k=3)
+    elif search_type == "faiss":
+        retrieved_docs = faiss_search(question, top_k=3)
     else:
         retrieved_docs = relevance_search(question, TABLE_NAME, top_k=3)
 
@@ -0,0 +1,471 @@
+import os
+import time
+import asyncio
+from urllib.parse import urljoin
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from image_registry import open_image_registry, close_image_registry, lookup_image, store_image, registry_stats
+from crawl_frontier import new_frontier, push, push_all, pop, frontier_size, save_frontier, load_frontier
+from progress_journal import open_journal, append_progress, close_journal
+from request_policy import new_request_policy, install_request_policy, BLOCKED_RESOURCE_TYPES, PDF_BLOCKED_RESOURCE_TYPES
+from page_state import (open_page_state, close_page_state, get_page_state, conditional_headers, content_fingerprint,
+                        content_changed, record_fetch, record_not_modified, page_state_stats)
+from download_manager import (open_download_manager, close_download_manager, submit_download, fetch_bytes, download_stats,
+                              download_rate, RetryableStatus)
+from rate_controller import (new_rate_controller, acquire, release, record_latency, classify_status, classify_error,
+                             rate_metrics, BACKOFF_OUTCOMES)
+from session_store import is_login_url, clear_session
+
+# Concurrent crawler shared by the site scrapers. N worker pages run in one
+# browser context that carries the authenticated session, pulling URLs from a
+# shared frontier. An error on one page only costs that page: the worker
+# replaces its tab and moves on to the next URL. Linked files and images are
+# handed to the download manager and fetched while the worker renders the
+# next page; a page's progress entry is journaled once its assets are done.
+# If the session expires mid-crawl (a page lands on a login page), the URL is
+# put back, the workers stop and the saved session is cleared, so the next run
+# logs in again and resumes from the saved frontier.
+# The number of pages rendered at once adapts between 1 and MAX_CONCURRENCY
+# (see rate_controller.py): it grows while pages load quickly and backs off
+# when the site throttles, errors or slows down. Throttled and timed-out pages
+# are put back in the frontier and retried up to PAGE_RETRIES times.
+#
+# Site-specific behaviour comes from a config dict built by each scraper:
+#   output_dir, pdf_output_dir, download_dir  where pages and files are saved
+#   image_dir, image_registry_file            image store (see image_registry.py)
+#   progress_file                             progress summary (journaled, see progress_journal.py)
+#   page_state_file                           validators and content hashes for re-crawls (see page_state.py)
+#   frontier_file                             pending URLs, saved so a crawl can resume
+#   priority                                  optional frontier priority (see crawl_frontier.py)
+#   skip_keywords                             URLs containing these are never visited
+#   download_extensions                       links with these endings are downloaded
+#   file_stem(url)                            file name for a saved page
+#   keep_link(url)                            whether a child link is followed
+#   render_pdf                                also save each page as PDF
+#   ready_selector                            element whose rendered text marks the page as ready
+#   blocked_resource_types, allowed_domains   optional request policy overrides (see request_policy.py)
+CONCURRENCY = 4  # Pages crawled at the same time to start with
+MAX_CONCURRENCY = 8  # Upper bound for the rate controller; one worker tab each
+PAGE_RETRIES = 2  # Times a throttled or timed-out page is queued again
+HEADLESS = True  # page.pdf() needs a headless browser
+FRONTIER_SAVE_EVERY = 25  # Pages between saves of the pending frontier
+READY_SELECTOR = "main"
+DOWNLOAD_BUTTON_SELECTOR = ':is(button, div, a)[data-testid="download-file-text-button"]'
+# Collects everything the crawler needs from a page in one round trip. Download
+# buttons are returned as their index among DOWNLOAD_BUTTON_SELECTOR matches, so
+# they can be clicked with page.locator(DOWNLOAD_BUTTON_SELECTOR).nth(index).
+SCAN_SCRIPT = """([buttonSelector, extensions]) => {
+    const isDownload = value => extensions.some(ext => value.toLowerCase().endsWith(ext));
+    const links = Array.from(document.querySelectorAll('a[href]'), a => a.href);
+    const images = Array.from(document.querySelectorAll('img[src]'), img => img.src);
+    const buttons = [];
+    document.querySelectorAll(buttonSelector).forEach((el, index) => {
+        const label = el.getAttribute('aria-label');
+        if (label && isDownload(label) && el.getAttribute('role') === 'button' && el.getAttribute('type') === 'button') {
+            buttons.push({index, label});
+        }
+    });
+    return {links, images, downloads: links.filter(isDownload), buttons};
+}"""
+READY_TIMEOUT = 10000  # ms to wait for the ready selector before saving the page as it is
+# A page is ready once its DOM is parsed and the main element (or the body, if
+# there is none) has rendered text. Waiting for networkidle instead also waits
+# for analytics beacons, long polling and lazy media the crawler never uses.
+READY_SCRIPT = """selector => {
+    if (document.readyState === 'loading') return false;
+    const el = document.querySelector(selector) || document.body;
+    return !!el && el.innerText.trim().length > 0;
+}"""
+
+
+class SessionExpired(Exception):
+    """A page was redirected to a login page, so the crawl session is no longer authenticated."""
+
+
+def html_path(url, site):
+    return os.path.join(site["output_dir"], f"{site['file_stem'](url)}.html")
+
+
+async def save_page_content(page, url, site, html):
+    """Save page content as HTML and, if the site renders PDFs, PDF."""
+    stem = site["file_stem"](url)
+    html_filename = html_path(url, site)
+    with open(html_filename, "w", encoding="utf-8") as f:
+        f.write(html)
+    print(f"Saved HTML: {html_filename}")
+
+    if not site["render_pdf"]:
+        return html_filename, None
+
+    pdf_filename = os.path.join(site["pdf_output_dir"], f"{stem}.pdf")
+    await page.pdf(path=pdf_filename, format="A4", print_background=True)
+    print(f"Saved PDF: {pdf_filename}")
+    return html_filename, pdf_filename
+
+
+async def extract_links_and_assets(page, url, site):
+    """
+    Extract all links, images, downloadable files and download buttons from the
+    page in a single evaluate.
+    :return: (links, images, downloads, buttons), where each button is {"index", "label"}.
+    """
+    found = await page.evaluate(SCAN_SCRIPT, [DOWNLOAD_BUTTON_SELECTOR, list(site["download_extensions"])])
+
+    # Convert relative URLs to absolute URLs
+    links = [urljoin(url, link) for link in found["links"]]
+    images = [urljoin(url, img) for img in found["images"]]
+    downloads = [urljoin(url, dl) for dl in found["downloads"]]
+
+    return links, images, downloads, found["buttons"]
+
+
+async def save_image(downloads, image_registry, img, page_url):
+    path = lookup_image(image_registry, img, page_url)
+    if path:
+        return path
+    try:
+        return store_image(image_registry, img, page_url, await fetch_bytes(downloads, img))
+    except Exception as e:
+        print(f"Error downloading {img}: {e}")
+        image_registry["stats"]["failed"] += 1
+        return None
+
+
+async def save_images(downloads, image_registry, images, page_url):
+    """Save a page's images, storing each distinct image only once across the crawl."""
+    return list(await asyncio.gather(*(save_image(downloads, image_registry, img, page_url)
+                                       for img in dict.fromkeys(images))))
+
+
+async def handle_downloads(page, buttons, progress_entry, site):
+    """Click the download buttons found by extract_links_and_assets() and save the files."""
+    for button in buttons:
+        try:
+            print(f"Found download button for file: {button['label']}")
+
+            async with page.expect_download() as download_info:
+                await page.locator(DOWNLOAD_BUTTON_SELECTOR).nth(button["index"]).click()
+            download = await download_info.value
+
+            save_path = os.path.join(site["download_dir"], download.suggested_filename)
+            await download.save_as(save_path)
+            print(f"Downloaded: {save_path}")
+
+            progress_entry["download_list"].append(save_path)
+
+        except Exception as e:
+            print(f"Error clicking button or downloading: {e}")
+
+
+async def wait_until_ready(page, selector):
+    """Wait for the page's content to render; return False if it did not within READY_TIMEOUT."""
+    try:
+        await page.wait_for_function(READY_SCRIPT, arg=selector, timeout=READY_TIMEOUT)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+def elapsed_ms(since):
+    return round((time.perf_counter() - since) * 1000)
+
+
+async def not_modified(context, url, known):
+    """
+    Ask the server whether a page changed since it was last fetched (needs an ETag
+    or Last-Modified). A HEAD request, so a changed page is not downloaded here
+    and then again by page.goto().
+    """
+    headers = conditional_headers(known)
+    if not headers:
+        return False
+    response = await context.request.head(url, headers=headers, timeout=10000)
+    return response.status == 304
+
+
+async def scrape_page(page, url, state):
+    """
+    Load one page, save it, start downloading its assets and return
+    (progress_entry, child_links, assets), where assets is (file_tasks, image_task).
+    A page that has not changed since the last crawl is not saved again and
+    gets no new progress entry (progress_entry and assets are None).
+    """
+    site = state["site"]
+    context = page.context
+    page_state = state["page_state"]
+    known = get_page_state(page_state, url) if os.path.exists(html_path(url, site)) else None
+    if known and await not_modified(context, url, known):
+        record_not_modified(page_state, url)
+        print(f"Not modified since last crawl: {url}")
+        previous = state["previous"].get(url)
+        return None, previous["child_pages"] if previous else [], None
+
+    start = time.perf_counter()
+    timings = {}
+    response = await page.goto(url, wait_until="domcontentloaded")
+    timings["navigation_ms"] = elapsed_ms(start)
+    record_latency(state["rate"], timings["navigation_ms"])
+    if is_login_url(page.url) and not is_login_url(url):
+        raise SessionExpired(f"Redirected to login page {page.url}")
+    if response and classify_status(response.status) in BACKOFF_OUTCOMES:
+        # Do not save a throttling or error page in place of the content
+        raise RetryableStatus(response.status)
+    if not await wait_until_ready(page, site.get("ready_selector", READY_SELECTOR)):
+        print(f"Page not ready after {READY_TIMEOUT} ms, saving it as it is: {url}")
+    timings["ready_ms"] = elapsed_ms(start)
+    state["load_times"].append(timings["ready_ms"])
+
+    html = await page.content()
+    fingerprint = content_fingerprint(html)
+    links, images, downloads, buttons = await extract_links_and_assets(page, url, site)
+    child_links = [link for link in links if site["keep_link"](link)]
+    headers = await response.all_headers() if response else {}
+    if not content_changed(known, fingerprint):
+        record_fetch(page_state, url, headers, fingerprint)
+        print(f"Content unchanged since last crawl: {url}")
+        return None, child_links, None
+
+    saved_as_html, saved_as_pdf = await save_page_content(page, url, site, html)
+    print(f"Extracted {len(child_links)} child links from {url}.")
+
+    # Assets download in the background while the worker moves on
+    file_tasks = [submit_download(state["downloads"], dl, site["download_dir"]) for dl in downloads]
+    image_task = asyncio.ensure_future(save_images(state["downloads"], state["image_registry"], images, url))
+
+    progress_entry = {
+        "page_id": None,  # Assigned in completion order
+        "page_link": url,
+        "saved_as_pdf": saved_as_pdf,
+        "saved_as_html": saved_as_html,
+        "child_pages": child_links,
+        "parent_pages": [state["start_url"]],
+        "download_list": [],  # Filled in by record_page()
+        "saved_images_list": [],
+    }
+    await handle_downloads(page, buttons, progress_entry, site)
+    timings["total_ms"] = elapsed_ms(start)
+    progress_entry["timings"] = timings
+    record_fetch(page_state, url, headers, fingerprint)
+    return progress_entry, child_links, (file_tasks, image_task)
+
+
+def should_skip(state, url):
+    return any(keyword in url.lower() for keyword in state["site"]["skip_keywords"])
+
+
+async def next_url(state):
+    """
+    Claim the next URL from the frontier, waiting while it is empty but other
+    workers may still add links. Returns (url, depth), or None when the crawl is over.
+    """
+    limit = state["limit"]
+    async with state["changed"]:
+        while True:
+            if state["session_expired"] or (limit and state["count"] >= limit):
+                return None
+            # Pages in flight may still fail, so only wait once they could reach the limit
+            if not (limit and state["count"] + state["in_flight"] >= limit):
+                while frontier_size(state["frontier"]):
+                    url, depth = pop(state["frontier"])
+                    if should_skip(state, url):
+                        print(f"Skipping URL: {url}")
+                        continue
+                    state["in_flight"] += 1
+                    return url, depth
+                if not state["in_flight"]:
+                    return None
+            await state["changed"].wait()
+
+
+async def record_page(state, progress_entry, assets):
+    """Journal a scraped page once its files and images have been downloaded."""
+    file_tasks, image_task = assets
+    files = await asyncio.gather(*file_tasks)
+    # Files from download buttons were saved while the page was open
+    progress_entry["download_list"] = list(files) + progress_entry["download_list"]
+    progress_entry["saved_images_list"] = await image_task
+
+    state["recorded"] += 1
+    progress_entry["page_id"] = state["last_page_id"] + state["recorded"]
+    state["progress_data"].append(progress_entry)
+    append_progress(state["journal"], progress_entry)
+    if state["site"].get("frontier_file") and state["recorded"] % FRONTIER_SAVE_EVERY == 0:
+        save_frontier(state["frontier"], state["site"]["frontier_file"])
+
+
+async def finish_url(state, progress_entry, child_links, depth, assets):
+    """Queue a finished page's children and record it when its assets are done."""
+    async with state["changed"]:
+        state["in_flight"] -= 1
+        push_all(state["frontier"], child_links, depth + 1)
+        if progress_entry:
+            state["count"] += 1
+            task = asyncio.ensure_future(record_page(state, progress_entry, assets))
+            state["recording"].add(task)
+            task.add_done_callback(state["recording"].discard)
+            print(f"Scraped {state['count']}/{state['limit']} pages so far.")
+        state["changed"].notify_all()
+
+
+def retry_later(state, url, depth):
+    """Queue a throttled or timed-out page again, up to PAGE_RETRIES times."""
+    retries = state["retries"].get(url, 0)
+    if retries >= PAGE_RETRIES:
+        print(f"Giving up on {url} after {retries} retries")
+        return
+    state["retries"][url] = retries + 1
+    push(state["frontier"], url, depth, force=True)
+
+
+async def crawl_worker(worker_id, context, state):
+    """Crawl URLs from the frontier in one tab until it is exhausted, while the rate controller allows."""
+    page = await context.new_page()
+    try:
+        while True:
+            await acquire(state["rate"])
+            claimed = await next_url(state)
+            if claimed is None:
+                await release(state["rate"], None)
+                break
+            url, depth = claimed
+            progress_entry, child_links, assets = None, [], None
+            outcome = "ok"
+            try:
+                print(f"[worker {worker_id}] Scraping: {url}")
+                progress_entry, child_links, assets = await scrape_page(page, url, state)
+            except SessionExpired as e:
+                print(f"[worker {worker_id}] Session expired at {url}: {e}")
+                outcome = None
+                state["session_expired"] = True
+                # Visit the URL again once logged in again
+                push(state["frontier"], url, depth, force=True)
+            except Exception as e:
+                print(f"[worker {worker_id}] Error scraping {url}: {e}")
+                outcome = classify_error(e)
+                if outcome in BACKOFF_OUTCOMES:
+                    retry_later(state, url, depth)
+                # Start the next URL in a clean tab in case this one is stuck or crashed
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+                page = await context.new_page()
+            finally:
+                await release(state["rate"], outcome)
+                await finish_url(state, progress_entry, child_links, depth, assets)
+    finally:
+        if not page.is_closed():
+            await page.close()
+
+
+async def crawl(start_url, base_url, progress_data, limit, last_page_id, site,
+                storage_state=None, concurrency=CONCURRENCY, headless=HEADLESS, resume=True, recrawl=False,
+                session_file=None, max_concurrency=MAX_CONCURRENCY):
+    """
+    Crawl a site with `concurrency` pages sharing one browser context, adapting
+    the number of pages at once up to max_concurrency.
+    :param progress_data: Progress entries of earlier runs; new pages are appended.
+    :param site: Site config dict (see the top of this module).
+    :param storage_state: Cookies and local storage of an authenticated context,
+                          e.g. context.storage_state() after logging in.
+    :param resume: Also queue the URLs left pending by the previous run.
+    :param recrawl: Revisit pages crawled before. Unchanged pages are skipped
+                    cheaply and do not count towards the limit; only new and
+                    changed pages are saved again.
+    :param session_file: Saved session the storage_state came from (see session_store.py);
+                         it is cleared if the session expires during the crawl.
+    :return: Updated progress data.
+    """
+    for directory in (site["output_dir"], site["pdf_output_dir"], site["download_dir"]):
+        os.makedirs(directory, exist_ok=True)
+
+    state = {
+        "site": site,
+        "start_url": start_url,
+        "limit": limit,
+        "last_page_id": last_page_id,
+        "progress_data": progress_data,
+        "frontier": new_frontier((() if recrawl else (entry["page_link"] for entry in progress_data)), site.get("priority")),
+        # Latest entry per page, for the child links of pages that were not modified
+        "previous": {entry["page_link"]: entry for entry in progress_data},
+        "in_flight": 0,
+        "count": 0,  # Pages scraped
+        "recorded": 0,  # Pages journaled (after their assets downloaded)
+        "recording": set(),
+        "load_times": [],  # ms from navigation to ready, per rendered page
+        "session_expired": False,
+        "retries": {},  # url -> times queued again after throttling or a timeout
+        "rate": new_rate_controller("pages", concurrency, maximum=max_concurrency),
+        "changed": asyncio.Condition(),
+    }
+
+    print(f"Starting from URL: {start_url}")
+    print(f"Base URL: {base_url}")
+    print(f"Scraping limit: {limit}")
+    print(f"Skip links count: {len(state['frontier']['visited'])}")
+    # Allow scraping the start_url even if it is in visited
+    push(state["frontier"], start_url, force=True)
+    frontier_file = site.get("frontier_file")
+    if resume and frontier_file:
+        resumed = sum(push(state["frontier"], url, depth) for url, depth in load_frontier(frontier_file))
+        print(f"Resumed {resumed} pending URLs from {frontier_file}")
+    print(f"Concurrent pages: {concurrency}, adapting up to {max_concurrency}")
+
+    # Images are deduplicated by URL and perceptual hash across runs
+    state["image_registry"] = open_image_registry(site["image_registry_file"], site["image_dir"])
+    state["journal"] = open_journal(site["progress_file"])
+    state["page_state"] = open_page_state(site["page_state_file"])
+    start_time = time.time()
+    try:
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch(headless=headless)
+            context = await browser.new_context(storage_state=storage_state, accept_downloads=True)
+            default_blocked = PDF_BLOCKED_RESOURCE_TYPES if site["render_pdf"] else BLOCKED_RESOURCE_TYPES
+            request_policy = new_request_policy(site.get("blocked_resource_types", default_blocked),
+                                                site.get("allowed_domains"))
+            await install_request_policy(context, request_policy)
+            state["downloads"] = await open_download_manager(context, state["page_state"])
+            try:
+                workers = max(concurrency, max_concurrency)
+                await asyncio.gather(*(crawl_worker(i, context, state) for i in range(workers)))
+            finally:
+                await asyncio.gather(*state["recording"], return_exceptions=True)
+                await close_download_manager(state["downloads"])
+                await context.close()
+                await browser.close()
+                print(f"Requests: {request_policy['stats']}")
+                print(f"Downloads: {download_stats(state['downloads'])}")
+                print(f"Page rate: {rate_metrics(state['rate'])}")
+                print(f"Download rate: {download_rate(state['downloads'])}")
+    finally:
+        if frontier_file:
+            save_frontier(state["frontier"], frontier_file)
+        close_journal(state["journal"])
+        print(f"Page changes: {page_state_stats(state['page_state'])}")
+        close_page_state(state["page_state"])
+        print(f"Image registry: {registry_stats(state['image_registry'])}")
+        close_image_registry(state["image_registry"])
+
+    elapsed = time.time() - start_time
+    if state["session_expired"]:
+        if session_file:
+            clear_session(session_file)
+        print("Session expired during the crawl. Run again to log in and resume from the saved frontier.")
+    if limit and state["count"] >= limit:
+        print(f"Visited limit of {limit} pages reached. Stopping.")
+    print(f"Scraping completed! {state['count']} pages in {elapsed:.1f}s "
+          f"({state['count'] / elapsed if elapsed else 0:.2f} pages/s)")
+    print(f"Frontier: {frontier_size(state['frontier'])} pending, "
+          f"{state['frontier']['duplicates']} duplicate links ignored")
+    load_times = sorted(state["load_times"])
+    if load_times:
+        print(f"Page load: mean {sum(load_times) / len(load_times):.0f} ms, "
+              f"p95 {load_times[int(0.95 * (len(load_times) - 1))]} ms over {len(load_times)} pages")
+    return progress_data
+
+
+def run_crawl(start_url, base_url, progress_data, limit, last_page_id, site,
+              storage_state=None, concurrency=CONCURRENCY, headless=HEADLESS, resume=True, recrawl=False,
+              session_file=None, max_concurrency=MAX_CONCURRENCY):
+    """Run crawl() from synchronous code (not from inside a running event loop)."""
+    return asyncio.run(crawl(start_url, base_url, progress_data, limit, last_page_id, site,
+                             storage_state, concurrency, headless, resume, recrawl, session_file, max_concurrency))
@@ -1,7 +1,7 @@
 import os
-import time
 from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright
+from session_store import load_session, save_session, clear_session, is_login_url
 
 # Load credentials from .env
 load_dotenv()
@@ -14,6 +14,13 @@ PASSWORD = os.getenv("PASSWORD")
 
 BASE_URL = "https://brandcentral.verizonwireless.com/signin"
 ENTERPRISE_LOGIN_URL = "https://ilogin.verizon.com/ngauth/verifyusercontroller?method=validateuser"
+# Each step waits for the element the next step needs instead of sleeping a fixed time
+STEP_TIMEOUT = 30000  # ms
+EMPLOYEES_BUTTON = "//*[@id='bc-root']/main/div[2]/div[1]/button"
+# Logged-in sessions are saved here and reused until they stop working
+SESSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "cache", "playwright_session.json")
+SESSION_CHECK_URL = "https://brandcentral.verizonwireless.com"
+SESSION_DOMAINS = ["verizon.com", "verizonwireless.com"]
 
 
 def login_to_verizon_with_playwright(playwright):
@@ -25,47 +32,40 @@ def login_to_verizon_with_playwright(playwright):
     try:
         # Step 1: Navigate to login page
         print(f"Navigating to {BASE_URL}...")
-        page.goto(BASE_URL)
-        page.wait_for_load_state("networkidle")
-        time.sleep(3)
+        page.goto(BASE_URL, wait_until="domcontentloaded")
 
         # Step 2: Click "Verizon Employees" button
         print("Clicking 'Verizon Employees' button...")
-        page.locator("//*[@id='bc-root']/main/div[2]/div[1]/button").click()
-        page.wait_for_load_state("networkidle")
-        time.sleep(3)
+        page.locator(EMPLOYEES_BUTTON).click(timeout=STEP_TIMEOUT)
 
         # Step 3: Enter Last Name and User ID
         print("Entering Last Name and User ID...")
-        page.fill("#lastname", LAST_NAME)
+        page.fill("#lastname", LAST_NAME, timeout=STEP_TIMEOUT)
         page.fill("#user", USER_ID)
         page.click("#intlcontinue")
-        time.sleep(3)
 
         # Step 4: Handle the popup and click "I Agree"
         print("Clicking 'I Agree'...")
-        page.locator("//*[@id='btnOk']").click()
-        time.sleep(3)
+        page.locator("//*[@id='btnOk']").click(timeout=STEP_TIMEOUT)
 
         # Step 5: Enter Community ID, Worker ID, and PIN on the new page
         print("Waiting for the new page and entering credentials...")
-        page.wait_for_url(ENTERPRISE_LOGIN_URL)
+        page.wait_for_url(ENTERPRISE_LOGIN_URL, timeout=STEP_TIMEOUT)
         page.fill("//*[@id='userCommunityId']", COMMUNITY_ID)
         page.fill("//*[@id='nativeWorkerNumber']", WORKER_ID)
         page.fill("//*[@id='pin']", PIN)
         page.click("//*[@id='continue']")
-        time.sleep(3)
 
         # Step 6: Enter Password
         print("Entering Password...")
-        page.fill("#phrase", PASSWORD)
+        page.fill("#phrase", PASSWORD, timeout=STEP_TIMEOUT)
         page.click("#LoginBtn")
-        time.sleep(5)
+        page.wait_for_url("**brandcentral**", timeout=STEP_TIMEOUT)
 
         # Check for successful login
         if "brandcentral" not in page.url:
             print("Login failed. Check your credentials.")
-            context.close()
+            browser.close()
             return None
 
         print(f"Successfully logged in. Current URL: {page.url}")
@@ -73,10 +73,48 @@ def login_to_verizon_with_playwright(playwright):
 
     except Exception as e:
         print(f"Error during login: {e}")
-        context.close()
+        browser.close()
         return None
 
 
+def session_is_valid(playwright, storage_state):
+    """Open SESSION_CHECK_URL with a saved session and check it is not sent back to a login page."""
+    browser = playwright.chromium.launch(headless=True)
+    try:
+        context = browser.new_context(storage_state=storage_state)
+        page = context.new_page()
+        page.goto(SESSION_CHECK_URL, wait_until="domcontentloaded", timeout=STEP_TIMEOUT)
+        return not is_login_url(page.url)
+    except Exception as e:
+        print(f"Error checking saved session: {e}")
+        return False
+    finally:
+        browser.close()
+
+
+def get_authenticated_state(playwright, session_file=SESSION_FILE, force_login=False):
+    """
+    Return the storage_state of a logged-in session, reusing the saved one while
+    it is valid and logging in again (and saving the new session) only when not.
+    :return: storage_state dict for browser.new_context(), or None if login failed.
+    """
+    if not force_login:
+        storage_state = load_session(session_file, SESSION_DOMAINS)
+        if storage_state and session_is_valid(playwright, storage_state):
+            print(f"Reusing saved session from {session_file}")
+            return storage_state
+        clear_session(session_file)
+
+    login = login_to_verizon_with_playwright(playwright)
+    if not login:
+        return None
+    context, page = login
+    storage_state = context.storage_state()
+    context.browser.close()  # The headed browser the login launched
+    save_session(session_file, storage_state)
+    return storage_state
+
+
 if __name__ == "__main__":
     with sync_playwright() as playwright:
-        login_to_verizon_with_playwright(playwright)
+        get_authenticated_state(playwright)
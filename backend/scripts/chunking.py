@@ -1,13 +1,71 @@
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
+from document_parser import iter_pages, list_documents
+from parse_cache import load_parse_index, save_parse_index, split_unchanged, record_parse, print_parse_stats
 
 PARSED_DIR = "../data/parsed_text_plain"
 CHUNKED_DIR = "../data/chunked_text_files"
 CHUNK_SIZE = 300  # Number of words per chunk
+# Parse index of chunk_documents(), kept in a subdirectory of the chunk output so
+# readers of the chunk *.json files do not pick it up
+CHUNK_INDEX_DIR = ".parse_cache"
 
 # Ensure the output directory exists
 os.makedirs(CHUNKED_DIR, exist_ok=True)
 
+def iter_chunks(pages, chunk_size=CHUNK_SIZE):
+    """
+    Chunk a stream of page texts, yielding each chunk as soon as it is full.
+
+    Args:
+        pages (iterable): (page_number, text) pairs, in order.
+        chunk_size (int): Number of words per chunk.
+
+    Yields:
+        tuple: (text, page_number) where page_number is the page the chunk starts on.
+    """
+    words = []
+    start_page = None
+    for page_number, text in pages:
+        for word in text.split():
+            if not words:
+                start_page = page_number
+            words.append(word)
+            if len(words) == chunk_size:
+                yield " ".join(words), start_page
+                words = []
+    if words:
+        yield " ".join(words), start_page
+
+def write_json_array(output_file, items):
+    """
+    Write items to a JSON array one at a time and return how many were written.
+    The file is written under a temporary name and renamed when complete. With
+    no items, no file is left behind, including the output of an earlier run.
+    """
+    tmp_file = f"{output_file}.tmp"
+    count = 0
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write("[")
+            for item in items:
+                f.write(",\n" if count else "\n")
+                f.write("    " + json.dumps(item, indent=4).replace("\n", "\n    "))
+                count += 1
+            f.write("\n]" if count else "]")
+    except Exception:
+        os.remove(tmp_file)
+        raise
+    if count:
+        os.replace(tmp_file, output_file)
+    else:
+        os.remove(tmp_file)
+        # The document no longer has chunks; do not leave the old ones to be indexed
+        if os.path.exists(output_file):
+            os.remove(output_file)
+    return count
+
 def chunk_text_file(file_path, chunk_size=CHUNK_SIZE):
     """
     Chunk the content of a plain text file into smaller parts.
@@ -22,15 +80,12 @@ def chunk_text_file(file_path, chunk_size=CHUNK_SIZE):
     chunks = []
     try:
         with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        words = content.split()
-        for i in range(0, len(words), chunk_size):
-            chunk = " ".join(words[i:i + chunk_size])
-            chunks.append({
-                "chunk_id": f"{os.path.basename(file_path).replace('.txt', '')}_{i // chunk_size}",
-                "text": chunk,
-            })
+            lines = ((None, line) for line in f)
+            for i, (chunk, _) in enumerate(iter_chunks(lines, chunk_size)):
+                chunks.append({
+                    "chunk_id": f"{os.path.basename(file_path).replace('.txt', '')}_{i}",
+                    "text": chunk,
+                })
         return chunks
     except Exception as e:
         print(f"Error chunking file {file_path}: {e}")
@@ -58,5 +113,88 @@ def chunk_parsed_data(parsed_dir, output_dir):
             else:
                 print(f"No chunks generated for {parsed_path}")
 
+def chunk_output_path(document_path, output_dir):
+    """Return the chunk file a document is chunked into."""
+    stem = os.path.splitext(os.path.basename(document_path))[0]
+    return os.path.join(output_dir, f"chunked_{stem}.json")
+
+def chunk_document(document_path, output_dir, chunk_size=CHUNK_SIZE):
+    """
+    Parse a PDF or HTML document page by page and write its chunks as they are
+    produced, without holding the whole document in memory.
+
+    Args:
+        document_path (str): Path to the document.
+        output_dir (str): Directory to save the chunked output file.
+        chunk_size (int): Number of words per chunk.
+
+    Returns:
+        int: Number of chunks written, or None if the document could not be chunked.
+    """
+    stem = os.path.splitext(os.path.basename(document_path))[0]
+    output_file = chunk_output_path(document_path, output_dir)
+    try:
+        pages = ((page["page_number"], page["text"]) for page in iter_pages(document_path))
+        chunks = (
+            {"chunk_id": f"{stem}_{i}", "text": text, "page_number": page_number}
+            for i, (text, page_number) in enumerate(iter_chunks(pages, chunk_size))
+        )
+        count = write_json_array(output_file, chunks)
+    except Exception as e:
+        print(f"Error chunking document {document_path}: {e}")
+        return None
+
+    if count:
+        print(f"{count} chunks saved to {output_file}")
+    else:
+        print(f"No chunks generated for {document_path}")
+    return count
+
+def chunk_documents(input_dirs, output_dir, processes=None, chunk_size=CHUNK_SIZE, force=False):
+    """
+    Stream every PDF in the input directories straight into chunk files, one
+    document per worker process. Documents unchanged since they were last
+    chunked (same fingerprint, see parse_cache.py, and chunk size) keep their
+    chunk files and are not parsed or OCRed again.
+
+    Args:
+        input_dirs (list): Directories containing PDF files.
+        output_dir (str): Directory to save chunked output files.
+        processes (int): Worker processes (defaults to all cores).
+        chunk_size (int): Number of words per chunk.
+        force (bool): Re-chunk every document, e.g. after a parser upgrade.
+
+    Returns:
+        int: Number of chunks written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    index_dir = os.path.join(output_dir, CHUNK_INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    index = load_parse_index(index_dir)
+    to_chunk, reused = split_unchanged(
+        index, list_documents(input_dirs), lambda path: chunk_output_path(path, output_dir), force
+    )
+    # Chunks written with another chunk size are stale even if the document is not
+    to_chunk += [path for path in reused if index[path].get("chunk_size") != chunk_size]
+    reused = [path for path in reused if index[path].get("chunk_size") == chunk_size]
+
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1 or len(to_chunk) <= 1:
+        counts = [chunk_document(path, output_dir, chunk_size) for path in to_chunk]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(to_chunk))) as executor:
+            counts = list(executor.map(
+                chunk_document, to_chunk, [output_dir] * len(to_chunk), [chunk_size] * len(to_chunk)
+            ))
+
+    for path, count in zip(to_chunk, counts):
+        if count is not None:
+            record_parse(index, path, chunk_output_path(path, output_dir))
+            index[path]["chunk_size"] = chunk_size
+    save_parse_index(index_dir, index)
+    failed = sum(1 for count in counts if count is None)
+    print_parse_stats(len(to_chunk) - failed, len(reused), failed)
+    return sum(count for count in counts if count)
+
 if __name__ == "__main__":
     chunk_parsed_data(PARSED_DIR, CHUNKED_DIR)
@@ -0,0 +1,135 @@
+import os
+import json
+import heapq
+from collections import deque
+from urllib.parse import urldefrag
+
+# Crawl frontier: the queue of URLs still to visit. A URL is queued at most
+# once (tracked in a set next to the queue) and never re-queued after it has
+# been visited, so popular navigation links cost one set lookup per sighting
+# instead of a queue entry each. Without a priority function the queue is a
+# FIFO deque (breadth-first crawl); with one it is a heap ordered by
+# priority(url, depth), lowest first.
+FRONTIER_VERSION = 1
+
+
+def normalize_url(url):
+    """Drop the #fragment so in-page anchors count as the same page."""
+    return urldefrag(url)[0]
+
+
+def new_frontier(visited=(), priority=None):
+    """
+    Create an empty frontier.
+    :param visited: URLs already crawled (e.g. from the progress file); they are not queued again.
+    :param priority: Optional function (url, depth) -> sort key; lower keys are popped first.
+    """
+    return {
+        "queue": deque() if priority is None else [],
+        "queued": set(),
+        "visited": {normalize_url(url) for url in visited},
+        "priority": priority,
+        "seq": 0,  # Tie-breaker keeping heap order stable for equal priorities
+        "duplicates": 0,
+    }
+
+
+def push(frontier, url, depth=0, force=False):
+    """
+    Queue a URL unless it is already queued or visited.
+    :param force: Queue it even if it was visited before (e.g. the start URL of a re-crawl).
+    :return: True if the URL was added.
+    """
+    url = normalize_url(url)
+    if url in frontier["queued"] or (url in frontier["visited"] and not force):
+        frontier["duplicates"] += 1
+        return False
+    frontier["queued"].add(url)
+    if frontier["priority"] is None:
+        frontier["queue"].append((url, depth))
+    else:
+        heapq.heappush(frontier["queue"], (frontier["priority"](url, depth), frontier["seq"], url, depth))
+        frontier["seq"] += 1
+    return True
+
+
+def push_all(frontier, urls, depth=0):
+    """Queue several URLs found at the same depth and return how many were new."""
+    return sum(push(frontier, url, depth) for url in urls)
+
+
+def pop(frontier):
+    """Take the next URL off the frontier and mark it visited. Returns (url, depth) or None."""
+    queue = frontier["queue"]
+    if not queue:
+        return None
+    if frontier["priority"] is None:
+        url, depth = queue.popleft()
+    else:
+        url, depth = heapq.heappop(queue)[2:]
+    frontier["queued"].discard(url)
+    frontier["visited"].add(url)
+    return url, depth
+
+
+def frontier_size(frontier):
+    """Number of URLs waiting to be visited."""
+    return len(frontier["queue"])
+
+
+def pending_urls(frontier):
+    """Queued (url, depth) pairs in the order they would be popped."""
+    if frontier["priority"] is None:
+        return list(frontier["queue"])
+    return [(url, depth) for _, _, url, depth in sorted(frontier["queue"])]
+
+
+def save_frontier(frontier, path):
+    """Write the pending URLs so an interrupted crawl can resume where it stopped."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": FRONTIER_VERSION, "pending": pending_urls(frontier)}, f)
+    os.replace(tmp_path, path)
+
+
+def load_frontier(path):
+    """Read pending (url, depth) pairs saved by save_frontier(), or [] if there are none."""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error reading frontier {path}, starting fresh: {e}")
+        return []
+    if data.get("version") != FRONTIER_VERSION:
+        return []
+    return [(url, depth) for url, depth in data["pending"]]
+
+
+def by_depth(url, depth):
+    """Priority: shallow pages first."""
+    return depth
+
+
+def by_section(sections):
+    """
+    Priority: URLs under the given path prefixes first, in the order given, then by depth.
+    :param sections: e.g. ["https://designsystem.verizon.com/components"]
+    """
+    def priority(url, depth):
+        for rank, prefix in enumerate(sections):
+            if url.startswith(prefix):
+                return rank, depth
+        return len(sections), depth
+    return priority
+
+
+def by_freshness(last_crawled):
+    """
+    Priority: never-crawled URLs first, then the ones crawled longest ago.
+    :param last_crawled: {url: timestamp of its last crawl}
+    """
+    def priority(url, depth):
+        return last_crawled.get(url, float("-inf")), depth
+    return priority
@@ -0,0 +1,329 @@
+import os
+import re
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF for PDF processing
+
+try:
+    import ocr  # Needs pytesseract and the tesseract binary
+except ImportError:
+    ocr = None
+
+# One parser for every ingestion path. PDFs are read with PyMuPDF, which is
+# several times faster than pdfplumber or PyPDF2; only pages that contain
+# tables are re-read with pdfplumber, whose layout mode keeps columns aligned.
+# Table detection (find_tables) is expensive, so it only runs on pages that
+# draw enough ruling lines to hold a table.
+PDF_EXTENSIONS = (".pdf",)
+HTML_EXTENSIONS = (".html", ".htm")
+URL_PATTERN = re.compile(r"https?://[^\s<>\"')\]]+")
+FILES_PER_TASK = 4  # Documents handed to a worker at a time
+OCR_ENABLED = True  # OCR PDF pages that have images but no text layer (when pytesseract is installed)
+DETECT_TABLES = True  # Re-read pages with tables through pdfplumber
+TABLE_MIN_RULES = 4  # Horizontal/vertical lines or boxes a page needs before it is searched for tables
+
+# HTML extraction: page chrome that is dropped, and where the main content is looked for
+SKIP_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer", "aside", "form"]
+SKIP_ROLES = ["navigation", "banner", "contentinfo", "search", "dialog"]
+MAIN_CONTENT_SELECTORS = ["main", "[role=main]", "article", "#content", "#main-content", ".content"]
+HEADING_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
+BLOCK_TAGS = HEADING_TAGS + [
+    "p", "div", "section", "article", "main", "ul", "ol", "li", "dl", "dt", "dd", "table",
+    "pre", "blockquote", "figure", "figcaption",
+]
+
+
+def unique(items):
+    """Remove duplicates, keeping the first occurrence."""
+    return list(dict.fromkeys(items))
+
+
+def has_ruling_lines(page, min_rules=TABLE_MIN_RULES):
+    """
+    Cheap pre-check for tables: return True once the page's vector graphics
+    contain min_rules horizontal or vertical lines or rectangles. PyMuPDF's
+    default table finder works from these lines, so a page without them has
+    no table it would find.
+    """
+    rules = 0
+    for path in page.get_drawings():
+        for item in path["items"]:
+            if item[0] == "re":
+                rules += 1
+            elif item[0] == "l":
+                start, end = item[1], item[2]
+                if abs(start.x - end.x) < 1 or abs(start.y - end.y) < 1:
+                    rules += 1
+            if rules >= min_rules:
+                return True
+    return False
+
+
+def page_has_tables(page):
+    """Return True if PyMuPDF finds a table on the page."""
+    find_tables = getattr(page, "find_tables", None)  # PyMuPDF >= 1.23
+    if find_tables is None or not DETECT_TABLES:
+        return False
+    try:
+        if not has_ruling_lines(page):
+            return False
+    except Exception:
+        return False
+    try:
+        return bool(find_tables().tables)
+    except Exception:
+        return False
+
+
+def extract_layout_page(pdf_path, page_number, plumber_pages):
+    """Re-read one page with pdfplumber and return its layout text and tables."""
+    import pdfplumber
+
+    if "pdf" not in plumber_pages:
+        plumber_pages["pdf"] = pdfplumber.open(pdf_path)
+    page = plumber_pages["pdf"].pages[page_number - 1]
+    try:
+        return page.extract_text(layout=True) or "", page.extract_tables()
+    finally:
+        # Drop the page's parsed layout objects so long documents do not accumulate them
+        if hasattr(page, "close"):
+            page.close()
+
+
+def page_needs_ocr(page, text):
+    """Return True for scanned pages: images on the page but no usable text layer."""
+    return ocr is not None and ocr.needs_ocr(text) and bool(page.get_images())
+
+
+def iter_pdf_pages(pdf_path, ocr_pages=False):
+    """
+    Yield a PDF's page records one at a time, so memory is bounded by a page
+    rather than the whole document.
+    :param pdf_path: Path to the PDF file.
+    :param ocr_pages: OCR scanned pages as they are reached. Otherwise they are
+        only flagged with needs_ocr, for ocr.ocr_record_pages() to OCR in parallel.
+    """
+    plumber_pages = {}  # pdfplumber handle, opened only if a page needs it
+    try:
+        with fitz.open(pdf_path) as pdf:
+            for page_number, page in enumerate(pdf, start=1):
+                text = page.get_text()
+                method = "pymupdf"
+                tables = []
+                if page_has_tables(page):
+                    try:
+                        text, tables = extract_layout_page(pdf_path, page_number, plumber_pages)
+                        method = "pdfplumber"
+                    except Exception as e:
+                        print(f"Layout extraction failed for page {page_number} of {pdf_path}: {e}")
+
+                scanned = page_needs_ocr(page, text)
+                if scanned and ocr_pages:
+                    try:
+                        text = ocr.cached_ocr(ocr.rasterize_page(page))
+                        method, scanned = "ocr", False
+                    except Exception as e:
+                        print(f"OCR failed for page {page_number} of {pdf_path}: {e}")
+
+                links = [link["uri"] for link in page.get_links() if link.get("uri")]
+                yield {
+                    "page_number": page_number,
+                    "text": text.strip(),
+                    "links": unique(links + URL_PATTERN.findall(text)),
+                    "tables": tables,
+                    "method": method,
+                    "needs_ocr": scanned,
+                }
+    finally:
+        if "pdf" in plumber_pages:
+            plumber_pages["pdf"].close()
+
+
+def parse_pdf(pdf_path):
+    """
+    Parse a PDF into a document record.
+    :param pdf_path: Path to the PDF file.
+    :return: Record with the full text, per-page text, tables and links.
+    """
+    return list(iter_pdf_pages(pdf_path))
+
+
+def is_block(tag):
+    """Return True for tags that start a new block of text."""
+    return tag.name in BLOCK_TAGS
+
+
+def html_blocks(element):
+    """
+    Yield the text blocks of an element in document order: headings as
+    "#"-prefixed lines, list items as "- " lines, tables one row per line with
+    " | " between cells, and code blocks verbatim.
+    """
+    from bs4 import Comment, NavigableString, Tag
+
+    for child in element.children:
+        if isinstance(child, Comment):
+            continue
+        if isinstance(child, NavigableString):
+            text = child.strip()
+            if text and child.parent.name not in SKIP_TAGS:
+                yield text
+            continue
+        if not isinstance(child, Tag) or child.name in SKIP_TAGS:
+            continue
+
+        if child.name in HEADING_TAGS:
+            yield f"{'#' * int(child.name[1])} {child.get_text(' ', strip=True)}"
+        elif child.name == "pre":
+            yield child.get_text().strip("\n")
+        elif child.name == "table":
+            for row in child.find_all("tr"):
+                cells = [cell.get_text(" ", strip=True) for cell in row.find_all(["th", "td"])]
+                if any(cells):
+                    yield " | ".join(cells)
+        elif child.find(is_block) is None:
+            # No block-level descendants: the whole element is one block of text
+            text = child.get_text(" ", strip=True)
+            if text:
+                yield f"- {text}" if child.name == "li" else text
+        else:
+            yield from html_blocks(child)
+
+
+def extract_main_content(html):
+    """
+    Extract readable text from a saved page: navigation, headers, footers and
+    scripts are dropped and only the main content region is kept.
+    :param html: Page HTML.
+    :return: (title, text, links) where links are the absolute hrefs of the whole page.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    links = [a["href"] for a in soup.find_all("a", href=True) if a["href"].startswith("http")]
+    title = soup.title.get_text(strip=True) if soup.title else ""
+
+    for element in soup.find_all(SKIP_TAGS):
+        element.decompose()
+    for element in soup.find_all(attrs={"role": SKIP_ROLES}):
+        element.decompose()
+
+    main = None
+    for selector in MAIN_CONTENT_SELECTORS:
+        main = soup.select_one(selector)
+        if main is not None and main.get_text(strip=True):
+            break
+    main = main or soup.body or soup
+
+    blocks = []
+    for block in html_blocks(main):
+        if not blocks or blocks[-1] != block:
+            blocks.append(block)
+    return title, "\n".join(blocks), unique(links)
+
+
+def parse_html(html_path):
+    """Parse a saved HTML page into a single-page document record."""
+    with open(html_path, "r", encoding="utf-8") as f:
+        title, text, links = extract_main_content(f.read())
+    return [{
+        "page_number": 1,
+        "title": title,
+        "text": text.strip(),
+        "links": unique(links + URL_PATTERN.findall(text)),
+        "tables": [],
+        "method": "html",
+    }]
+
+
+def iter_pages(path, ocr_pages=OCR_ENABLED):
+    """Yield the page records of a PDF or HTML file one at a time, OCR'ing scanned pages inline."""
+    if path.lower().endswith(HTML_EXTENSIONS):
+        yield from parse_html(path)
+    else:
+        yield from iter_pdf_pages(path, ocr_pages)
+
+
+def parse_document(path, ocr_pages=OCR_ENABLED):
+    """
+    Parse a PDF or HTML file into one structured record.
+    Errors are returned in the record instead of raised, so one bad file does
+    not stop a pool.
+    :param ocr_pages: OCR scanned PDF pages. Otherwise they are only flagged
+        with needs_ocr, for the caller to OCR (see parse_documents()).
+    :return: Dict with source, file_name, type, text, pages, links and error.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    record = {
+        "source": path,
+        "file_name": os.path.basename(path),
+        "type": "html" if extension in HTML_EXTENSIONS else "pdf",
+        "text": "",
+        "pages": [],
+        "links": [],
+        "error": None,
+    }
+    try:
+        pages = parse_html(path) if record["type"] == "html" else parse_pdf(path)
+    except Exception as e:
+        record["error"] = str(e)
+        print(f"❌ Failed to parse {path}: {e}")
+        return record
+
+    record["pages"] = pages
+    record["text"] = "\n".join(page["text"] for page in pages if page["text"])
+    record["links"] = unique(link for page in pages for link in page["links"])
+    if ocr_pages and ocr is not None and record["type"] == "pdf":
+        ocr.ocr_record_pages(record)
+    return record
+
+
+def list_documents(input_dirs, extensions=PDF_EXTENSIONS):
+    """List files with the given extensions in the input directories."""
+    paths = []
+    for input_dir in input_dirs:
+        if not os.path.isdir(input_dir):
+            print(f"Directory not found: {input_dir}")
+            continue
+        for file_name in sorted(os.listdir(input_dir)):
+            if file_name.lower().endswith(extensions):
+                paths.append(os.path.join(input_dir, file_name))
+    return paths
+
+
+def parse_documents(paths, processes=None, ocr_pages=OCR_ENABLED):
+    """
+    Parse documents on a process pool, yielding records in input order as they complete.
+    :param paths: Files to parse.
+    :param processes: Worker processes (defaults to all cores; 1 parses in-process).
+    :param ocr_pages: OCR pages without a text layer, spread across the worker processes.
+    """
+    processes = processes or os.cpu_count() or 1
+    ocr_pages = ocr_pages and ocr is not None
+    if processes <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield parse_document(path, ocr_pages)
+        return
+
+    # Scanned pages are OCR'd on their own pool, created only if one turns up,
+    # so a single large scanned document is still spread across every core.
+    ocr_executor = None
+    try:
+        with ProcessPoolExecutor(max_workers=min(processes, len(paths))) as executor:
+            # Workers only flag scanned pages; they are OCR'd page by page below
+            parse = partial(parse_document, ocr_pages=False)
+            for record in executor.map(parse, paths, chunksize=FILES_PER_TASK):
+                if ocr_pages and any(page.get("needs_ocr") for page in record["pages"]):
+                    ocr_executor = ocr_executor or ProcessPoolExecutor(max_workers=processes)
+                    ocr.ocr_record_pages(record, ocr_executor)
+                yield record
+    finally:
+        if ocr_executor is not None:
+            ocr_executor.shutdown()
+
+
+if __name__ == "__main__":
+    input_dirs = ["../data/pages_as_pdf", "../data/converted_downloads"]
+    for record in parse_documents(list_documents(input_dirs)):
+        methods = {page["method"] for page in record["pages"]}
+        print(f"{record['file_name']}: {len(record['pages'])} pages, {len(record['links'])} links, {sorted(methods)}")
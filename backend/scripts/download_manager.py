@@ -0,0 +1,307 @@
+import os
+import time
+import asyncio
+import hashlib
+from http.cookies import SimpleCookie, CookieError
+from urllib.parse import urlparse
+import aiohttp
+from yarl import URL
+from page_state import get_page_state, conditional_headers, content_changed, record_fetch, record_not_modified
+from rate_controller import new_rate_controller, run_limited, record_latency, rate_metrics
+
+# Asynchronous download manager for the crawler. One pooled aiohttp session
+# (keep-alive connections, bounded in total and per host) carries the browser
+# context's cookies, so authenticated assets download without the browser.
+# Each URL is downloaded at most once per crawl: submitting it again returns
+# the same task. Files are streamed to a .part file while being hashed, and an
+# interrupted download resumes from the .part file with a Range request. The
+# file's ETag or Last-Modified is kept next to the .part file and sent as
+# If-Range, so a file that changed since is downloaded again in full instead
+# of having the new version's tail appended to the old one.
+# How many requests run at once adapts to the server (see rate_controller.py).
+DOWNLOAD_CONCURRENCY = 4  # Requests at the same time to start with
+MAX_DOWNLOAD_CONCURRENCY = 16  # Upper bound for the rate controller, and open connections in total
+PER_HOST_CONCURRENCY = 16  # Open connections per host; the rate controller sets how many are used
+CHUNK_SIZE = 1 << 16
+RETRIES = 3
+RETRY_BACKOFF = 1.0  # Seconds, doubled after each failed attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+AUTH_STATUSES = {401, 403}  # Cookies are copied from the browser again before retrying
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+async def open_download_manager(context=None, page_state=None, concurrency=DOWNLOAD_CONCURRENCY,
+                                max_concurrency=MAX_DOWNLOAD_CONCURRENCY, per_host=PER_HOST_CONCURRENCY):
+    """
+    Create a download manager.
+    :param context: Playwright browser context whose cookies authenticate downloads.
+    :param page_state: Optional page state store (see page_state.py); a file already
+                       on disk is then requested conditionally and only rewritten if it changed.
+    :param concurrency: Requests at the same time to start with; grows up to max_concurrency
+                        while the server keeps up and shrinks when it throttles or slows down.
+    :return: Manager dict passed to the other functions.
+    """
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+    manager = {
+        "session": aiohttp.ClientSession(connector=connector, timeout=timeout),
+        "context": context,
+        "page_state": page_state,
+        "files": {},     # url -> task, kept for the whole crawl
+        "paths": {},     # save path -> url, so two URLs never write to the same file
+        "fetches": {},   # url -> task, while the fetch is in flight
+        "cookie_lock": asyncio.Lock(),
+        "rate": new_rate_controller("downloads", concurrency, maximum=max_concurrency),
+        "stats": {"downloaded": 0, "not_modified": 0, "unchanged": 0, "duplicate_urls": 0,
+                  "resumed": 0, "retries": 0, "failed": 0, "bytes": 0},
+    }
+    await sync_cookies(manager)
+    return manager
+
+
+async def sync_cookies(manager):
+    """Copy the browser context's cookies into the download session."""
+    if manager["context"] is None:
+        return
+    async with manager["cookie_lock"]:
+        jar = manager["session"].cookie_jar
+        # One cookie at a time: cookies with the same name on different domains
+        # or paths would overwrite each other in a single SimpleCookie
+        for cookie in await manager["context"].cookies():
+            host = cookie["domain"].lstrip(".")
+            morsels = SimpleCookie()
+            try:
+                morsels[cookie["name"]] = cookie["value"]
+            except CookieError:
+                print(f"Skipping cookie {cookie['name']!r} for {host}: not a valid cookie name")
+                continue
+            morsel = morsels[cookie["name"]]
+            if cookie["domain"].startswith("."):
+                morsel["domain"] = host  # Also sent to subdomains; otherwise host-only
+            morsel["path"] = cookie["path"]
+            if cookie.get("secure"):
+                morsel["secure"] = True
+            jar.update_cookies(morsels, response_url=URL(f"https://{host}{cookie['path']}"))
+
+
+async def with_retries(manager, url, attempt_fn):
+    """
+    Run attempt_fn() in a rate controller slot, retrying on connection errors,
+    throttling and server errors.
+    """
+    delay = RETRY_BACKOFF
+    for attempt in range(RETRIES + 1):
+        try:
+            return await run_limited(manager["rate"], attempt_fn)
+        except (aiohttp.ClientError, asyncio.TimeoutError, RetryableStatus) as e:
+            # Other HTTP errors (404 and the like) will not go away on retry
+            if attempt == RETRIES or isinstance(e, aiohttp.ClientResponseError):
+                raise
+            if isinstance(e, RetryableStatus) and e.status in AUTH_STATUSES:
+                await sync_cookies(manager)
+            manager["stats"]["retries"] += 1
+            print(f"Retrying {url} in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+
+def check_status(response):
+    if response.status in RETRY_STATUSES or response.status in AUTH_STATUSES:
+        raise RetryableStatus(response.status)
+    response.raise_for_status()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest
+
+
+def range_validator(headers):
+    """Return the If-Range validator for a response: a strong ETag, else Last-Modified, else None."""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def validator_path(part_path):
+    return f"{part_path}.validator"
+
+
+def read_validator(part_path):
+    try:
+        with open(validator_path(part_path), "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_validator(part_path, validator):
+    if validator:
+        with open(validator_path(part_path), "w") as f:
+            f.write(validator)
+    else:
+        remove_file(validator_path(part_path))
+
+
+def remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def download_to(manager, url, save_path):
+    """
+    Stream a URL to save_path.
+    :return: "downloaded", "not_modified" (304) or "unchanged" (same content as the file on disk).
+    """
+    page_state = manager["page_state"]
+    part_path = f"{save_path}.part"
+    known = get_page_state(page_state, url) if page_state and os.path.exists(save_path) else None
+
+    async def attempt():
+        headers = conditional_headers(known)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = read_validator(part_path) if offset else None
+        if offset and not validator:
+            # Without a validator there is no telling whether the partial file is still current
+            remove_file(part_path)
+            offset = 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator  # The server sends the whole file if it changed
+        start = time.perf_counter()
+        async with manager["session"].get(url, headers=headers) as response:
+            record_latency(manager["rate"], (time.perf_counter() - start) * 1000)
+            if response.status == 304 and known:
+                return "not_modified", response.headers, None
+            if response.status == 416 and offset:
+                # The partial file does not fit the current file any more; start over
+                remove_file(part_path)
+                remove_file(validator_path(part_path))
+                raise RetryableStatus(response.status)
+            check_status(response)
+            if response.status == 206 and offset:
+                manager["stats"]["resumed"] += 1
+                digest = file_digest(part_path)
+                mode = "ab"
+            else:
+                digest = hashlib.sha256()
+                mode = "wb"
+                write_validator(part_path, range_validator(response.headers))
+            with open(part_path, mode) as f:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    manager["stats"]["bytes"] += len(chunk)
+            return "downloaded", response.headers, digest.hexdigest()
+
+    status, headers, file_hash = await with_retries(manager, url, attempt)
+    remove_file(validator_path(part_path))
+    if status == "not_modified":
+        record_not_modified(page_state, url)
+        return status
+
+    if content_changed(known, file_hash):
+        os.replace(part_path, save_path)
+    else:
+        # Keep the existing file (and its mtime) so it is not parsed again
+        os.remove(part_path)
+        status = "unchanged"
+    if page_state:
+        record_fetch(page_state, url, headers, file_hash)
+    return status
+
+
+async def run_download(manager, url, save_path):
+    try:
+        status = await download_to(manager, url, save_path)
+    except Exception as e:
+        print(f"Error downloading {url}: {e}")
+        manager["stats"]["failed"] += 1
+        return None
+    manager["stats"][status] += 1
+    if status == "downloaded":
+        print(f"Downloaded file: {save_path}")
+    return save_path
+
+
+def download_filename(url):
+    """
+    File name for a downloaded URL: the last path segment, with a hash of the
+    full URL added when the query string tells files apart (e.g. /download?id=1).
+    """
+    parsed = urlparse(url)
+    name = os.path.basename(parsed.path)
+    if parsed.query or not name:
+        stem, ext = os.path.splitext(name or "download")
+        name = f"{stem}_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]}{ext}"
+    return name
+
+
+def submit_download(manager, url, save_dir):
+    """
+    Start downloading a file in the background.
+    :return: Task resolving to the saved path, or None if the download failed.
+             A URL submitted before returns its existing task.
+    """
+    task = manager["files"].get(url)
+    if task is not None:
+        manager["stats"]["duplicate_urls"] += 1
+        return task
+    os.makedirs(save_dir, exist_ok=True)
+    save_path = os.path.join(save_dir, download_filename(url))
+    claimed_by = manager["paths"].setdefault(save_path, url)
+    if claimed_by != url:
+        # Another URL with the same file name (e.g. /a/file.pdf and /b/file.pdf)
+        # must not share its .part file
+        stem, ext = os.path.splitext(save_path)
+        save_path = f"{stem}_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]}{ext}"
+        manager["paths"][save_path] = url
+    task = asyncio.ensure_future(run_download(manager, url, save_path))
+    manager["files"][url] = task
+    return task
+
+
+async def fetch_bytes(manager, url):
+    """Fetch a URL into memory through the pooled session. Concurrent fetches of one URL share a request."""
+    task = manager["fetches"].get(url)
+    if task is None:
+        async def attempt():
+            start = time.perf_counter()
+            async with manager["session"].get(url) as response:
+                record_latency(manager["rate"], (time.perf_counter() - start) * 1000)
+                check_status(response)
+                return await response.read()
+
+        task = asyncio.ensure_future(with_retries(manager, url, attempt))
+        manager["fetches"][url] = task
+        task.add_done_callback(lambda _: manager["fetches"].pop(url, None))
+    return await asyncio.shield(task)
+
+
+def download_stats(manager):
+    return dict(manager["stats"])
+
+
+def download_rate(manager):
+    """Current concurrency limit, its bounds and throughput of the download manager."""
+    return rate_metrics(manager["rate"])
+
+
+async def close_download_manager(manager):
+    """Wait for outstanding downloads, then close the session."""
+    pending = [task for task in manager["files"].values() if not task.done()]
+    if pending:
+        print(f"Waiting for {len(pending)} downloads to finish...")
+        await asyncio.gather(*pending)
+    await manager["session"].close()
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Backends selectable for embedding. All of them return a SentenceTransformer,
+# so callers keep using model.encode().
+#   torch     - PyTorch fp32 (default)
+#   onnx      - ONNX Runtime fp32, exported from the local model on first use
+#   onnx-int8 - ONNX Runtime with dynamic int8 quantization
+BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2")  # arm64, avx2, avx512 or avx512_vnni
+ONNX_FILE = os.path.join("onnx", "model.onnx")
+PARITY_THRESHOLD = 0.99  # Minimum mean cosine agreement with the torch model
+
+
+def quantized_file_suffix(quantization_config=QUANTIZATION_CONFIG):
+    """
+    Return the suffix the int8 export is saved under. It is passed to the export
+    explicitly, since sentence-transformers' default depends on the weight type
+    of the config (quint8 for avx2, qint8 for arm64).
+    """
+    return f"int8_{quantization_config}"
+
+
+def quantized_file_name(quantization_config=QUANTIZATION_CONFIG):
+    """Return the path of the int8 export within the model directory."""
+    return os.path.join("onnx", f"model_{quantized_file_suffix(quantization_config)}.onnx")
+
+
+def export_onnx(model_path):
+    """Export the local model to ONNX next to its weights, if not already done."""
+    # Hub models are loaded with their published ONNX files instead
+    if not os.path.isdir(model_path) or os.path.exists(os.path.join(model_path, ONNX_FILE)):
+        return
+    print(f"Exporting {model_path} to ONNX...")
+    model = SentenceTransformer(model_path, backend="onnx")
+    model.save_pretrained(model_path)
+
+
+def export_quantized_onnx(model_path, quantization_config=QUANTIZATION_CONFIG):
+    """Write a dynamic int8 quantized ONNX model next to the fp32 export."""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    if not os.path.isdir(model_path) or os.path.exists(os.path.join(model_path, quantized_file_name(quantization_config))):
+        return
+    export_onnx(model_path)
+    print(f"Quantizing {model_path} to int8 ({quantization_config})...")
+    model = SentenceTransformer(model_path, backend="onnx")
+    export_dynamic_quantized_onnx_model(
+        model, quantization_config, model_path, file_suffix=quantized_file_suffix(quantization_config)
+    )
+
+
+def load_embedding_model(model_path, backend=EMBEDDING_BACKEND):
+    """
+    Load an embedding model with the requested backend.
+    :param model_path: Path to the local sentence-transformers model.
+    :param backend: One of BACKENDS.
+    :return: SentenceTransformer whose encode() runs on that backend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose from {BACKENDS}")
+
+    if backend == "torch":
+        return SentenceTransformer(model_path)
+    if backend == "onnx":
+        export_onnx(model_path)
+        return SentenceTransformer(model_path, backend="onnx", model_kwargs={"file_name": ONNX_FILE})
+
+    export_quantized_onnx(model_path)
+    return SentenceTransformer(
+        model_path, backend="onnx", model_kwargs={"file_name": quantized_file_name()}
+    )
+
+
+def parity_check(model, texts, reference):
+    """
+    Compare a model's embeddings with reference (torch) embeddings of the same texts.
+    :param model: Model loaded with the backend under test.
+    :param texts: Texts to encode.
+    :param reference: Normalized torch embeddings of the texts.
+    :return: Dict with mean and minimum cosine similarity per text.
+    """
+    candidate = model.encode(texts, normalize_embeddings=True)
+    cosines = np.sum(np.asarray(reference) * np.asarray(candidate), axis=1)
+    return {
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "min_cosine": round(float(cosines.min()), 5),
+        "passed": bool(cosines.mean() >= PARITY_THRESHOLD),
+    }
+
+
+def measure_throughput(model, texts, batch_size):
+    """Return texts encoded per second at the given batch size."""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # Warm up
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def compare_backends(model_path, texts, backends=BACKENDS, query_count=200):
+    """
+    Report parity with torch and throughput for query-time (batch 1) and
+    ingestion-time (batch 32) encoding on each backend.
+    """
+    torch_model = load_embedding_model(model_path, "torch")
+    reference = torch_model.encode(texts, normalize_embeddings=True)
+
+    report = []
+    for backend in backends:
+        model = torch_model if backend == "torch" else load_embedding_model(model_path, backend)
+        result = {"backend": backend}
+        if backend != "torch":
+            result.update(parity_check(model, texts, reference))
+        result["query_texts_per_s"] = round(measure_throughput(model, texts[:query_count], 1), 1)
+        result["ingest_texts_per_s"] = round(measure_throughput(model, texts, 32), 1)
+        report.append(result)
+        print(result)
+    return report
+
+
+def load_sample_texts(chunked_dir, limit=2000):
+    """Load chunk texts from the corpus to benchmark on."""
+    texts = []
+    for chunk_file in sorted(os.listdir(chunked_dir)):
+        if not chunk_file.endswith(".json"):
+            continue
+        with open(os.path.join(chunked_dir, chunk_file), "r", encoding="utf-8") as f:
+            texts.extend(chunk["text"] for chunk in json.load(f))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+if __name__ == "__main__":
+    model_path = "../models/all-MiniLM-L6-v2"
+    chunked_dir = "../data/chunked_text_files"
+    compare_backends(model_path, load_sample_texts(chunked_dir))
@@ -0,0 +1,201 @@
+import os
+import time
+import sqlite3
+import hashlib
+import numpy as np
+
+# One cache for every ingestion path (embed_chunks, Chroma, pgvector), stored in
+# the project-level cache folder the Chroma and LLM scripts already use.
+CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "cache", "embedding_cache.sqlite"),
+)
+MAX_CACHE_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+EVICT_TO_RATIO = 0.9  # Evict down to this fraction of MAX_CACHE_BYTES
+LOOKUP_BATCH = 500  # Stay under SQLite's bound-parameter limit
+
+
+def open_cache(path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+    """
+    Open (or create) the embedding cache.
+    :param path: SQLite file holding the cache.
+    :param max_bytes: Vector bytes kept before least recently used entries are evicted.
+    :return: Cache dict passed to the other functions.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key BLOB PRIMARY KEY,
+            model TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+    conn.commit()
+    return {"conn": conn, "path": path, "max_bytes": max_bytes, "hits": 0, "misses": 0}
+
+
+def close_cache(cache):
+    """Evict if over budget and close the cache."""
+    evict(cache)
+    cache["conn"].close()
+
+
+def model_identifier(model_path, backend="torch"):
+    """
+    Identify the vectors a model produces; different backends give slightly different vectors.
+    A local model is identified by its full resolved path, so two checkpoints in
+    folders with the same name (e.g. .../v1/model and .../v2/model) do not share entries.
+    """
+    name = os.path.basename(os.path.normpath(model_path))
+    if os.path.isdir(model_path):
+        location = hashlib.sha256(os.path.realpath(model_path).encode("utf-8")).hexdigest()[:12]
+        name = f"{name}@{location}"
+    return f"{name}:{backend}"
+
+
+def normalize_text(text):
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return " ".join(text.split())
+
+
+def cache_key(model_id, text):
+    """Content address for an embedding: hash of the model id and the normalized text."""
+    return hashlib.sha256(f"{model_id}\x00{normalize_text(text)}".encode("utf-8")).digest()
+
+
+def get_many(cache, keys):
+    """Return {key: vector} for the keys present in the cache and refresh their access time."""
+    found = {}
+    conn = cache["conn"]
+    for i in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[i:i + LOOKUP_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        rows = conn.execute(f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+        for key, dim, vector in rows:
+            found[key] = np.frombuffer(vector, dtype=np.float32, count=dim)
+        conn.execute(f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders})", [time.time()] + batch)
+    conn.commit()
+    return found
+
+
+def put_many(cache, model_id, keys, vectors):
+    """Store float32 vectors under their content keys."""
+    now = time.time()
+    vectors = np.asarray(vectors, dtype=np.float32)
+    cache["conn"].executemany(
+        "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+        [(key, model_id, vector.shape[0], vector.tobytes(), now) for key, vector in zip(keys, vectors)],
+    )
+    cache["conn"].commit()
+
+
+def encode_with_cache(cache, model_id, texts, encode_fn):
+    """
+    Return embeddings for texts, encoding only the ones not already cached.
+    :param cache: Cache from open_cache(), or None to always encode.
+    :param model_id: Identifier from model_identifier().
+    :param texts: Texts to embed.
+    :param encode_fn: Called with the list of uncached texts; returns their embeddings.
+    :return: float32 array with one row per text, in input order.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    if cache is None:
+        return np.asarray(encode_fn(texts), dtype=np.float32)
+
+    keys = [cache_key(model_id, text) for text in texts]
+    found = get_many(cache, list(set(keys)))
+
+    # Encode each distinct missing text once
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+    misses = sum(1 for key in keys if key not in found)
+    cache["hits"] += len(keys) - misses
+    cache["misses"] += misses
+
+    if missing:
+        missing_keys = list(missing)
+        vectors = np.asarray(encode_fn([missing[key] for key in missing_keys]), dtype=np.float32)
+        put_many(cache, model_id, missing_keys, vectors)
+        found.update(zip(missing_keys, vectors))
+
+    return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+
+def evict(cache):
+    """Drop least recently used entries once the cache exceeds its byte budget."""
+    conn = cache["conn"]
+    total = conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+    if total <= cache["max_bytes"]:
+        return 0
+
+    target = cache["max_bytes"] * EVICT_TO_RATIO
+    rows = conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access").fetchall()
+    doomed = []
+    for key, size in rows:
+        if total <= target:
+            break
+        doomed.append((key,))
+        total -= size
+    conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+    conn.commit()
+    evicted = len(doomed)
+    print(f"Evicted {evicted} embeddings from cache {cache['path']}")
+    return evicted
+
+
+def cache_stats(cache):
+    """Return hit/miss counts for this session plus the cache's size on disk."""
+    entries, size = cache["conn"].execute(
+        "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+    ).fetchone()
+    lookups = cache["hits"] + cache["misses"]
+    return {
+        "hits": cache["hits"],
+        "misses": cache["misses"],
+        "hit_rate": round(cache["hits"] / lookups, 4) if lookups else 0.0,
+        "entries": entries,
+        "bytes": size,
+    }
+
+
+def cached_langchain_embeddings(load_model, model_id, cache):
+    """
+    Langchain embeddings whose embed_documents() goes through the cache.
+    :param load_model: Returns the wrapped langchain embedding model; only called once something is not cached.
+    :param model_id: Identifier for the wrapped model's vectors.
+    :param cache: Cache from open_cache().
+    """
+    from langchain_core.embeddings import Embeddings
+
+    state = {"model": None}
+
+    def get_model():
+        if state["model"] is None:
+            state["model"] = load_model()
+        return state["model"]
+
+    class CachedEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return encode_with_cache(
+                cache, model_id, texts, lambda missing: get_model().embed_documents(missing)
+            ).tolist()
+
+        def embed_query(self, text):
+            # Queries are not cached
+            return get_model().embed_query(text)
+
+    return CachedEmbeddings()
+
+
+if __name__ == "__main__":
+    cache = open_cache()
+    print(cache_stats(cache))
+    close_cache(cache)
@@ -1,45 +1,100 @@
 import os
 import json
-from sentence_transformers import SentenceTransformer
+from embedding_backends import load_embedding_model, EMBEDDING_BACKEND
+from parallel_embedding import encode_texts_pooled
+from embedding_cache import open_cache, close_cache, cache_stats, encode_with_cache, model_identifier
+from embedding_store import save_embeddings, remove_embeddings, shard_paths, file_hash, load_manifest, save_manifest
 
-def embed_chunks(chunked_dir, embedding_dir, model_name="all-MiniLM-L6-v2"):
+def embed_chunks(chunked_dir, embedding_dir, model_name="all-MiniLM-L6-v2", processes=None, backend=EMBEDDING_BACKEND):
     """
     Generate embeddings for chunked data.
     :param chunked_dir: Directory containing chunked text files.
     :param embedding_dir: Directory to save the embeddings.
     :param model_name: Hugging Face model to use for embeddings.
+    :param processes: Worker processes to encode with (defaults to all cores that fit in memory).
+    :param backend: Embedding backend ("torch", "onnx" or "onnx-int8").
     """
     os.makedirs(embedding_dir, exist_ok=True)
-    model = SentenceTransformer(model_name)
     print(f"Using embedding model: {model_name}")
 
+    # The manifest records which chunk file version each shard was built from
+    manifest = load_manifest(embedding_dir)
+    seen_shards = set()
+    pending = []
+
     for chunk_file in os.listdir(chunked_dir):
         if not chunk_file.endswith(".json"):
             continue
 
         chunk_path = os.path.join(chunked_dir, chunk_file)
-        embedding_path = os.path.join(embedding_dir, f"{os.path.splitext(chunk_file)[0]}_embeddings.json")
+        shard_name = os.path.splitext(chunk_file)[0]
+        seen_shards.add(shard_name)
 
         try:
+            # Skip chunk files that have not changed since they were embedded
+            source_hash = file_hash(chunk_path)
+            entry = manifest.get(shard_name)
+            if (
+                entry
+                and entry["hash"] == source_hash
+                and entry["model"] == model_name
+                and entry.get("backend", "torch") == backend
+                and os.path.exists(shard_paths(embedding_dir, shard_name)[0])
+            ):
+                print(f"Unchanged: {chunk_file}, skipping.")
+                continue
+
             # Load chunks
             with open(chunk_path, "r", encoding="utf-8") as f:
                 chunks = json.load(f)
 
-            # Generate embeddings
-            embeddings = model.encode([chunk["text"] for chunk in chunks], show_progress_bar=True)
+            if not chunks:
+                print(f"No chunks in {chunk_file}, skipping.")
+                remove_embeddings(embedding_dir, shard_name)
+                manifest.pop(shard_name, None)
+                continue
+
+            pending.append((shard_name, source_hash, chunks))
+        except Exception as e:
+            print(f"Error processing {chunk_file}: {e}")
+
+    # Generate embeddings for all changed files in one pass so every worker stays busy.
+    # Texts already in the embedding cache are not re-encoded, and the model is
+    # only loaded when something is missing.
+    texts = [chunk["text"] for _, _, chunks in pending for chunk in chunks]
+    cache = open_cache()
+    try:
+        embeddings = encode_with_cache(
+            cache, model_identifier(model_name, backend), texts,
+            lambda missing: encode_texts_pooled(load_embedding_model(model_name, backend), missing, processes),
+        )
+        print(f"Embedding cache: {cache_stats(cache)}")
+    finally:
+        close_cache(cache)
 
-            # Save embeddings
-            embedding_data = [
-                {"chunk_id": chunk["chunk_id"], "embedding": embedding.tolist()}
-                for chunk, embedding in zip(chunks, embeddings)
-            ]
+    offset = 0
+    for shard_name, source_hash, chunks in pending:
+        shard_embeddings = embeddings[offset:offset + len(chunks)]
+        offset += len(chunks)
+        try:
+            # Save embeddings as a float32 shard with an id sidecar
+            embedding_path = save_embeddings(
+                embedding_dir, shard_name, [chunk["chunk_id"] for chunk in chunks], shard_embeddings
+            )
 
-            with open(embedding_path, "w", encoding="utf-8") as f:
-                json.dump(embedding_data, f, indent=4)
+            manifest[shard_name] = {"hash": source_hash, "model": model_name, "backend": backend, "count": len(chunks)}
 
             print(f"Embeddings saved to {embedding_path}")
         except Exception as e:
-            print(f"Error processing {chunk_file}: {e}")
+            print(f"Error saving embeddings for {shard_name}: {e}")
+
+    # Drop shards whose chunk files no longer exist
+    for shard_name in set(manifest) - seen_shards:
+        remove_embeddings(embedding_dir, shard_name)
+        del manifest[shard_name]
+        print(f"Removed embeddings for deleted chunk file: {shard_name}")
+
+    save_manifest(embedding_dir, manifest)
 
 if __name__ == "__main__":
     chunked_dir = "../data/chunked_text_files"
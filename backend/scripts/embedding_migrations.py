@@ -0,0 +1,173 @@
+import time
+
+# Model switches for pgvector tables. While a migration is "running", new
+# vectors are written to SHADOW_COLUMN alongside the live "embedding" column;
+# at cutover the shadow column replaces it and the migration becomes "done".
+# Each table has one row: model_path/dim is the migration's target, and
+# live_model_path/live_dim the model of the live column while it runs.
+# Writers and searches hold a shared advisory lock for the table (see
+# lock_for_write() and lock_for_read()) and cutover an exclusive one, so a
+# transaction sees either the state before the swap or the state after it,
+# never a mix.
+MIGRATIONS_TABLE = "embedding_migrations"
+SHADOW_COLUMN = "embedding_next"
+
+
+def create_migrations_table(cursor):
+    """Create the table recording each table's model switch."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            model_path TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            live_model_path TEXT,
+            live_dim INTEGER,
+            status TEXT NOT NULL,
+            started_at DOUBLE PRECISION,
+            completed_at DOUBLE PRECISION
+        );
+    """)
+    # Tables created before the live model was recorded
+    cursor.execute(f"""
+        ALTER TABLE {MIGRATIONS_TABLE}
+        ADD COLUMN IF NOT EXISTS live_model_path TEXT,
+        ADD COLUMN IF NOT EXISTS live_dim INTEGER;
+    """)
+
+
+def get_migration(cursor, table_name):
+    """
+    Return the latest model switch for a table, or None if it never had one.
+    :return: Dict with model_path and dim (the target model), live_model_path and live_dim
+             (the model of the live column when the migration started), status
+             ("running" or "done"), started_at and completed_at.
+    """
+    cursor.execute("SELECT to_regclass(%s);", (MIGRATIONS_TABLE,))
+    if cursor.fetchone()[0] is None:
+        return None
+    cursor.execute(f"""
+        SELECT model_path, dim, live_model_path, live_dim, status, started_at, completed_at
+        FROM {MIGRATIONS_TABLE}
+        WHERE table_name = %s;
+    """, (table_name,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    model_path, dim, live_model_path, live_dim, status, started_at, completed_at = row
+    return {
+        "table_name": table_name,
+        "model_path": model_path,
+        "dim": dim,
+        "live_model_path": live_model_path,
+        "live_dim": live_dim,
+        "status": status,
+        "started_at": started_at,
+        "completed_at": completed_at,
+    }
+
+
+def active_model(cursor, table_name, default_model_path, default_dim):
+    """Return (model_path, dim) that the live embedding column was built with."""
+    migration = get_migration(cursor, table_name)
+    if migration and migration["status"] == "done":
+        return migration["model_path"], migration["dim"]
+    if migration and migration["live_model_path"]:
+        return migration["live_model_path"], migration["live_dim"]
+    return default_model_path, default_dim
+
+
+def shadow_model(cursor, table_name):
+    """Return the migration new rows must also be embedded for, or None when no switch is running."""
+    migration = get_migration(cursor, table_name)
+    if migration and migration["status"] == "running":
+        return migration
+    return None
+
+
+def start_migration(cursor, table_name, model_path, dim, default_model_path, default_dim):
+    """
+    Add the shadow column and record the running migration. Re-running resumes an interrupted backfill.
+    :param default_model_path: Model of the live column if the table was never migrated.
+    :param default_dim: Its embedding dimension.
+    """
+    create_migrations_table(cursor)
+    live_model_path, live_dim = active_model(cursor, table_name, default_model_path, default_dim)
+    previous = get_migration(cursor, table_name)
+    if previous and previous["status"] == "running" and previous["model_path"] != model_path:
+        # Shadow vectors from a different target model cannot be reused
+        cursor.execute(f"ALTER TABLE {table_name} DROP COLUMN IF EXISTS {SHADOW_COLUMN};")
+    cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {SHADOW_COLUMN} VECTOR({int(dim)});")
+    cursor.execute(f"""
+        INSERT INTO {MIGRATIONS_TABLE}
+            (table_name, model_path, dim, live_model_path, live_dim, status, started_at, completed_at)
+        VALUES (%s, %s, %s, %s, %s, 'running', %s, NULL)
+        ON CONFLICT (table_name) DO UPDATE
+        SET model_path = EXCLUDED.model_path, dim = EXCLUDED.dim,
+            live_model_path = EXCLUDED.live_model_path, live_dim = EXCLUDED.live_dim, status = 'running',
+            started_at = COALESCE(
+                CASE WHEN {MIGRATIONS_TABLE}.status = 'running'
+                     AND {MIGRATIONS_TABLE}.model_path = EXCLUDED.model_path
+                THEN {MIGRATIONS_TABLE}.started_at END,
+                EXCLUDED.started_at
+            ),
+            completed_at = NULL;
+    """, (table_name, model_path, dim, live_model_path, live_dim, time.time()))
+
+
+def lock_key(table_name):
+    return f"{MIGRATIONS_TABLE}:{table_name}"
+
+
+def lock_for_write(cursor, table_name):
+    """
+    Hold off cutover until the current transaction ends. Call it at the start of
+    a write transaction, then read the migration state and write with it.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock_shared(hashtext(%s));", (lock_key(table_name),))
+
+
+def lock_for_read(cursor, table_name):
+    """
+    Hold off cutover until the current transaction ends. Call it before reading
+    the live model with active_model(), so a search in the same transaction
+    runs against the column that model built.
+    """
+    lock_for_write(cursor, table_name)
+
+
+def migration_coverage(cursor, table_name):
+    """Return (rows with a shadow vector, total rows)."""
+    cursor.execute(f"SELECT COUNT({SHADOW_COLUMN}), COUNT(*) FROM {table_name};")
+    return cursor.fetchone()
+
+
+def cutover(conn, table_name):
+    """
+    Swap the shadow column in as the live embedding column in one transaction.
+    Writers are blocked while coverage is re-checked, so rows inserted without
+    a shadow vector cannot slip through.
+    :return: True if the swap happened, False if rows still lack a shadow vector.
+    """
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cursor:
+            # Wait for write transactions that read the migration state before the swap
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (lock_key(table_name),))
+            cursor.execute(f"LOCK TABLE {table_name} IN SHARE ROW EXCLUSIVE MODE;")
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE {SHADOW_COLUMN} IS NULL;")
+            if cursor.fetchone()[0]:
+                conn.rollback()
+                return False
+            cursor.execute(f"ALTER TABLE {table_name} DROP COLUMN embedding;")
+            cursor.execute(f"ALTER TABLE {table_name} RENAME COLUMN {SHADOW_COLUMN} TO embedding;")
+            cursor.execute(f"""
+                UPDATE {MIGRATIONS_TABLE} SET status = 'done', completed_at = %s WHERE table_name = %s;
+            """, (time.time(), table_name))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = autocommit
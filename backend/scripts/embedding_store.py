@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+EMBEDDING_SUFFIX = "_embeddings.npy"
+IDS_SUFFIX = "_ids.txt"
+LEGACY_SUFFIX = "_embeddings.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def shard_paths(embedding_dir, shard_name):
+    """Return the (vectors, ids) file paths for a shard."""
+    return (
+        os.path.join(embedding_dir, f"{shard_name}{EMBEDDING_SUFFIX}"),
+        os.path.join(embedding_dir, f"{shard_name}{IDS_SUFFIX}"),
+    )
+
+
+def list_shards(embedding_dir):
+    """List shard names stored in the embedding directory."""
+    if not os.path.exists(embedding_dir):
+        return []
+    return sorted(
+        file_name[: -len(EMBEDDING_SUFFIX)]
+        for file_name in os.listdir(embedding_dir)
+        if file_name.endswith(EMBEDDING_SUFFIX)
+    )
+
+
+def save_embeddings(embedding_dir, shard_name, chunk_ids, embeddings):
+    """
+    Save a shard of embeddings as a contiguous float32 .npy file plus an id sidecar.
+    :param embedding_dir: Directory to save the shard in.
+    :param shard_name: Base name of the shard (usually the chunk file name).
+    :param chunk_ids: Chunk IDs, one per embedding row.
+    :param embeddings: 2-D array-like of embeddings.
+    :return: Path to the saved vectors file.
+    """
+    os.makedirs(embedding_dir, exist_ok=True)
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(chunk_ids):
+        raise ValueError(f"Expected {len(chunk_ids)} embedding rows, got shape {vectors.shape}")
+
+    vectors_path, ids_path = shard_paths(embedding_dir, shard_name)
+
+    # Write to temporary files first so readers never see a half-written shard
+    with open(f"{vectors_path}.tmp", "wb") as f:
+        np.save(f, vectors)
+    with open(f"{ids_path}.tmp", "w", encoding="utf-8") as f:
+        f.write("\n".join(str(chunk_id) for chunk_id in chunk_ids))
+    os.replace(f"{ids_path}.tmp", ids_path)
+    os.replace(f"{vectors_path}.tmp", vectors_path)
+    return vectors_path
+
+
+def load_embeddings(embedding_dir, shard_name, mmap=True):
+    """
+    Load a shard of embeddings.
+    :param embedding_dir: Directory containing the shard.
+    :param shard_name: Base name of the shard.
+    :param mmap: Memory-map the vectors instead of reading them into RAM.
+    :return: Tuple of (chunk_ids, vectors).
+    """
+    vectors_path, ids_path = shard_paths(embedding_dir, shard_name)
+    vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+    with open(ids_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    chunk_ids = content.split("\n") if content else []
+    if len(chunk_ids) != len(vectors):
+        raise ValueError(f"Shard {shard_name} has {len(vectors)} vectors but {len(chunk_ids)} ids")
+    return chunk_ids, vectors
+
+
+def iter_embeddings(embedding_dir, mmap=True):
+    """Yield (shard_name, chunk_ids, vectors) for every shard in the directory."""
+    for shard_name in list_shards(embedding_dir):
+        try:
+            chunk_ids, vectors = load_embeddings(embedding_dir, shard_name, mmap=mmap)
+        except Exception as e:
+            print(f"Error loading embedding shard {shard_name}: {e}")
+            continue
+        yield shard_name, chunk_ids, vectors
+
+
+def remove_embeddings(embedding_dir, shard_name):
+    """Delete a shard's vectors and id sidecar."""
+    for path in shard_paths(embedding_dir, shard_name):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def file_hash(path):
+    """Return the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(embedding_dir):
+    """
+    Load the embedding manifest: shard_name -> {"hash", "count"}.
+    The hash identifies the chunk file a shard was embedded from, so later
+    stages can tell which shards were added, changed or removed.
+    """
+    manifest_path = os.path.join(embedding_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(embedding_dir, manifest):
+    """Save the embedding manifest atomically."""
+    manifest_path = os.path.join(embedding_dir, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def shard_versions(embedding_dir):
+    """
+    Return shard_name -> manifest entry for every shard on disk.
+    Shards written before the manifest existed get an entry with no hash.
+    """
+    manifest = load_manifest(embedding_dir)
+    return {
+        shard_name: manifest.get(shard_name, {"hash": None})
+        for shard_name in list_shards(embedding_dir)
+    }
+
+
+def migrate_json_embeddings(embedding_dir, remove_json=False):
+    """
+    Convert legacy *_embeddings.json files into binary shards.
+    :param embedding_dir: Directory containing the JSON embeddings.
+    :param remove_json: Delete each JSON file once its shard is written.
+    :return: Number of shards converted.
+    """
+    converted = 0
+    for file_name in os.listdir(embedding_dir):
+        if not file_name.endswith(LEGACY_SUFFIX):
+            continue
+
+        json_path = os.path.join(embedding_dir, file_name)
+        shard_name = file_name[: -len(LEGACY_SUFFIX)]
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                embedding_data = json.load(f)
+            if not embedding_data:
+                continue
+
+            save_embeddings(
+                embedding_dir,
+                shard_name,
+                [record["chunk_id"] for record in embedding_data],
+                [record["embedding"] for record in embedding_data],
+            )
+            converted += 1
+            if remove_json:
+                os.remove(json_path)
+            print(f"Converted {json_path} to binary shard '{shard_name}'")
+        except Exception as e:
+            print(f"Error converting {json_path}: {e}")
+    return converted
+
+
+if __name__ == "__main__":
+    embedding_dir = "../data/embeddings"
+    print(f"Converted {migrate_json_embeddings(embedding_dir)} JSON embedding files.")
@@ -0,0 +1,126 @@
+import os
+import json
+import numpy as np
+
+# Row position in the vector index -> chunk_id, stored as a fixed-width UTF-8
+# byte array so it can be memory-mapped and indexed directly.
+IDS_FILE = "id_mapping_ids.npy"
+DELETED_FILE = "id_mapping_deleted.npy"
+LEGACY_FILE = "id_mapping.json"
+
+
+def encode_chunk_ids(chunk_ids, width=None):
+    """Encode chunk IDs as a fixed-width byte array."""
+    encoded = [str(chunk_id).encode("utf-8") for chunk_id in chunk_ids]
+    width = max([width or 1] + [len(chunk_id) for chunk_id in encoded])
+    return np.array(encoded, dtype=f"S{width}")
+
+
+def write_array(path, array):
+    """Write a .npy file atomically."""
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(f"{path}.tmp", path)
+
+
+def save_id_mapping(index_dir, chunk_ids, deleted=None):
+    """
+    Save the position -> chunk_id mapping for an index.
+    :param index_dir: Directory containing the index.
+    :param chunk_ids: Chunk IDs in index row order.
+    :param deleted: Optional boolean tombstone flags, one per row.
+    :return: The saved mapping.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    ids = chunk_ids if isinstance(chunk_ids, np.ndarray) and chunk_ids.dtype.kind == "S" else encode_chunk_ids(chunk_ids)
+    if deleted is None:
+        deleted = np.zeros(len(ids), dtype=bool)
+    deleted = np.asarray(deleted, dtype=bool)
+    if len(deleted) != len(ids):
+        raise ValueError(f"Expected {len(ids)} tombstone flags, got {len(deleted)}")
+
+    write_array(os.path.join(index_dir, DELETED_FILE), deleted)
+    write_array(os.path.join(index_dir, IDS_FILE), ids)
+    return {"index_dir": index_dir, "ids": ids, "deleted": deleted}
+
+
+def load_id_mapping(index_dir, mmap=True):
+    """
+    Load the id mapping, memory-mapping the chunk ID array.
+    Falls back to converting a legacy id_mapping.json if no array exists yet.
+    """
+    ids_path = os.path.join(index_dir, IDS_FILE)
+    if not os.path.exists(ids_path):
+        return migrate_json_id_mapping(index_dir)
+
+    ids = np.load(ids_path, mmap_mode="r" if mmap else None)
+    deleted_path = os.path.join(index_dir, DELETED_FILE)
+    if os.path.exists(deleted_path):
+        deleted = np.load(deleted_path)
+    else:
+        deleted = np.zeros(len(ids), dtype=bool)
+    return {"index_dir": index_dir, "ids": ids, "deleted": deleted}
+
+
+def lookup_chunk_id(mapping, position):
+    """Return the chunk_id stored at an index position, or None if missing or deleted."""
+    position = int(position)
+    if position < 0 or position >= len(mapping["ids"]) or mapping["deleted"][position]:
+        return None
+    return mapping["ids"][position].decode("utf-8")
+
+
+def find_positions(mapping, chunk_ids):
+    """Return the live index positions holding any of the given chunk IDs."""
+    if not len(chunk_ids):
+        return np.array([], dtype=np.int64)
+    wanted = encode_chunk_ids(chunk_ids, width=mapping["ids"].dtype.itemsize)
+    matches = np.isin(mapping["ids"], wanted) & ~mapping["deleted"]
+    return np.flatnonzero(matches)
+
+
+def append_chunk_ids(mapping, chunk_ids):
+    """
+    Append chunk IDs to the mapping and persist it.
+    :return: Tuple of (updated mapping, positions assigned to the new IDs).
+    """
+    start = len(mapping["ids"])
+    width = max(mapping["ids"].dtype.itemsize, 1)
+    new_ids = encode_chunk_ids(chunk_ids, width=width)
+    ids = np.concatenate([np.asarray(mapping["ids"]).astype(new_ids.dtype), new_ids])
+    deleted = np.concatenate([mapping["deleted"], np.zeros(len(new_ids), dtype=bool)])
+    updated = save_id_mapping(mapping["index_dir"], ids, deleted)
+    return updated, np.arange(start, start + len(new_ids), dtype=np.int64)
+
+
+def mark_deleted(mapping, positions):
+    """Tombstone index positions and persist the flags."""
+    deleted = np.array(mapping["deleted"], dtype=bool, copy=True)
+    deleted[np.asarray(positions, dtype=np.int64)] = True
+    write_array(os.path.join(mapping["index_dir"], DELETED_FILE), deleted)
+    mapping["deleted"] = deleted
+    return mapping
+
+
+def count_live(mapping):
+    """Number of positions that have not been tombstoned."""
+    return int(len(mapping["deleted"]) - mapping["deleted"].sum())
+
+
+def migrate_json_id_mapping(index_dir, remove_json=False):
+    """Convert a legacy id_mapping.json (position -> chunk_id dict) into the array format."""
+    json_path = os.path.join(index_dir, LEGACY_FILE)
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"No id mapping found in {index_dir}")
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        legacy = {int(position): chunk_id for position, chunk_id in json.load(f).items()}
+
+    size = max(legacy) + 1 if legacy else 0
+    chunk_ids = [legacy.get(position, "") for position in range(size)]
+    deleted = np.array([position not in legacy for position in range(size)], dtype=bool)
+    mapping = save_id_mapping(index_dir, chunk_ids, deleted)
+    if remove_json:
+        os.remove(json_path)
+    print(f"Converted {json_path} to {IDS_FILE}")
+    return mapping
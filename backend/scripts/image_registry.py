@@ -0,0 +1,231 @@
+import io
+import os
+import sqlite3
+import hashlib
+from urllib.parse import urlparse
+
+# Registry of scraped images. Each distinct image is stored once; other URLs
+# that serve the same bytes, or a visually identical image (perceptual hash
+# within PHASH_DISTANCE bits), are recorded as aliases of it. Every page an
+# image appears on is kept as a reference instead of another download.
+# Small and flat images (icons, logos, spacers) hash alike however different
+# they are, so they are only matched by their exact bytes.
+PHASH_DISTANCE = 4  # Max differing bits of the 64-bit dHash for two images to count as the same
+PHASH_MIN_SIZE = 32  # Images narrower or shorter than this (px) get no perceptual hash
+PHASH_MIN_STDDEV = 12.0  # Nor do images whose greyscale standard deviation is below this
+
+
+def open_image_registry(db_path, save_dir):
+    """
+    Open (or create) an image registry.
+    :param db_path: SQLite file holding the registry.
+    :param save_dir: Directory unique images are saved to.
+    :return: Registry dict passed to the other functions.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    os.makedirs(save_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY,
+            sha256 TEXT UNIQUE NOT NULL,
+            phash INTEGER,
+            path TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS image_urls (
+            url TEXT PRIMARY KEY,
+            image_id INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS image_pages (
+            image_id INTEGER NOT NULL,
+            page_url TEXT NOT NULL,
+            PRIMARY KEY (image_id, page_url)
+        );
+    """)
+    registry = {
+        "conn": conn,
+        "save_dir": save_dir,
+        "paths": {},   # image id -> saved path
+        "sha256": {},  # content hash -> image id
+        "phash": {},   # image id -> perceptual hash
+        "stats": {"saved": 0, "url_hits": 0, "exact_duplicates": 0, "near_duplicates": 0, "failed": 0},
+    }
+    for image_id, sha256, phash, path in conn.execute("SELECT id, sha256, phash, path FROM images"):
+        registry["paths"][image_id] = path
+        registry["sha256"][sha256] = image_id
+        if phash is not None:
+            registry["phash"][image_id] = phash
+    return registry
+
+
+def close_image_registry(registry):
+    """Commit and close the registry."""
+    registry["conn"].commit()
+    registry["conn"].close()
+
+
+def dhash(image_bytes, hash_size=8):
+    """
+    Perceptual difference hash: shrink to (hash_size + 1) x hash_size greyscale
+    and record whether each pixel is brighter than its right neighbour.
+    Transparent areas are treated as white, the way the image is displayed.
+    :return: 64-bit int, or None if the bytes are not a raster image or the
+             image is too small or too flat to be told apart by its hash.
+    """
+    from PIL import Image, ImageStat
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        if min(image.size) < PHASH_MIN_SIZE:
+            return None
+        if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+            rgba = image.convert("RGBA")
+            image = Image.alpha_composite(Image.new("RGBA", rgba.size, "white"), rgba)
+        grey = image.convert("L")
+        if ImageStat.Stat(grey.resize((64, 64))).stddev[0] < PHASH_MIN_STDDEV:
+            return None
+        image = grey.resize((hash_size + 1, hash_size))
+    except Exception:
+        return None
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def find_similar(registry, phash, max_distance=PHASH_DISTANCE):
+    """Return the id of a registered image whose perceptual hash is within max_distance bits, or None."""
+    for image_id, other in registry["phash"].items():
+        if bin((phash ^ other) & ((1 << 64) - 1)).count("1") <= max_distance:
+            return image_id
+    return None
+
+
+def add_reference(registry, image_id, url, page_url):
+    """Record that url serves image_id and that it appears on page_url."""
+    conn = registry["conn"]
+    conn.execute("INSERT OR IGNORE INTO image_urls (url, image_id) VALUES (?, ?)", (url, image_id))
+    conn.execute("INSERT OR IGNORE INTO image_pages (image_id, page_url) VALUES (?, ?)", (image_id, page_url))
+
+
+def image_file_name(registry, url, sha256):
+    """Name a new image after its URL, adding part of its hash if that name is taken."""
+    file_name = os.path.basename(urlparse(url).path) or sha256[:16]
+    if os.path.exists(os.path.join(registry["save_dir"], file_name)):
+        stem, ext = os.path.splitext(file_name)
+        file_name = f"{stem}_{sha256[:12]}{ext}"
+    return os.path.join(registry["save_dir"], file_name)
+
+
+def lookup_image(registry, url, page_url):
+    """
+    Return the stored path of an image URL seen before, recording page_url as a
+    reference, or None if the URL is new.
+    """
+    conn = registry["conn"]
+    row = conn.execute("SELECT image_id FROM image_urls WHERE url = ?", (url,)).fetchone()
+    if not row:
+        return None
+    add_reference(registry, row[0], url, page_url)
+    conn.commit()
+    registry["stats"]["url_hits"] += 1
+    return registry["paths"][row[0]]
+
+
+def store_image(registry, url, page_url, image_bytes):
+    """
+    Register fetched image bytes. The image is matched by content hash, then by
+    perceptual hash, against registered images; only an image matching neither
+    is written to disk.
+    :return: Path of the stored image (the existing copy for duplicates).
+    """
+    conn = registry["conn"]
+    stats = registry["stats"]
+    sha256 = hashlib.sha256(image_bytes).hexdigest()
+    image_id = registry["sha256"].get(sha256)
+    if image_id is not None:
+        stats["exact_duplicates"] += 1
+    else:
+        phash = dhash(image_bytes)
+        image_id = find_similar(registry, phash) if phash is not None else None
+        if image_id is not None:
+            stats["near_duplicates"] += 1
+            # Alias the bytes so the same variant is recognised without hashing pixels again
+            registry["sha256"][sha256] = image_id
+
+    if image_id is not None:
+        add_reference(registry, image_id, url, page_url)
+        conn.commit()
+        return registry["paths"][image_id]
+
+    path = image_file_name(registry, url, sha256)
+    with open(path, "wb") as f:
+        f.write(image_bytes)
+    image_id = conn.execute(
+        "INSERT INTO images (sha256, phash, path) VALUES (?, ?, ?)", (sha256, phash, path)
+    ).lastrowid
+    registry["paths"][image_id] = path
+    registry["sha256"][sha256] = image_id
+    if phash is not None:
+        registry["phash"][image_id] = phash
+    add_reference(registry, image_id, url, page_url)
+    conn.commit()
+    stats["saved"] += 1
+    print(f"Saved image: {path}")
+    return path
+
+
+def register_image(registry, url, page_url, fetch):
+    """
+    Save an image seen on a page unless it is already known.
+
+    A URL seen before is not fetched again. Otherwise the image is fetched and
+    passed to store_image().
+
+    :param url: Image URL.
+    :param page_url: Page the image appears on.
+    :param fetch: Function returning the bytes at a URL.
+    :return: Path of the stored image (the existing copy for duplicates), or None on failure.
+    """
+    path = lookup_image(registry, url, page_url)
+    if path:
+        return path
+
+    try:
+        image_bytes = fetch(url)
+    except Exception as e:
+        print(f"Error downloading {url}: {e}")
+        registry["stats"]["failed"] += 1
+        return None
+    return store_image(registry, url, page_url, image_bytes)
+
+
+def unique_image_paths(registry):
+    """Return the stored path of every distinct image, e.g. as the input for OCR."""
+    return sorted(registry["paths"].values())
+
+
+def image_pages(registry, path):
+    """Return the pages an image appears on."""
+    rows = registry["conn"].execute("""
+        SELECT page_url FROM image_pages
+        JOIN images ON images.id = image_pages.image_id
+        WHERE images.path = ?
+    """, (path,))
+    return [page_url for page_url, in rows]
+
+
+def registry_stats(registry):
+    """Return this session's counts along with the registry totals."""
+    conn = registry["conn"]
+    return {
+        **registry["stats"],
+        "unique_images": len(registry["paths"]),
+        "urls": conn.execute("SELECT COUNT(*) FROM image_urls").fetchone()[0],
+        "page_references": conn.execute("SELECT COUNT(*) FROM image_pages").fetchone()[0],
+    }
@@ -1,57 +1,326 @@
 import os
 import json
+import math
+import time
 import faiss
 import numpy as np
+from embedding_store import iter_embeddings, list_shards, load_embeddings, shard_versions, migrate_json_embeddings
+from id_mapping import save_id_mapping, load_id_mapping, append_chunk_ids, mark_deleted, count_live, IDS_FILE
 
-def create_index(embedding_dir, index_dir, index_file="vector_index.faiss"):
+# Index types understood by create_index(). All of them use inner product over
+# L2-normalized vectors, which is cosine similarity like the rest of the stack.
+INDEX_TYPES = {
+    "flat": "Flat",
+    "hnsw": "HNSW32",
+    "ivf_flat": "IVF{nlist},Flat",
+    "ivf_pq": "IVF{nlist},PQ{m}",
+}
+DEFAULT_INDEX_TYPE = "hnsw"
+TRAIN_SAMPLE_SIZE = 100000  # Max vectors used to train IVF/PQ indexes
+RECALL_QUERIES = 100  # Corpus vectors reused as queries when measuring recall
+RECALL_K = 10
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+STATS_FILE = "index_stats.json"
+STATE_FILE = "index_state.json"
+COMPACT_RATIO = 0.2  # Rebuild once this fraction of index rows has been deleted
+
+
+def normalize_vectors(vectors):
+    """Return a float32 copy of the vectors scaled to unit length."""
+    vectors = np.array(vectors, dtype=np.float32, copy=True)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build_factory_string(index_type, dim, ntotal):
+    """
+    Build a FAISS factory string for the requested index type and corpus size.
+    Falls back to simpler index types when the corpus is too small to train.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from {sorted(INDEX_TYPES)}")
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # ~4*sqrt(n) lists, with at least 39 training points per list
+        nlist = min(int(4 * math.sqrt(ntotal)), ntotal // 39)
+        if nlist < 1:
+            print(f"Only {ntotal} vectors, too few to train {index_type}. Using a flat index.")
+            return INDEX_TYPES["flat"]
+        if index_type == "ivf_pq":
+            m = next((m for m in (64, 48, 32, 16, 8) if dim % m == 0), None)
+            # 8-bit PQ needs at least 256 training vectors per sub-quantizer
+            if m is None or ntotal < 256:
+                print(f"Cannot train PQ for dim={dim}, n={ntotal}. Using IVF-Flat.")
+                return INDEX_TYPES["ivf_flat"].format(nlist=nlist)
+            return INDEX_TYPES["ivf_pq"].format(nlist=nlist, m=m)
+        return INDEX_TYPES["ivf_flat"].format(nlist=nlist)
+
+    return INDEX_TYPES[index_type]
+
+
+def set_search_params(index, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH):
+    """Apply query-time tuning knobs to an index, ignoring ones it does not have."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+
+
+def sample_vectors(shard_vectors, sample_size, seed=42):
+    """Draw a random sample of rows across all memory-mapped shards."""
+    sizes = [len(vectors) for vectors in shard_vectors]
+    ntotal = sum(sizes)
+    if ntotal <= sample_size:
+        return normalize_vectors(np.concatenate(shard_vectors))
+
+    rng = np.random.default_rng(seed)
+    picked = np.sort(rng.choice(ntotal, size=sample_size, replace=False))
+    sample = []
+    offset = 0
+    for vectors, size in zip(shard_vectors, sizes):
+        rows = picked[(picked >= offset) & (picked < offset + size)] - offset
+        if len(rows):
+            sample.append(vectors[rows])
+        offset += size
+    return normalize_vectors(np.concatenate(sample))
+
+
+def measure_recall(index, shard_vectors, k=RECALL_K, num_queries=RECALL_QUERIES):
+    """
+    Estimate recall@k of an index against exact cosine search.
+    Exact neighbours are computed shard by shard so memory stays bounded.
+    """
+    queries = sample_vectors(shard_vectors, num_queries, seed=7)
+    k = min(k, index.ntotal)
+
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    offset = 0
+    for vectors in shard_vectors:
+        scores = queries @ normalize_vectors(vectors).T
+        ids = np.broadcast_to(np.arange(offset, offset + len(vectors)), scores.shape)
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_ids = np.concatenate([best_ids, ids], axis=1)
+        top = np.argsort(-all_scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, top, axis=1)
+        best_ids = np.take_along_axis(all_ids, top, axis=1)
+        offset += len(vectors)
+
+    _, found_ids = index.search(queries, k)
+    hits = sum(len(set(found) & set(exact)) for found, exact in zip(found_ids, best_ids))
+    return hits / float(len(queries) * k)
+
+
+def create_index(embedding_dir, index_dir, index_file="vector_index.faiss", index_type=DEFAULT_INDEX_TYPE):
     """
     Create an index from embeddings.
     :param embedding_dir: Directory containing embeddings.
     :param index_dir: Directory to save the index.
     :param index_file: Name of the FAISS index file.
+    :param index_type: One of INDEX_TYPES ("flat", "hnsw", "ivf_flat", "ivf_pq").
+    :return: Build statistics (time, size, recall).
     """
     os.makedirs(index_dir, exist_ok=True)
-    index = None
-    id_mapping = {}
+    indexed_chunk_ids = []
 
-    for embedding_file in os.listdir(embedding_dir):
-        if not embedding_file.endswith("_embeddings.json"):
-            continue
+    # Convert embeddings written by older pipeline runs
+    if not list_shards(embedding_dir):
+        migrate_json_embeddings(embedding_dir)
 
-        embedding_path = os.path.join(embedding_dir, embedding_file)
+    versions = shard_versions(embedding_dir)
+    shards = [(shard_name, chunk_ids, vectors) for shard_name, chunk_ids, vectors in iter_embeddings(embedding_dir) if len(vectors)]
+    if not shards:
+        print(f"No embeddings found in {embedding_dir}. Index not created.")
+        return None
 
-        try:
-            # Load embeddings
-            with open(embedding_path, "r", encoding="utf-8") as f:
-                embedding_data = json.load(f)
+    dim = shards[0][2].shape[1]
+    for shard_name, _, vectors in shards:
+        if vectors.shape[1] != dim:
+            print(f"Skipping {shard_name}: dimension {vectors.shape[1]} does not match index dimension {dim}")
+    shards = [shard for shard in shards if shard[2].shape[1] == dim]
+    shard_vectors = [vectors for _, _, vectors in shards]
+    ntotal = sum(len(vectors) for vectors in shard_vectors)
+    factory_string = build_factory_string(index_type, dim, ntotal)
+    print(f"Building '{factory_string}' index over {ntotal} vectors (dim={dim})...")
 
-            vectors = [np.array(record["embedding"], dtype=np.float32) for record in embedding_data]
-            chunk_ids = [record["chunk_id"] for record in embedding_data]
+    build_start = time.perf_counter()
+    # IDMap2 keys every vector by its id mapping position, so rows can later be
+    # added and removed by id without rebuilding
+    index = faiss.index_factory(dim, f"IDMap2,{factory_string}", faiss.METRIC_INNER_PRODUCT)
+    indexed_shards = {}
 
-            # Initialize index if not already done
-            if index is None:
-                index = faiss.IndexFlatL2(len(vectors[0]))
+    # Train on a sample
+    train_time = 0.0
+    if not index.is_trained:
+        train_start = time.perf_counter()
+        index.train(sample_vectors(shard_vectors, TRAIN_SAMPLE_SIZE))
+        train_time = time.perf_counter() - train_start
 
+    for shard_name, chunk_ids, vectors in shards:
+        try:
             # Add vectors to index
-            index.add(np.stack(vectors))
+            start = len(indexed_chunk_ids)
+            index.add_with_ids(normalize_vectors(vectors), np.arange(start, start + len(vectors), dtype=np.int64))
 
-            # Add chunk IDs to mapping
-            id_mapping.update({i: chunk_id for i, chunk_id in enumerate(chunk_ids, start=index.ntotal - len(vectors))})
+            # Record chunk IDs in index row order
+            indexed_chunk_ids.extend(chunk_ids)
+            indexed_shards[shard_name] = {"version": versions.get(shard_name), "positions": [start, len(indexed_chunk_ids)]}
 
         except Exception as e:
-            print(f"Error processing {embedding_file}: {e}")
+            print(f"Error processing {shard_name}: {e}")
+    build_time = time.perf_counter() - build_start
 
     # Save index
     index_path = os.path.join(index_dir, index_file)
     faiss.write_index(index, index_path)
 
     # Save ID mapping
-    id_mapping_path = os.path.join(index_dir, "id_mapping.json")
-    with open(id_mapping_path, "w", encoding="utf-8") as f:
-        json.dump(id_mapping, f, indent=4)
+    save_id_mapping(index_dir, indexed_chunk_ids)
+    id_mapping_path = os.path.join(index_dir, IDS_FILE)
+    save_index_state(index_dir, {
+        "index_type": index_type,
+        "factory_string": factory_string,
+        "dim": int(dim),
+        "shards": indexed_shards,
+    })
+
+    set_search_params(index)
+    stats = {
+        "index_type": index_type,
+        "factory_string": factory_string,
+        "ntotal": int(index.ntotal),
+        "dim": int(dim),
+        "train_time_s": round(train_time, 3),
+        "build_time_s": round(build_time, 3),
+        "index_size_bytes": os.path.getsize(index_path),
+        f"recall_at_{RECALL_K}": round(measure_recall(index, shard_vectors), 4),
+        "nprobe": DEFAULT_NPROBE,
+        "ef_search": DEFAULT_EF_SEARCH,
+    }
+    with open(os.path.join(index_dir, STATS_FILE), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=4)
 
     print(f"Index saved to {index_path}")
     print(f"ID mapping saved to {id_mapping_path}")
+    print(f"Index stats: {stats}")
+    return stats
+
+
+def load_index_state(index_dir):
+    """Load which shard versions are in the index and the positions they occupy."""
+    state_path = os.path.join(index_dir, STATE_FILE)
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_index_state(index_dir, state):
+    """Save the index state atomically."""
+    state_path = os.path.join(index_dir, STATE_FILE)
+    with open(f"{state_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+def update_index(embedding_dir, index_dir, index_file="vector_index.faiss", compact_ratio=COMPACT_RATIO):
+    """
+    Apply new, changed and deleted embedding shards to an existing index.
+    Only shards whose manifest entry differs from the indexed version are
+    touched. The index is rebuilt from scratch when none exists yet, when rows
+    must be removed from an index type that cannot delete them (HNSW), or when
+    deleted rows exceed compact_ratio of the id mapping.
+    :param embedding_dir: Directory containing embeddings.
+    :param index_dir: Directory containing the index.
+    :param index_file: Name of the FAISS index file.
+    :param compact_ratio: Fraction of deleted rows that triggers compaction.
+    """
+    index_path = os.path.join(index_dir, index_file)
+    state = load_index_state(index_dir)
+    if state is None or not os.path.exists(index_path):
+        print("No incremental index state found. Building a full index...")
+        return create_index(embedding_dir, index_dir, index_file)
+
+    if not list_shards(embedding_dir):
+        migrate_json_embeddings(embedding_dir)
+
+    versions = shard_versions(embedding_dir)
+    indexed_shards = state["shards"]
+    removed = [name for name, entry in indexed_shards.items() if versions.get(name) != entry["version"]]
+    added = [name for name, version in versions.items() if name not in indexed_shards or indexed_shards[name]["version"] != version]
+    if not removed and not added:
+        print("Index is up to date.")
+        return state
+
+    index = faiss.read_index(index_path)
+    mapping = load_id_mapping(index_dir, mmap=False)
+
+    # Remove rows of changed and deleted shards
+    removed_positions = []
+    for name in removed:
+        start, end = indexed_shards.pop(name)["positions"]
+        removed_positions.append(np.arange(start, end, dtype=np.int64))
+    if removed_positions:
+        removed_positions = np.concatenate(removed_positions)
+        try:
+            index.remove_ids(removed_positions)
+        except RuntimeError:
+            # HNSW cannot delete vectors. Left in the graph they would keep taking
+            # top-k slots from live rows, so rebuild without them now.
+            print(f"Index type cannot delete {len(removed_positions)} rows. Compacting...")
+            return create_index(embedding_dir, index_dir, index_file, index_type=state.get("index_type", DEFAULT_INDEX_TYPE))
+        mapping = mark_deleted(mapping, removed_positions)
+
+    # Add rows of new and changed shards after the current end of the mapping
+    new_chunk_ids = []
+    next_position = len(mapping["ids"])
+    for name in added:
+        try:
+            chunk_ids, vectors = load_embeddings(embedding_dir, name)
+            if len(vectors) == 0:
+                continue
+            if vectors.shape[1] != index.d:
+                raise ValueError(f"dimension {vectors.shape[1]} does not match index dimension {index.d}")
+
+            start = next_position + len(new_chunk_ids)
+            index.add_with_ids(normalize_vectors(vectors), np.arange(start, start + len(vectors), dtype=np.int64))
+            new_chunk_ids.extend(chunk_ids)
+            indexed_shards[name] = {"version": versions[name], "positions": [start, start + len(vectors)]}
+        except Exception as e:
+            print(f"Error processing {name}: {e}")
+    if new_chunk_ids:
+        mapping, _ = append_chunk_ids(mapping, new_chunk_ids)
+
+    faiss.write_index(index, index_path)
+    save_index_state(index_dir, state)
+    print(f"Index updated: {len(added)} shards added/changed, {len(removed)} removed, "
+          f"{len(new_chunk_ids)} rows added, {len(removed_positions)} rows deleted.")
+
+    deleted_ratio = 1 - count_live(mapping) / float(max(len(mapping["ids"]), 1))
+    if deleted_ratio > compact_ratio:
+        print(f"{deleted_ratio:.0%} of index rows are deleted. Compacting...")
+        return create_index(embedding_dir, index_dir, index_file, index_type=state.get("index_type", DEFAULT_INDEX_TYPE))
+    return state
+
+
+def load_index(index_dir, index_file="vector_index.faiss", mmap=True):
+    """
+    Load a saved index, memory-mapping it from disk when possible.
+    :param index_dir: Directory containing the index.
+    :param index_file: Name of the FAISS index file.
+    :param mmap: Map the index file instead of reading it into RAM.
+    """
+    index_path = os.path.join(index_dir, index_file)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(index_path, flags)
+    set_search_params(index)
+    return index
+
 
 if __name__ == "__main__":
     embedding_dir = "../data/embeddings"
@@ -1,94 +1,159 @@
-import os
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-import fitz  # PyMuPDF for PDF processing
-
-# Configuration
-CHROMA_DB_DIR = "../data/cerebro_chroma_db"
-COLLECTION_NAME = "cerebro_v3"
-PDF_FOLDERS = ["../data/converted_downloads", "../data/pages_as_pdf"]
-CHUNK_SIZE = 1000  # Adjust chunk size as needed
-LOCAL_MODEL_PATH = "../models/all-mpnet-base-v2"  # Path to the locally downloaded model
-
-
-def extract_text_from_pdf(pdf_path):
-    """Extracts text from a PDF file."""
-    text = ""
-    try:
-        with fitz.open(pdf_path) as pdf:
-            for page in pdf:
-                text += page.get_text()
-    except Exception as e:
-        print(f"❌ Failed to extract text from {pdf_path}: {e}")
-    return text
-
-
-def chunk_text(text, chunk_size=CHUNK_SIZE):
-    """Splits text into chunks."""
-    words = text.split()
-    for i in range(0, len(words), chunk_size):
-        yield " ".join(words[i:i + chunk_size])
-
-
-def ingest_to_cerebro_v3():
-    print("### Starting Data Ingestion for Chroma DB Collection ###")
-
-    # Initialize embedding function using the local model
-    embeddings = SentenceTransformerEmbeddingFunction(model_name=LOCAL_MODEL_PATH)
-
-    # Initialize Chroma DB client
-    client = chromadb.Client(
-        Settings(
-            persist_directory=CHROMA_DB_DIR,
-            chroma_db_impl="duckdb+parquet"
-        )
-    )
-
-    # Create or get collection
-    collection = client.get_or_create_collection(COLLECTION_NAME, embedding_function=embeddings)
-    print(f"✅ Collection '{COLLECTION_NAME}' initialized")
-
-    # Process PDF files
-    for folder in PDF_FOLDERS:
-        for file_name in os.listdir(folder):
-            if file_name.endswith(".pdf"):
-                file_path = os.path.join(folder, file_name)
-                print(f"Processing: {file_path}")
-
-                # Extract text from PDF
-                text = extract_text_from_pdf(file_path)
-                if not text.strip():
-                    print(f"⚠️ No text extracted from {file_path}")
-                    continue
-
-                # Chunk the text
-                chunks = list(chunk_text(text))
-
-                # Prepare data for ingestion
-                ids = [f"{file_name}_{i}" for i in range(len(chunks))]
-                metadatas = [{"source": file_name, "chunk_id": f"{file_name}_{i}"} for i in range(len(chunks))]
-
-                # Add to collection
-                try:
-                    collection.add(
-                        ids=ids,
-                        documents=chunks,
-                        metadatas=metadatas,
-                    )
-                    print(f"✅ Successfully added data from {file_name}")
-                except Exception as e:
-                    print(f"❌ Failed to add data from {file_name}: {e}")
-
-    # Persist data
-    try:
-        client.persist()
-        print(f"✅ Data persisted to directory: {CHROMA_DB_DIR}")
-    except Exception as e:
-        print(f"⚠️ Failed to persist data: {e}")
-
-    print("### Data Ingestion Completed ###")
-
-
-if __name__ == "__main__":
-    ingest_to_cerebro_v3()
+import os
+import chromadb
+from chromadb.config import Settings
+from document_parser import parse_document, parse_documents, list_documents, HTML_EXTENSIONS
+from sentence_transformers import SentenceTransformer
+from parallel_embedding import start_lazy_encoder, lazy_encode, stop_lazy_encoder, MIN_PARALLEL_TEXTS
+from embedding_cache import open_cache, close_cache, cache_stats, encode_with_cache, model_identifier
+
+# Configuration
+CHROMA_DB_DIR = "../data/cerebro_chroma_db"
+COLLECTION_NAME = "cerebro_v3"
+# Scraped pages are read from their saved HTML (pages are only rendered to PDF
+# when the scraper's RENDER_PDF is set); downloaded documents are PDFs
+PDF_FOLDERS = ["../data/converted_downloads"]
+HTML_FOLDERS = ["../data/scraped_pages"]
+CHUNK_SIZE = 1000  # Adjust chunk size as needed
+LOCAL_MODEL_PATH = "../models/all-mpnet-base-v2"  # Path to the locally downloaded model
+
+
+def extract_text_from_pdf(pdf_path):
+    """Extracts text from a PDF file."""
+    return parse_document(pdf_path)["text"]
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE):
+    """Splits text into chunks."""
+    words = text.split()
+    for i in range(0, len(words), chunk_size):
+        yield " ".join(words[i:i + chunk_size])
+
+
+def lazy_embedding_function(encoder):
+    """Collection embedding function that shares the lazy encoder, so building it does not load the model."""
+    def embed(texts):
+        return lazy_encode(encoder, list(texts)).tolist()
+    return embed
+
+
+def add_chunks(collection, cache, model_id, encoder, batch):
+    """
+    Embed a batch of chunks gathered from one or more files and add it to the
+    collection. If the batch fails, its files are retried one by one so a bad
+    chunk only costs its own file.
+    :return: Names of the files whose chunks could not be added.
+    """
+    file_names = [file_name for file_name, _ in batch["files"]]
+    try:
+        collection.add(
+            ids=batch["ids"],
+            documents=batch["documents"],
+            embeddings=encode_with_cache(
+                cache, model_id, batch["documents"], lambda missing: lazy_encode(encoder, missing)
+            ).tolist(),
+            metadatas=batch["metadatas"],
+        )
+        print(f"✅ Successfully added data from {', '.join(file_names)}")
+        return []
+    except Exception as e:
+        if len(batch["files"]) == 1:
+            print(f"❌ Failed to add data from {file_names[0]}: {e}")
+            return file_names
+        print(f"⚠️ Failed to add batch of {len(file_names)} files, retrying file by file: {e}")
+
+    failed = []
+    start = 0
+    for file_name, count in batch["files"]:
+        end = start + count
+        file_batch = {
+            "ids": batch["ids"][start:end],
+            "documents": batch["documents"][start:end],
+            "metadatas": batch["metadatas"][start:end],
+            "files": [(file_name, count)],
+        }
+        failed.extend(add_chunks(collection, cache, model_id, encoder, file_batch))
+        start = end
+    return failed
+
+
+def new_batch():
+    # files holds (file_name, chunk count) in the order their chunks were added
+    return {"ids": [], "documents": [], "metadatas": [], "files": []}
+
+
+def ingest_to_cerebro_v3(processes=None):
+    print("### Starting Data Ingestion for Chroma DB Collection ###")
+
+    # Chunks are encoded here on a multi-process pool rather than by the collection.
+    # Chunks already in the embedding cache are not re-encoded; the model and
+    # pool are only started once a chunk misses the cache.
+    encoder = start_lazy_encoder(lambda: SentenceTransformer(LOCAL_MODEL_PATH), processes)
+    cache = open_cache()
+    model_id = model_identifier(LOCAL_MODEL_PATH)
+
+    # Initialize embedding function using the local model, loaded only if the collection embeds anything itself
+    embeddings = lazy_embedding_function(encoder)
+
+    # Initialize Chroma DB client
+    client = chromadb.Client(
+        Settings(
+            persist_directory=CHROMA_DB_DIR,
+            chroma_db_impl="duckdb+parquet"
+        )
+    )
+
+    # Create or get collection
+    collection = client.get_or_create_collection(COLLECTION_NAME, embedding_function=embeddings)
+    print(f"✅ Collection '{COLLECTION_NAME}' initialized")
+
+    # Process pages and PDF files
+    try:
+        # Documents are parsed on a worker pool while chunks are embedded and added here.
+        # Chunks are gathered across files so each batch is large enough for the encoder pool.
+        batch = new_batch()
+        failed_files = []
+        paths = list_documents(HTML_FOLDERS, HTML_EXTENSIONS) + list_documents(PDF_FOLDERS)
+        for record in parse_documents(paths, processes):
+            file_name = record["file_name"]
+            file_path = record["source"]
+            print(f"Processing: {file_path}")
+
+            text = record["text"]
+            if not text.strip():
+                print(f"⚠️ No text extracted from {file_path}")
+                continue
+
+            # Chunk the text
+            chunks = list(chunk_text(text))
+
+            # Prepare data for ingestion
+            batch["ids"].extend(f"{file_name}_{i}" for i in range(len(chunks)))
+            batch["documents"].extend(chunks)
+            batch["metadatas"].extend({"source": file_name, "chunk_id": f"{file_name}_{i}"} for i in range(len(chunks)))
+            batch["files"].append((file_name, len(chunks)))
+
+            # Add to collection once the batch is large enough
+            if len(batch["documents"]) >= MIN_PARALLEL_TEXTS:
+                failed_files.extend(add_chunks(collection, cache, model_id, encoder, batch))
+                batch = new_batch()
+        if batch["documents"]:
+            failed_files.extend(add_chunks(collection, cache, model_id, encoder, batch))
+        if failed_files:
+            print(f"❌ {len(failed_files)} files were not ingested: {', '.join(failed_files)}")
+    finally:
+        stop_lazy_encoder(encoder)
+        print(f"Embedding cache: {cache_stats(cache)}")
+        close_cache(cache)
+
+    # Persist data
+    try:
+        client.persist()
+        print(f"✅ Data persisted to directory: {CHROMA_DB_DIR}")
+    except Exception as e:
+        print(f"⚠️ Failed to persist data: {e}")
+
+    print("### Data Ingestion Completed ###")
+
+
+if __name__ == "__main__":
+    ingest_to_cerebro_v3()
@@ -5,9 +5,13 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document  # Import Document object
+from document_parser import parse_documents, list_documents, HTML_EXTENSIONS
 
 # Configuration
-PDF_FOLDERS = ["../data/converted_downloads", "../data/pages_as_pdf"]
+# Scraped pages are read from their saved HTML (pages are only rendered to PDF
+# when the scraper's RENDER_PDF is set); downloaded documents are PDFs
+PDF_FOLDERS = ["../data/converted_downloads"]
+HTML_FOLDERS = ["../data/scraped_pages"]
 CHROMA_DB_DIR = "../data/cerebro_chroma_db"
 SENTENCE_MODEL_PATH = "../models/all-mpnet-base-v2"
 CACHE_FOLDER = "../cache"
@@ -42,6 +46,17 @@ def load_pdfs_from_folders(folders):
     return documents
 
 
+def load_html_pages(folders):
+    """
+    Load saved HTML pages as Document objects, keeping only each page's main content.
+    """
+    documents = []
+    for record in parse_documents(list_documents(folders, HTML_EXTENSIONS)):
+        if record["text"]:
+            documents.append(Document(page_content=record["text"], metadata={"source": record["source"]}))
+    return documents
+
+
 def chunk_documents(documents):
     """
     Chunk the documents into smaller pieces for embedding.
@@ -79,9 +94,9 @@ def initialize_chroma_vectorstore(documents):
 
 
 def main():
-    # Step 1: Load PDFs from the specified folders
-    print("Loading PDFs from folders...")
-    documents = load_pdfs_from_folders(PDF_FOLDERS)
+    # Step 1: Load scraped pages and PDFs from the specified folders
+    print("Loading pages and PDFs from folders...")
+    documents = load_html_pages(HTML_FOLDERS) + load_pdfs_from_folders(PDF_FOLDERS)
 
     if not documents:
         print("No documents found. Exiting.")
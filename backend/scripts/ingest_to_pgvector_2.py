@@ -2,11 +2,17 @@ import os
 import psycopg2
 from psycopg2.extensions import AsIs
 from pathlib import Path
-import fitz  # PyMuPDF for PDF processing
-import numpy as np
+from document_parser import parse_document, parse_documents, list_documents, HTML_EXTENSIONS
+from sentence_transformers import SentenceTransformer
+from parallel_embedding import start_lazy_encoder, lazy_encode, stop_lazy_encoder, MIN_PARALLEL_TEXTS
+from embedding_cache import open_cache, close_cache, cache_stats, encode_with_cache, model_identifier
+from embedding_migrations import SHADOW_COLUMN, active_model, shadow_model, lock_for_write
 
 # Configuration
-PDF_FOLDERS = ["../../data/converted_downloads", "../../data/pages_as_pdf"]
+# Scraped pages are read from their saved HTML (pages are only rendered to PDF
+# when the scraper's RENDER_PDF is set); downloaded documents are PDFs
+PDF_FOLDERS = ["../../data/converted_downloads"]
+HTML_FOLDERS = ["../../data/scraped_pages"]
 CHUNK_SIZE = 1000
 DB_CONFIG = {
     "dbname": "postgres",
@@ -17,6 +23,7 @@ DB_CONFIG = {
 }
 TABLE_NAME = "vds_documents"
 VECTOR_DIM = 768
+LOCAL_MODEL_PATH = "../../models/all-mpnet-base-v2"  # 768-d, matches VECTOR_DIM
 
 # Function to connect to PostgreSQL
 def connect_to_db():
@@ -29,7 +36,7 @@ def connect_to_db():
         exit()
 
 # Function to create the table
-def create_table(cursor):
+def create_table(cursor, vector_dim=VECTOR_DIM):
     try:
         cursor.execute(f"""
             CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
@@ -39,21 +46,14 @@ def create_table(cursor):
                 content TEXT,
                 embedding VECTOR(%s)
             );
-        """, (VECTOR_DIM,))
+        """, (vector_dim,))
         print(f"Table '{TABLE_NAME}' is ready.")
     except Exception as e:
         print(f"Error creating table: {e}")
 
 # Function to extract text from PDF
 def extract_text_from_pdf(pdf_path):
-    text = ""
-    try:
-        with fitz.open(pdf_path) as pdf:
-            for page in pdf:
-                text += page.get_text()
-    except Exception as e:
-        print(f"❌ Failed to extract text from {pdf_path}: {e}")
-    return text
+    return parse_document(pdf_path)["text"]
 
 # Function to chunk text
 def chunk_text(text, chunk_size=CHUNK_SIZE):
@@ -61,53 +61,127 @@ def chunk_text(text, chunk_size=CHUNK_SIZE):
     for i in range(0, len(words), chunk_size):
         yield " ".join(words[i:i + chunk_size])
 
-# Function to generate dummy embeddings
-def generate_embedding(text, dim=VECTOR_DIM):
-    return np.random.rand(dim).tolist()
-
 # Function to insert data into the table
-def insert_data(cursor, file_name, chunk_id, content, embedding):
-    try:
+def insert_data(cursor, file_name, chunk_id, content, embedding, shadow_embedding=None):
+    if shadow_embedding is None:
         cursor.execute(f"""
             INSERT INTO {TABLE_NAME} (file_name, chunk_id, content, embedding)
             VALUES (%s, %s, %s, %s);
         """, (file_name, chunk_id, content, embedding))
-        print(f"✅ Data inserted for chunk {chunk_id} of {file_name}")
-    except Exception as e:
-        print(f"❌ Error inserting data for chunk {chunk_id} of {file_name}: {e}")
+    else:
+        # A model switch is running: write the new model's vector too
+        cursor.execute(f"""
+            INSERT INTO {TABLE_NAME} (file_name, chunk_id, content, embedding, {SHADOW_COLUMN})
+            VALUES (%s, %s, %s, %s, %s);
+        """, (file_name, chunk_id, content, embedding, shadow_embedding))
+    print(f"✅ Data inserted for chunk {chunk_id} of {file_name}")
+
+# Function to read the models new rows must be embedded with
+def embedding_models(cursor):
+    """
+    Return (model_path, vector_dim, migration): the live column's model, and the
+    running model switch (reembed_pgvector.py) new rows must also be embedded for, if any.
+    """
+    model_path, vector_dim = active_model(cursor, TABLE_NAME, LOCAL_MODEL_PATH, VECTOR_DIM)
+    return model_path, vector_dim, shadow_model(cursor, TABLE_NAME)
+
+# Function to embed chunks with a model, starting its encoder on first use
+def encode_chunks(encoders, cache, model_path, chunks, processes=None):
+    # Cached chunks are not re-encoded, and the model is only loaded on a cache miss
+    if model_path not in encoders:
+        encoders[model_path] = start_lazy_encoder(lambda: SentenceTransformer(model_path), processes)
+    encoder = encoders[model_path]
+    return encode_with_cache(cache, model_identifier(model_path), chunks, lambda missing: lazy_encode(encoder, missing))
+
+# Function to embed and insert one batch of chunks
+def insert_chunks(conn, encoders, cache, rows, processes=None):
+    """
+    Embed rows of (file_name, chunk_id, content) and insert them in one transaction.
+    The transaction holds the migration write lock and re-reads the migration
+    state, so a cutover cannot happen while it writes. If the models changed
+    since the rows were embedded, they are embedded again for the new state.
+    Errors roll the batch back and are raised.
+    """
+    chunks = [content for _, _, content in rows]
+    with conn.cursor() as cursor:
+        models = embedding_models(cursor)
+    while True:
+        model_path, _, migration = models
+        embeddings = encode_chunks(encoders, cache, model_path, chunks, processes)
+        shadow_embeddings = [None] * len(chunks)
+        if migration:
+            shadow_embeddings = encode_chunks(encoders, cache, migration["model_path"], chunks, processes).tolist()
+
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cursor:
+                lock_for_write(cursor, TABLE_NAME)
+                current = embedding_models(cursor)
+                if current == models:
+                    for (file_name, chunk_id, chunk), embedding, shadow_embedding in zip(
+                            rows, embeddings, shadow_embeddings):
+                        insert_data(cursor, file_name, chunk_id, chunk, embedding.tolist(), shadow_embedding)
+                    conn.commit()
+                    return
+            conn.rollback()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        print(f"Embedding models of '{TABLE_NAME}' changed during ingest; re-embedding the batch.")
+        models = current
 
 # Main ingestion function
-def ingest_to_pgvector():
+def ingest_to_pgvector(processes=None):
     print("### Starting Data Ingestion for PostgreSQL ###")
 
     # Connect to the database
     conn = connect_to_db()
     cursor = conn.cursor()
 
+    # Use the model the table was last migrated to, and dual-write while a
+    # model switch (reembed_pgvector.py) is running. The state is read again
+    # for every batch, since a switch can start or cut over during the ingest.
+    _, vector_dim, migration = embedding_models(cursor)
+    if migration:
+        print(f"Model switch to {migration['model_path']} in progress; writing both embeddings.")
+
     # Ensure the table exists
-    create_table(cursor)
-
-    # Process PDF files
-    for folder in PDF_FOLDERS:
-        for file_name in os.listdir(folder):
-            if file_name.endswith(".pdf"):
-                file_path = os.path.join(folder, file_name)
-                print(f"Processing: {file_path}")
-
-                # Extract text from PDF
-                text = extract_text_from_pdf(file_path)
-                if not text.strip():
-                    print(f"⚠️ No text extracted from {file_path}")
-                    continue
-
-                # Chunk the text
-                chunks = list(chunk_text(text))
-
-                # Insert each chunk into the database
-                for i, chunk in enumerate(chunks):
-                    chunk_id = f"{file_name}_{i}"
-                    embedding = generate_embedding(chunk)
-                    insert_data(cursor, file_name, chunk_id, chunk, embedding)
+    create_table(cursor, vector_dim)
+
+    # Encode chunks on a multi-process pool per model, one model copy per worker
+    encoders = {}
+    cache = open_cache()
+
+    # Process pages and PDF files
+    try:
+        # Documents are parsed on a worker pool while chunks are embedded and inserted here.
+        # Chunks are gathered across files so each batch is large enough for the encoder pool.
+        pending = []
+        paths = list_documents(HTML_FOLDERS, HTML_EXTENSIONS) + list_documents(PDF_FOLDERS)
+        for record in parse_documents(paths, processes):
+            file_name = record["file_name"]
+            file_path = record["source"]
+            print(f"Processing: {file_path}")
+
+            text = record["text"]
+            if not text.strip():
+                print(f"⚠️ No text extracted from {file_path}")
+                continue
+
+            # Chunk the text
+            pending.extend((file_name, f"{file_name}_{i}", chunk) for i, chunk in enumerate(chunk_text(text)))
+            if len(pending) >= MIN_PARALLEL_TEXTS:
+                insert_chunks(conn, encoders, cache, pending, processes)
+                pending = []
+        if pending:
+            insert_chunks(conn, encoders, cache, pending, processes)
+    finally:
+        for encoder in encoders.values():
+            stop_lazy_encoder(encoder)
+        print(f"Embedding cache: {cache_stats(cache)}")
+        close_cache(cache)
 
     # Close the database connection
     cursor.close()
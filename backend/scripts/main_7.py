@@ -9,7 +9,7 @@ from ingest_to_neo4j import ingest_data_to_neo4j
 from pdf_parser import parse_pdfs
 from chunking import chunk_parsed_data
 from embedding import embed_chunks
-from indexer import create_index
+from indexer import update_index
 
 # Configuration
 LIMIT = 5  # Limit on the number of pages to scrape in each run
@@ -170,9 +170,9 @@ def main():
     print("Embedding chunked data...")
     embed_chunks(CHUNKED_DIR, EMBEDDING_DIR)
 
-    # Step 10: Create indexes
-    print("Creating indexes...")
-    create_index(EMBEDDING_DIR, INDEX_DIR)
+    # Step 10: Update indexes with new, changed and deleted chunks
+    print("Updating indexes...")
+    update_index(EMBEDDING_DIR, INDEX_DIR)
 
     # Step 11: Map metadata
     print("Mapping metadata...")
@@ -1,18 +1,24 @@
 import os
-from scraper_brandcentral import scrape_site, load_progress_file, save_progress_file
-from authenticator import login_to_verizon_with_playwright
+from scraper_brandcentral import crawl_site, load_progress_file
+from authenticator import get_authenticated_state, SESSION_FILE
 from pdf_parser import parse_pdfs
-from chunking import chunk_parsed_data
+from parser import parse_all
+from chunking import chunk_parsed_data, chunk_documents
 from embedding import embed_chunks
-from indexer import create_index
+from indexer import update_index
 from map_metadata import map_metadata
+from progress_journal import progress_exists, compact_progress
 from ingest_to_neo4j import ingest_data_to_neo4j
 
 # Configuration
 LIMIT = 300  # Limit on the number of pages to scrape in each run
+CONCURRENCY = 4  # Pages scraped at the same time to start with; adapts to how fast the site responds
+RECRAWL = True  # Revisit scraped pages and refresh only the ones that changed
 DATA_DIR = "../data"
 PROGRESS_FILE = os.path.join(DATA_DIR, "progress_summary.json")
 PAGES_AS_PDF_DIR = os.path.join(DATA_DIR, "pages_as_pdf")
+SCRAPED_PAGES_DIR = os.path.join(DATA_DIR, "scraped_pages")
+CONVERTED_DOWNLOADS_DIR = os.path.join(DATA_DIR, "converted_downloads")
 PARSED_DIR = os.path.join(DATA_DIR, "parsed_text_files")
 CHUNKED_DIR = os.path.join(DATA_DIR, "chunked_text_files")
 EMBEDDING_DIR = os.path.join(DATA_DIR, "embeddings")
@@ -38,47 +44,47 @@ def main():
     # progress_data = load_progress_file(PROGRESS_FILE)
     # last_page_id = progress_data[-1]["page_id"] if progress_data else 0
 
-    # # Step 2: Authenticate using Playwright and start scraping
+    # # Step 2: Authenticate using Playwright, reusing the saved session while it is valid
     # from playwright.sync_api import sync_playwright
     # with sync_playwright() as playwright:
-    #     context, page = login_to_verizon_with_playwright(playwright)
-    #     if not context or not page:
-    #         print("Authentication failed. Exiting pipeline.")
-    #         return
-
-    #     try:
-    #         # Step 3: Start scraping
-    #         print(f"Scraping with limit: {LIMIT}")
-    #         progress_data = scrape_site(
-    #             page=page,
-    #             start_url=BASE_URL,
-    #             base_url=BASE_URL,
-    #             progress_data=progress_data,
-    #             limit=LIMIT,
-    #             last_page_id=last_page_id,
-    #         )
-    #     finally:
-    #         # Ensure context is closed
-    #         context.close()
-
-    # # Step 4: Save updated progress summary
-    # save_progress_file(progress_data, PROGRESS_FILE)
-
-    # # Step 5: Parse PDFs
-    # print("Parsing PDF files...")
-    # parse_pdfs([PAGES_AS_PDF_DIR], PARSED_DIR)
-
-    # # Step 6: Chunk parsed data
+    #     storage_state = get_authenticated_state(playwright)
+    # if not storage_state:
+    #     print("Authentication failed. Exiting pipeline.")
+    #     return
+
+    # # Step 3: Start scraping
+    # print(f"Scraping with limit: {LIMIT}")
+    # progress_data = crawl_site(
+    #     start_url=BASE_URL,
+    #     base_url=BASE_URL,
+    #     progress_data=progress_data,
+    #     limit=LIMIT,
+    #     last_page_id=last_page_id,
+    #     storage_state=storage_state,
+    #     session_file=SESSION_FILE,
+    #     concurrency=CONCURRENCY,
+    #     recrawl=RECRAWL,
+    # )
+
+    # # Step 4: Compact the progress journal (pages were journaled as they were scraped)
+    # compact_progress(PROGRESS_FILE)
+
+    # # Step 5: Parse scraped pages from their HTML
+    # print("Parsing scraped pages...")
+    # parse_all(SCRAPED_PAGES_DIR, PARSED_DIR)
+
+    # # Step 6: Chunk parsed pages, and stream downloaded documents (large decks) page by page into chunks
     # print("Chunking parsed data...")
     # chunk_parsed_data(PARSED_DIR, CHUNKED_DIR)
+    # chunk_documents([CONVERTED_DOWNLOADS_DIR], CHUNKED_DIR)
 
     # # Step 7: Embed chunks
     # print("Embedding chunked data...")
     # embed_chunks(CHUNKED_DIR, EMBEDDING_DIR)
 
-    # # Step 8: Create indexes
-    # print("Creating indexes...")
-    # create_index(EMBEDDING_DIR, INDEX_DIR)
+    # # Step 8: Update indexes with new, changed and deleted chunks
+    # print("Updating indexes...")
+    # update_index(EMBEDDING_DIR, INDEX_DIR)
 
     # Step 9: Map metadata
     print("Mapping metadata...")
@@ -86,7 +92,7 @@ def main():
         mapped_metadata_path = os.path.join(DATA_DIR, "mapped_metadata.json")
         # progress_file_path= os.path.join(DATA_DIR, "progress_summary.json")
         # Check if progress file exists
-        if not os.path.exists(PROGRESS_FILE):
+        if not progress_exists(PROGRESS_FILE):
             raise FileNotFoundError(f"Progress file not found: {PROGRESS_FILE}")
         
         # Ensure index and embedding directories exist
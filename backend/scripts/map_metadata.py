@@ -1,5 +1,6 @@
 import json
 import os
+from progress_journal import progress_exists, iter_progress
 
 def map_metadata(progress_file, mapped_metadata_file, index_dir, embedding_dir):
     """
@@ -7,20 +8,17 @@ def map_metadata(progress_file, mapped_metadata_file, index_dir, embedding_dir):
     Includes child_pages, download_list, parent_pages, embeddings, and indexes.
     """
     # Ensure progress file exists
-    if not os.path.exists(progress_file):
+    if not progress_exists(progress_file):
         print(f"Error: {progress_file} not found.")
         return
 
-    # Load progress data
-    with open(progress_file, "r") as f:
-        progress_data = json.load(f)
-
     metadata = {
         "nodes": [],
         "relationships": []
     }
 
-    for entry in progress_data:
+    # Stream progress entries from the journal
+    for entry in iter_progress(progress_file):
         # Add Page Node
         metadata["nodes"].append({
             "id": entry["page_id"],
@@ -1,17 +1,116 @@
 from PIL import Image
 import pytesseract
+import io
 import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+# OCR results are cached by the hash of the image that was recognised, so each
+# distinct image or scanned page is only run through Tesseract once. The key is
+# the exact content hash, not the image registry's perceptual dHash
+# (image_registry.py): at 64 bits, scanned text pages of one layout look alike,
+# and reusing a near-duplicate's text would return another page's words.
+OCR_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "cache", "ocr")
+OCR_DPI = 200  # Resolution scanned PDF pages are rasterized at
+MIN_TEXT_CHARS = 20  # Pages with less extractable text than this have no usable text layer
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def needs_ocr(text):
+    """Return True if a page's extracted text is too short to be its real content."""
+    return len(text.strip()) < MIN_TEXT_CHARS
+
+
+def image_hash(image_bytes):
+    """Return the sha256 hex digest identifying an image."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def cached_ocr(image_bytes, cache_dir=OCR_CACHE_DIR):
+    """Run Tesseract on an encoded image, reusing the cached result for an identical image."""
+    cache_file = os.path.join(cache_dir, f"{image_hash(image_bytes)}.txt")
+    if os.path.exists(cache_file):
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return f.read()
+
+    text = pytesseract.image_to_string(Image.open(io.BytesIO(image_bytes)))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_file, cache_file)
+    return text
+
 
 def ocr_image(image_path):
-    return pytesseract.image_to_string(Image.open(image_path))
+    with open(image_path, "rb") as f:
+        return cached_ocr(f.read())
+
+
+def rasterize_page(page, dpi=OCR_DPI):
+    """Render a PyMuPDF page to PNG bytes."""
+    return page.get_pixmap(dpi=dpi).tobytes("png")
+
+
+def ocr_pdf_page(pdf_path, page_number, dpi=OCR_DPI):
+    """Rasterize one page of a PDF and OCR it."""
+    import fitz
+
+    with fitz.open(pdf_path) as pdf:
+        return cached_ocr(rasterize_page(pdf[page_number - 1], dpi))
+
+
+def ocr_record_pages(record, executor=None):
+    """
+    OCR the pages of a parsed PDF record that have no text layer, in parallel
+    when an executor is given, and update the record's text in place.
+    :param record: Record from document_parser.parse_document().
+    :param executor: ProcessPoolExecutor to OCR pages on, or None to OCR in-process.
+    :return: Number of pages OCR'd.
+    """
+    pages = [page for page in record["pages"] if page.get("needs_ocr")]
+    if not pages:
+        return 0
+
+    page_numbers = [page["page_number"] for page in pages]
+    paths = [record["source"]] * len(pages)
+    try:
+        if executor is None:
+            texts = [ocr_pdf_page(path, number) for path, number in zip(paths, page_numbers)]
+        else:
+            texts = list(executor.map(ocr_pdf_page, paths, page_numbers))
+    except Exception as e:
+        print(f"OCR failed for {record['source']}: {e}")
+        return 0
+
+    for page, text in zip(pages, texts):
+        page["text"] = text.strip()
+        page["method"] = "ocr"
+        page["needs_ocr"] = False
+    record["text"] = "\n".join(page["text"] for page in record["pages"] if page["text"])
+    print(f"OCR'd {len(pages)} pages without a text layer in {record['file_name']}")
+    return len(pages)
+
+
+def ocr_images(image_paths, processes=None):
+    """OCR images on a process pool and return {image_path: text}."""
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1 or len(image_paths) <= 1:
+        return {path: ocr_image(path) for path in image_paths}
+    with ProcessPoolExecutor(max_workers=min(processes, len(image_paths))) as executor:
+        return dict(zip(image_paths, executor.map(ocr_image, image_paths)))
+
 
 if __name__ == "__main__":
     input_path = "../data/ocr_images/"
     output_path = "../data/parsed_data/"
     os.makedirs(output_path, exist_ok=True)
 
-    for file in os.listdir(input_path):
-        if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            ocr_text = ocr_image(os.path.join(input_path, file))
-            with open(os.path.join(output_path, file.replace(".png", ".txt").replace(".jpg", ".txt")), "w", encoding="utf-8") as f:
-                f.write(ocr_text)
+    image_paths = [
+        os.path.join(input_path, file) for file in os.listdir(input_path)
+        if file.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    for image_path, ocr_text in ocr_images(image_paths).items():
+        file = os.path.basename(image_path)
+        with open(os.path.join(output_path, os.path.splitext(file)[0] + ".txt"), "w", encoding="utf-8") as f:
+            f.write(ocr_text)
@@ -0,0 +1,147 @@
+import os
+import time
+import sqlite3
+import hashlib
+from html.parser import HTMLParser
+
+# Change detection for re-crawls. For every page and downloaded file the
+# crawler keeps the server's validators (ETag, Last-Modified) and a hash of
+# its content. On the next run a conditional request answered with 304 Not
+# Modified skips the URL without rendering it; otherwise the rendered page is
+# fingerprinted and only saved again if the fingerprint changed, so unchanged
+# pages keep their files and are not parsed or embedded again.
+SKIP_CONTENT_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+
+class FingerprintParser(HTMLParser):
+    """Collect the visible text and link targets of a page, ignoring markup and scripts."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_CONTENT_TAGS:
+            self.skip_depth += 1
+            return
+        for name, value in attrs:
+            if name in ("href", "src") and value:
+                self.parts.append(f"@{value}")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_CONTENT_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            text = " ".join(data.split())
+            if text:
+                self.parts.append(text)
+
+
+def content_fingerprint(html):
+    """
+    Hash a page's normalized DOM: visible text and link/asset targets, with
+    whitespace collapsed. Scripts, styles, attribute order and per-request
+    markup (nonces, generated ids) do not affect it.
+    """
+    parser = FingerprintParser()
+    parser.feed(html)
+    parser.close()
+    return hashlib.sha256("\n".join(parser.parts).encode("utf-8")).hexdigest()
+
+
+def open_page_state(db_path):
+    """Open (or create) the page state store."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS url_state (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            last_checked REAL,
+            last_changed REAL
+        )
+    """)
+    return {"conn": conn, "stats": {"new": 0, "changed": 0, "not_modified": 0, "same_content": 0}}
+
+
+def close_page_state(store):
+    store["conn"].commit()
+    store["conn"].close()
+
+
+def get_page_state(store, url):
+    """Return the stored state of a URL as a dict, or None if it was never fetched."""
+    row = store["conn"].execute(
+        "SELECT etag, last_modified, content_hash, last_checked, last_changed FROM url_state WHERE url = ?", (url,)
+    ).fetchone()
+    if not row:
+        return None
+    return dict(zip(("etag", "last_modified", "content_hash", "last_checked", "last_changed"), row))
+
+
+def conditional_headers(known):
+    """Request headers that make the server answer 304 if the URL has not changed."""
+    headers = {}
+    if known and known["etag"]:
+        headers["If-None-Match"] = known["etag"]
+    if known and known["last_modified"]:
+        headers["If-Modified-Since"] = known["last_modified"]
+    return headers
+
+
+def record_not_modified(store, url):
+    """Note that the server answered 304 Not Modified for a URL."""
+    store["conn"].execute("UPDATE url_state SET last_checked = ? WHERE url = ?", (time.time(), url))
+    store["conn"].commit()
+    store["stats"]["not_modified"] += 1
+
+
+def content_changed(known, content_hash):
+    """Return True if content is new or differs from the stored hash."""
+    return not known or known["content_hash"] != content_hash
+
+
+def record_fetch(store, url, headers, content_hash):
+    """
+    Store the validators and content hash of a freshly fetched URL. Call it once
+    the content has been saved, so a failed save is retried on the next run.
+    :param headers: Response headers with lower-case names.
+    """
+    known = get_page_state(store, url)
+    now = time.time()
+    store["conn"].execute("""
+        INSERT INTO url_state (url, etag, last_modified, content_hash, last_checked, last_changed)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            etag = excluded.etag,
+            last_modified = excluded.last_modified,
+            content_hash = excluded.content_hash,
+            last_checked = excluded.last_checked,
+            last_changed = CASE WHEN url_state.content_hash = excluded.content_hash
+                                THEN url_state.last_changed ELSE excluded.last_changed END
+    """, (url, headers.get("etag"), headers.get("last-modified"), content_hash, now, now))
+    store["conn"].commit()
+    if not known:
+        store["stats"]["new"] += 1
+    elif content_changed(known, content_hash):
+        store["stats"]["changed"] += 1
+    else:
+        store["stats"]["same_content"] += 1
+
+
+def last_checked_times(store):
+    """Return {url: last check time}, e.g. for crawl_frontier.by_freshness()."""
+    return dict(store["conn"].execute("SELECT url, last_checked FROM url_state"))
+
+
+def page_state_stats(store):
+    """Return this session's change counts and the share of URLs that were unchanged."""
+    stats = store["stats"]
+    unchanged = stats["not_modified"] + stats["same_content"]
+    total = unchanged + stats["new"] + stats["changed"]
+    return {**stats, "unchanged_rate": round(unchanged / total, 4) if total else 0.0}
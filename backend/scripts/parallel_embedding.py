@@ -0,0 +1,111 @@
+import os
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Rough resident size of one worker holding a sentence-transformers model on CPU.
+# Used to keep the pool within available memory.
+WORKER_MEMORY_MB = 1500
+BATCH_SIZE = 32
+CHUNK_SIZE = 256  # Texts handed to a worker per work item
+MIN_PARALLEL_TEXTS = 256  # Below this, a single process is faster than the pool
+
+
+def default_process_count(worker_memory_mb=WORKER_MEMORY_MB):
+    """Use every core, capped by how many model copies fit in available memory."""
+    processes = os.cpu_count() or 1
+    if psutil is not None:
+        available_mb = psutil.virtual_memory().available // (1024 * 1024)
+        processes = min(processes, max(1, int(available_mb // worker_memory_mb)))
+    return processes
+
+
+def start_embedding_pool(model, processes=None):
+    """
+    Start a pool of worker processes, each holding its own copy of the model.
+    :param model: Loaded SentenceTransformer.
+    :param processes: Number of workers (defaults to default_process_count()).
+    :return: Pool handle for encode_texts(), or None when only one process is used.
+    """
+    processes = processes or default_process_count()
+    if processes <= 1:
+        return None
+    if getattr(model, "backend", "torch") != "torch":
+        # ONNX Runtime sessions already use every core and cannot be sent to workers
+        print("Embedding pool is only used with the torch backend; encoding in-process.")
+        return None
+
+    # One intra-op thread per worker; the parallelism comes from the processes.
+    # Workers are spawned, so they inherit these variables but the parent does not change.
+    previous = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+    for name in previous:
+        os.environ[name] = "1"
+    try:
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * processes)
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    print(f"Started embedding pool with {processes} processes")
+    return pool
+
+
+def stop_embedding_pool(pool):
+    """Stop the worker processes started by start_embedding_pool()."""
+    if pool is not None:
+        from sentence_transformers import SentenceTransformer
+        SentenceTransformer.stop_multi_process_pool(pool)
+
+
+def encode_texts(model, texts, pool=None, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    """
+    Encode texts with the pool when one is running, otherwise in-process.
+    Work is split into chunks that are encoded by whichever worker is free and
+    reassembled in input order.
+    :return: float32 array with one row per text.
+    """
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    if pool is None or len(texts) < MIN_PARALLEL_TEXTS:
+        embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=True)
+    else:
+        embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size, chunk_size=chunk_size)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def encode_texts_pooled(model, texts, processes=None):
+    """Encode texts, starting a worker pool for the call only when there are enough of them."""
+    pool = start_embedding_pool(model, processes) if len(texts) >= MIN_PARALLEL_TEXTS else None
+    try:
+        return encode_texts(model, texts, pool)
+    finally:
+        stop_embedding_pool(pool)
+
+
+def start_lazy_encoder(load_model, processes=None):
+    """
+    Defer loading the model and starting the pool until something needs encoding,
+    so runs where every text is cached never load the model.
+    :param load_model: Returns a loaded SentenceTransformer.
+    :return: Encoder state for lazy_encode() and stop_lazy_encoder().
+    """
+    return {"load_model": load_model, "processes": processes, "model": None, "pool": None}
+
+
+def lazy_encode(encoder, texts):
+    """Encode texts, loading the model and starting the pool on first use."""
+    if encoder["model"] is None:
+        encoder["model"] = encoder["load_model"]()
+        encoder["pool"] = start_embedding_pool(encoder["model"], encoder["processes"])
+    return encode_texts(encoder["model"], texts, encoder["pool"])
+
+
+def stop_lazy_encoder(encoder):
+    """Stop the pool started by lazy_encode(), if any."""
+    stop_embedding_pool(encoder["pool"])
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+
+# Index of parsed files, kept next to the parser output. A source is re-parsed
+# only if its fingerprint (size, mtime, content hash) or the parser version
+# changed, or its output file is missing.
+INDEX_FILE = "parse_index.json"
+PARSER_VERSION = 2  # Bump when parser output changes so every file is re-parsed
+
+
+def content_hash(path, block_size=1 << 20):
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_parse_index(output_dir):
+    """Load the parse index for an output directory, or an empty one."""
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading parse index {index_path}, re-parsing everything: {e}")
+        return {}
+
+
+def save_parse_index(output_dir, index):
+    """Write the parse index atomically."""
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, index_path)
+
+
+def is_unchanged(index, source_path, output_path):
+    """
+    Return True if source_path was parsed into output_path by this parser version
+    and has not changed since. Size and mtime are checked first; the content hash
+    is only computed when they differ, so a touched but identical file is reused.
+    """
+    entry = index.get(source_path)
+    if not entry or entry.get("version") != PARSER_VERSION or not os.path.exists(output_path):
+        return False
+
+    stat = os.stat(source_path)
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime == entry["mtime"]:
+        return True
+    if content_hash(source_path) != entry["hash"]:
+        return False
+    entry["mtime"] = stat.st_mtime
+    return True
+
+
+def record_parse(index, source_path, output_path):
+    """Record the fingerprint of a source that was just parsed."""
+    stat = os.stat(source_path)
+    index[source_path] = {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "hash": content_hash(source_path),
+        "output": output_path,
+        "version": PARSER_VERSION,
+    }
+
+
+def split_unchanged(index, source_paths, output_for, force=False):
+    """
+    Split sources into those that need parsing and those whose output can be reused.
+    :param output_for: Function mapping a source path to its output path.
+    :param force: Re-parse everything, e.g. after a parser upgrade.
+    :return: (to_parse, reused) lists of source paths.
+    """
+    if force:
+        return list(source_paths), []
+    to_parse, reused = [], []
+    for source_path in source_paths:
+        try:
+            unchanged = is_unchanged(index, source_path, output_for(source_path))
+        except OSError:
+            unchanged = False
+        (reused if unchanged else to_parse).append(source_path)
+    return to_parse, reused
+
+
+def print_parse_stats(parsed, reused, failed=0):
+    """Print how many sources were parsed versus reused from earlier runs."""
+    total = parsed + reused + failed
+    reuse_rate = reused / total if total else 0.0
+    print(f"Parse cache: {parsed} parsed, {reused} reused, {failed} failed ({reuse_rate:.1%} reused)")
+    return {"parsed": parsed, "reused": reused, "failed": failed, "reuse_rate": round(reuse_rate, 4)}
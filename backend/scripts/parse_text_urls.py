@@ -1,6 +1,6 @@
 import os
-import re
-from PyPDF2 import PdfReader
+from document_parser import parse_document, parse_documents, list_documents
+from parse_cache import load_parse_index, save_parse_index, split_unchanged, record_parse, print_parse_stats
 
 PDF_DIRS = ["../data/pages_as_pdf", "../data/converted_downloads"]
 PARSED_DIR = "../data/parsed_text_files"
@@ -9,36 +9,41 @@ os.makedirs(PARSED_DIR, exist_ok=True)
 
 def extract_text_and_urls(pdf_path):
     """Extract text and URLs from a PDF."""
-    try:
-        reader = PdfReader(pdf_path)
-        if not reader.pages:
-            print(f"Empty PDF: {pdf_path}")
-            return "", []
+    record = parse_document(pdf_path)
+    return record["text"], record["links"]
 
-        text = "".join(page.extract_text() for page in reader.pages if page.extract_text())
-        urls = re.findall(r"https?://\S+", text)
-        return text, urls
-    except FileNotFoundError:
-        print(f"File not found: {pdf_path}")
-    except Exception as e:
-        print(f"Failed to parse {pdf_path}: {e}")
-        return "", []
 
+def parsed_output(file_name):
+    """Return the text file a PDF is parsed into."""
+    return os.path.join(PARSED_DIR, f"{os.path.basename(file_name)}.txt")
 
 def save_parsed_data(file_name, text, urls):
     """Save extracted text and URLs."""
     base_name = os.path.basename(file_name)
-    text_file = os.path.join(PARSED_DIR, f"{base_name}.txt")
+    text_file = parsed_output(file_name)
     with open(text_file, "w", encoding="utf-8") as f:
         f.write(text + "\n\n" + "\n".join(urls))
     print(f"Saved parsed data for {base_name}")
+    return text_file
+
+def main(processes=None, force=False):
+    """Parse PDFs that changed since the last run; force re-parses all of them."""
+    index = load_parse_index(PARSED_DIR)
+    to_parse, reused = split_unchanged(index, list_documents(PDF_DIRS), parsed_output, force)
 
-def main():
-    for dir_path in PDF_DIRS:
-        pdf_files = [os.path.join(dir_path, file) for file in os.listdir(dir_path) if file.endswith(".pdf")]
-        for pdf_file in pdf_files:
-            text, urls = extract_text_and_urls(pdf_file)
-            save_parsed_data(pdf_file, text, urls)
+    parsed = failed = 0
+    try:
+        for record in parse_documents(to_parse, processes):
+            if record["error"]:
+                failed += 1
+                continue
+            text_file = save_parsed_data(record["source"], record["text"], record["links"])
+            record_parse(index, record["source"], text_file)
+            parsed += 1
+    finally:
+        save_parse_index(PARSED_DIR, index)
+
+    return print_parse_stats(parsed, len(reused), failed)
 
 if __name__ == "__main__":
     main()
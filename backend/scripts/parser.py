@@ -1,16 +1,13 @@
-from bs4 import BeautifulSoup
 import os
+from document_parser import parse_document, parse_documents, list_documents, HTML_EXTENSIONS
 
 def parse_html(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f, 'html.parser')
-    return soup.get_text()
+    return parse_document(file_path)["text"]
 
-def parse_all(scraped_dir, parsed_dir):
+def parse_all(scraped_dir, parsed_dir, processes=None):
     os.makedirs(parsed_dir, exist_ok=True)
-    for file in os.listdir(scraped_dir):
-        if file.endswith(".html"):
-            text = parse_html(os.path.join(scraped_dir, file))
-            with open(os.path.join(parsed_dir, file.replace(".html", ".txt")), "w", encoding="utf-8") as f:
-                f.write(text)
+    for record in parse_documents(list_documents([scraped_dir], HTML_EXTENSIONS), processes):
+        file = os.path.splitext(record["file_name"])[0] + ".txt"
+        with open(os.path.join(parsed_dir, file), "w", encoding="utf-8") as f:
+            f.write(record["text"])
     print(f"Parsing completed. Files saved in {parsed_dir}.")
@@ -1,6 +1,6 @@
 import os
-import json
-import pdfplumber
+from document_parser import parse_document, parse_documents, list_documents
+from parse_cache import load_parse_index, save_parse_index, split_unchanged, record_parse, print_parse_stats
 
 INPUT_DIRS = ["../data/pages_as_pdf", "../data/converted_downloads"]
 
@@ -10,6 +10,10 @@ PARSED_TEXT_DIR = "../data/parsed_text_plain"
 
 os.makedirs(PARSED_TEXT_DIR, exist_ok=True)
 
+def format_plain_text(pages):
+    """Join page records into plain text with page numbers."""
+    return "\n".join(f"Page {page['page_number']}:\n{page['text']}\n" for page in pages)
+
 def extract_text_and_links(pdf_path):
     """
     Extract text and hyperlinks from a PDF.
@@ -20,59 +24,56 @@ def extract_text_and_links(pdf_path):
     Returns:
         tuple: A list of parsed data (JSON format) and plain text content.
     """
-    parsed_data = []
-    plain_text = []
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                links = []
-
-                # Attempt to extract links if annotations are available
-                try:
-                    annotations = getattr(page, "annotations", [])
-                    for annotation in annotations:
-                        if annotation.get("uri"):
-                            links.append(annotation["uri"])
-                except AttributeError:
-                    print(f"No annotations found on page {page_num + 1} in {pdf_path}. Skipping links extraction.")
-                
-                parsed_data.append({
-                    "page_number": page_num + 1,
-                    "text": text.strip() if text else "",
-                    "links": links,
-                })
-
-                # Append text content to plain text list with page numbers
-                plain_text.append(f"Page {page_num + 1}:\n{text.strip() if text else ''}\n")
-        return parsed_data, "\n".join(plain_text)
-    except Exception as e:
-        print(f"Error parsing {pdf_path}: {e}")
+    record = parse_document(pdf_path)
+    if record["error"]:
         return None, None
+    parsed_data = [
+        {"page_number": page["page_number"], "text": page["text"], "links": page["links"]}
+        for page in record["pages"]
+    ]
+    return parsed_data, format_plain_text(record["pages"])
+
+def plain_text_output(pdf_path, text_output_dir):
+    """Return the plain text file a PDF is parsed into."""
+    return os.path.join(text_output_dir, f"{os.path.splitext(os.path.basename(pdf_path))[0]}.txt")
 
-def parse_pdfs(input_dirs,  text_output_dir):
+def parse_pdfs(input_dirs,  text_output_dir, processes=None, force=False):
     """
     Parse PDFs from multiple directories and save extracted data.
+    PDFs that are unchanged since they were last parsed are skipped.
     
     Args:
         input_dirs (list): List of directories containing PDF files.
-        json_output_dir (str): Directory where parsed JSON files will be saved.
         text_output_dir (str): Directory where plain text files will be saved.
+        processes (int): Worker processes to parse with (defaults to all cores).
+        force (bool): Re-parse every PDF, e.g. after a parser upgrade.
+
+    Returns:
+        dict: Counts of parsed, reused and failed PDFs.
     """
-    for input_dir in input_dirs:
-        for pdf_file in os.listdir(input_dir):
-            if pdf_file.endswith(".pdf"):
-                pdf_path = os.path.join(input_dir, pdf_file)
-                print(f"Parsing {pdf_path}...")
-                parsed_data, plain_text = extract_text_and_links(pdf_path)
-                
-                
-                if plain_text:
-                    # Save plain text output
-                    text_output_file = os.path.join(text_output_dir, f"{os.path.splitext(pdf_file)[0]}.txt")
-                    with open(text_output_file, "w", encoding="utf-8") as f:
-                        f.write(plain_text)
-                    print(f"Plain text data saved to {text_output_file}")
+    index = load_parse_index(text_output_dir)
+    to_parse, reused = split_unchanged(
+        index, list_documents(input_dirs), lambda path: plain_text_output(path, text_output_dir), force
+    )
+
+    parsed = failed = 0
+    try:
+        for record in parse_documents(to_parse, processes):
+            if record["error"] or not record["pages"]:
+                failed += 1
+                continue
+
+            # Save plain text output
+            text_output_file = plain_text_output(record["source"], text_output_dir)
+            with open(text_output_file, "w", encoding="utf-8") as f:
+                f.write(format_plain_text(record["pages"]))
+            record_parse(index, record["source"], text_output_file)
+            parsed += 1
+            print(f"Plain text data saved to {text_output_file}")
+    finally:
+        save_parse_index(text_output_dir, index)
+
+    return print_parse_stats(parsed, len(reused), failed)
 
 if __name__ == "__main__":
     parse_pdfs(INPUT_DIRS,  PARSED_TEXT_DIR)
@@ -0,0 +1,112 @@
+import os
+import json
+
+# Crawl progress is kept as an append-only JSON Lines journal next to the
+# progress file (progress_summary.json -> progress_summary.jsonl), one entry
+# per scraped page. Recording a page appends one line instead of rewriting
+# the whole summary. Compaction rewrites the journal with only the latest
+# entry for each page. A progress file in the old JSON array format is read
+# until the first journal is written, and is then migrated into it.
+
+
+def journal_path(progress_file):
+    """Return the journal that backs a progress file."""
+    return os.path.splitext(progress_file)[0] + ".jsonl"
+
+
+def progress_exists(progress_file):
+    """Return True if there is any recorded progress, in the journal or the old format."""
+    return os.path.exists(journal_path(progress_file)) or os.path.exists(progress_file)
+
+
+def iter_legacy_progress(progress_file):
+    """Yield the entries of an old-style JSON progress file."""
+    with open(progress_file, "r") as f:
+        data = json.load(f)
+    yield from data.get("pages", []) if isinstance(data, dict) else data
+
+
+def iter_progress(progress_file):
+    """Yield progress entries one at a time, in the order they were recorded."""
+    path = journal_path(progress_file)
+    if not os.path.exists(path):
+        if os.path.exists(progress_file):
+            yield from iter_legacy_progress(progress_file)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Only the last line can be partial, after a crash mid-write
+                print(f"Skipping incomplete progress entry in {path}")
+
+
+def write_progress(progress_file, entries):
+    """Replace the journal with the given entries and return how many were written."""
+    path = journal_path(progress_file)
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def compact_progress(progress_file):
+    """
+    Rewrite the journal keeping only the latest entry for each page. Entries
+    stay in the order they were recorded, so the last one is still the newest.
+    :return: Number of entries kept.
+    """
+    latest = {}
+    for entry in iter_progress(progress_file):
+        latest.pop(entry["page_link"], None)
+        latest[entry["page_link"]] = entry
+    count = write_progress(progress_file, latest.values())
+    print(f"Compacted progress journal {journal_path(progress_file)} to {count} entries")
+    return count
+
+
+def open_journal(progress_file):
+    """
+    Open the journal for appending, migrating an old-style progress file into it
+    and dropping a partial last line left by an interrupted run.
+    :return: Journal dict passed to append_progress() and close_journal().
+    """
+    path = journal_path(progress_file)
+    if not os.path.exists(path):
+        if os.path.exists(progress_file):
+            count = write_progress(progress_file, iter_legacy_progress(progress_file))
+            print(f"Migrated {count} progress entries from {progress_file} to {path}")
+        else:
+            open(path, "a").close()
+
+    with open(path, "rb+") as f:
+        data_end = f.seek(0, os.SEEK_END)
+        if data_end:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.seek(0)
+                f.truncate(f.read().rfind(b"\n") + 1)
+
+    return {"file": open(path, "a", encoding="utf-8"), "path": path, "progress_file": progress_file, "appended": 0}
+
+
+def append_progress(journal, entry):
+    """Record one page's progress entry."""
+    journal["file"].write(json.dumps(entry) + "\n")
+    journal["file"].flush()
+    journal["appended"] += 1
+
+
+def close_journal(journal, compact=True):
+    """Close the journal, compacting it if anything was appended."""
+    journal["file"].close()
+    if compact and journal["appended"]:
+        compact_progress(journal["progress_file"])
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import base64
+import numpy as np
+from embedding_backends import load_embedding_model, EMBEDDING_BACKEND
+from indexer import load_index, set_search_params, DEFAULT_NPROBE, DEFAULT_EF_SEARCH
+from id_mapping import load_id_mapping, lookup_chunk_id
+from progress_journal import progress_exists, iter_progress
+
+# Configuration
+DATA_DIR = "../data"
+INDEX_DIR = os.path.join(DATA_DIR, "indexes")
+CHUNKED_DIR = os.path.join(DATA_DIR, "chunked_text_files")
+PROGRESS_FILE = os.path.join(DATA_DIR, "progress_summary.json")
+MODEL_PATH = "../models/all-MiniLM-L6-v2"  # Must match the model used by embed_chunks()
+INDEX_FILE = "vector_index.faiss"
+BATCH_SIZE = 32
+
+# Loaded services, keyed by index directory, so the index is only read once per process
+_services = {}
+
+
+def decode_base64_to_url(b64_string):
+    """Decode a base64 file name back to a URL, or return None if it is not base64."""
+    try:
+        url = base64.urlsafe_b64decode(b64_string.encode()).decode()
+        return url if url.startswith("http") else None
+    except Exception:
+        return None
+
+
+def load_page_links(progress_file):
+    """Map saved PDF/HTML file stems to the page they were scraped from."""
+    if not progress_file or not progress_exists(progress_file):
+        return {}
+
+    page_links = {}
+    for entry in iter_progress(progress_file):
+        for key in ("saved_as_pdf", "saved_as_html"):
+            if entry.get(key):
+                stem = os.path.splitext(os.path.basename(entry[key]))[0]
+                page_links[stem] = entry["page_link"]
+    return page_links
+
+
+def load_chunk_locations(chunked_dir, page_links):
+    """
+    Map each chunk_id to (chunk_file, source, webpage). Chunk text is not kept;
+    read_chunk_texts() reads it for search hits only.
+    """
+    locations = {}
+    for chunk_file in os.listdir(chunked_dir):
+        if not chunk_file.endswith(".json"):
+            continue
+        source = os.path.splitext(chunk_file)[0]
+        if source.startswith("chunked_"):
+            source = source[len("chunked_"):]
+        webpage = page_links.get(source) or decode_base64_to_url(source)
+
+        path = os.path.join(chunked_dir, chunk_file)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for chunk in json.load(f):
+                    locations[chunk["chunk_id"]] = (path, source, webpage)
+        except Exception as e:
+            print(f"Error loading chunks from {chunk_file}: {e}")
+    return locations
+
+
+def read_chunk_texts(locations, chunk_ids):
+    """Return {chunk_id: text} for the given chunks, reading each chunk file once."""
+    wanted_by_file = {}
+    for chunk_id in chunk_ids:
+        if chunk_id in locations:
+            wanted_by_file.setdefault(locations[chunk_id][0], set()).add(chunk_id)
+
+    texts = {}
+    for path, wanted in wanted_by_file.items():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for chunk in json.load(f):
+                    if chunk["chunk_id"] in wanted:
+                        texts[chunk["chunk_id"]] = chunk["text"]
+        except Exception as e:
+            print(f"Error reading chunks from {path}: {e}")
+    return texts
+
+
+def load_search_service(index_dir=INDEX_DIR, chunked_dir=CHUNKED_DIR, model_path=MODEL_PATH,
+                        progress_file=PROGRESS_FILE, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH,
+                        backend=EMBEDDING_BACKEND):
+    """
+    Load the FAISS index, id mapping, chunk locations and embedding model once.
+    :param index_dir: Directory written by create_index().
+    :param chunked_dir: Directory containing chunked text files.
+    :param model_path: Embedding model used to build the index.
+    :param progress_file: Scraper progress file used to resolve page links.
+    :param nprobe: IVF lists probed per query.
+    :param ef_search: HNSW candidate list size per query.
+    :param backend: Embedding backend ("torch", "onnx" or "onnx-int8").
+    :return: Service dict passed to search_batch().
+    """
+    if index_dir in _services:
+        return _services[index_dir]
+
+    start = time.perf_counter()
+    index = load_index(index_dir, INDEX_FILE)
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+
+    service = {
+        "index": index,
+        "id_mapping": load_id_mapping(index_dir),
+        "chunk_locations": load_chunk_locations(chunked_dir, load_page_links(progress_file)),
+        "model": load_embedding_model(model_path, backend),
+    }
+    _services[index_dir] = service
+    print(f"FAISS search service loaded {index.ntotal} vectors in {time.perf_counter() - start:.2f}s")
+    return service
+
+
+def embed_queries(service, queries, batch_size=BATCH_SIZE):
+    """Embed queries in batches as unit-length float32 vectors."""
+    embeddings = service["model"].encode(
+        queries, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+    )
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def search_batch(queries, top_k=10, service=None):
+    """
+    Search the FAISS index for several queries at once.
+    :param queries: List of query strings.
+    :param top_k: Number of results per query.
+    :param service: Loaded service (defaults to load_search_service()).
+    :return: One list of result dicts per query.
+    """
+    service = service or load_search_service()
+    # update_index() removes deleted rows from the index (or rebuilds it), so every
+    # hit is live; positions of -1 only pad queries with fewer than top_k hits
+    scores, positions = service["index"].search(embed_queries(service, queries), top_k)
+
+    locations = service["chunk_locations"]
+    all_results = []
+    for query_scores, query_positions in zip(scores, positions):
+        results = []
+        for score, position in zip(query_scores, query_positions):
+            chunk_id = lookup_chunk_id(service["id_mapping"], position)
+            if chunk_id is None:
+                continue
+            _, source, webpage = locations.get(chunk_id, (None, None, None))
+            results.append({"chunk_id": chunk_id, "source": source, "webpage": webpage, "score": float(score)})
+        all_results.append(results)
+
+    texts = read_chunk_texts(locations, {result["chunk_id"] for results in all_results for result in results})
+    for results in all_results:
+        for result in results:
+            result["text"] = texts.get(result["chunk_id"], "")
+    return all_results
+
+
+def similarity_search(question, top_k=10, service=None):
+    """Search a single question and return (content, score, webpage) tuples like the pgvector services."""
+    results = search_batch([question], top_k=top_k, service=service)[0]
+    return [(result["text"], result["score"], result["webpage"] or result["source"]) for result in results]
+
+
+if __name__ == "__main__":
+    query_text = "What are the components of a toggle?"
+    start = time.perf_counter()
+    results = similarity_search(query_text, top_k=5)
+    print(f"Search Query: {query_text} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+    for idx, (content, score, webpage) in enumerate(results, start=1):
+        print(f"\nResult {idx}:")
+        print(f"  - Context: {content[:500]}{'...' if len(content) > 500 else ''}")
+        print(f"  - Relevancy Score: {round(score, 4)}")
+        print(f"  - Webpage: {webpage}")
@@ -0,0 +1,188 @@
+import time
+import asyncio
+from collections import deque
+
+# Adaptive concurrency for the crawler and the download manager (AIMD:
+# additive increase, multiplicative decrease). Every request holds a slot
+# while it runs. While requests succeed and latency stays near the best seen
+# recently, the limit grows by about one slot per limit's worth of successes.
+# Throttling (429/503), server errors, timeouts and latency well above that
+# baseline cut it by BACKOFF_FACTOR, at most once per BACKOFF_COOLDOWN so a
+# burst of failures from requests already in flight counts as one signal.
+# The baseline is the lowest smoothed latency over the last BASELINE_WINDOW
+# samples, so it follows the site when its pages get slower for good.
+BACKOFF_FACTOR = 0.5
+BACKOFF_COOLDOWN = 5.0  # Seconds between two decreases
+LATENCY_TOLERANCE = 2.0  # Back off once smoothed latency exceeds this multiple of the baseline
+LATENCY_SMOOTHING = 0.2  # Weight of the newest sample in the smoothed latency
+LATENCY_WARMUP = 5  # Samples before the baseline is trusted
+BASELINE_WINDOW = 100  # Samples the baseline is the minimum over
+RATE_WINDOW = 30.0  # Seconds over which the completion rate is measured
+THROTTLE_STATUSES = {429, 503}
+BACKOFF_OUTCOMES = {"throttled", "server_error", "timeout"}
+
+
+def new_rate_controller(name, initial, minimum=1, maximum=None):
+    """
+    :param name: Shown in log lines and metrics, e.g. "pages" or "downloads".
+    :param initial: Concurrency to start with.
+    :param minimum: The limit never drops below this.
+    :param maximum: The limit never grows above this (defaults to initial).
+    :return: Controller dict passed to the other functions.
+    """
+    maximum = maximum or initial
+    return {
+        "name": name,
+        "limit": float(min(max(initial, minimum), maximum)),
+        "minimum": minimum,
+        "maximum": maximum,
+        "in_use": 0,
+        "latency_ms": None,  # Smoothed
+        "baseline_ms": None,  # Lowest smoothed latency over the recent samples
+        "recent_latencies": deque(maxlen=BASELINE_WINDOW),  # Smoothed
+        "latency_samples": 0,
+        "last_backoff": 0.0,
+        "started": time.monotonic(),
+        "completed": deque(),  # Completion times within RATE_WINDOW
+        "freed": asyncio.Condition(),
+        "stats": {"ok": 0, "error": 0, "throttled": 0, "server_error": 0, "timeout": 0, "slow": 0,
+                  "increases": 0, "decreases": 0, "peak_limit": min(max(initial, minimum), maximum)},
+    }
+
+
+def current_limit(controller):
+    return int(controller["limit"])
+
+
+async def acquire(controller):
+    """Wait for a free slot and take it."""
+    async with controller["freed"]:
+        while controller["in_use"] >= current_limit(controller):
+            await controller["freed"].wait()
+        controller["in_use"] += 1
+
+
+async def run_limited(controller, request_fn):
+    """Run request_fn() in a slot, adjusting the limit by whether it succeeded."""
+    await acquire(controller)
+    outcome = None
+    try:
+        result = await request_fn()
+        outcome = "ok"
+        return result
+    except Exception as e:
+        outcome = classify_error(e)
+        raise
+    finally:
+        await release(controller, outcome)
+
+
+async def release(controller, outcome):
+    """
+    Give a slot back and adjust the limit by the request's outcome.
+    :param outcome: "ok", a backoff outcome (see classify_error()), "error" for
+                    failures that say nothing about load (404 and the like), or
+                    None if no request was made.
+    """
+    async with controller["freed"]:
+        controller["in_use"] -= 1
+        if outcome is not None:
+            record_outcome(controller, outcome)
+        controller["freed"].notify_all()
+
+
+def record_outcome(controller, outcome):
+    stats = controller["stats"]
+    stats[outcome] += 1
+    now = time.monotonic()
+    completed = controller["completed"]
+    completed.append(now)
+    while completed and completed[0] < now - RATE_WINDOW:
+        completed.popleft()
+
+    if outcome == "ok" and latency_degraded(controller):
+        stats["slow"] += 1
+        backoff(controller, "slow", now)
+    elif outcome in BACKOFF_OUTCOMES:
+        backoff(controller, outcome, now)
+    elif outcome == "ok":
+        increase(controller)
+
+
+def increase(controller):
+    old = current_limit(controller)
+    # +1 once a full window of `limit` requests has succeeded
+    controller["limit"] = min(controller["limit"] + 1 / controller["limit"], controller["maximum"])
+    if current_limit(controller) > old:
+        controller["stats"]["increases"] += 1
+        controller["stats"]["peak_limit"] = max(controller["stats"]["peak_limit"], current_limit(controller))
+        print(f"[{controller['name']}] Concurrency {old} -> {current_limit(controller)}")
+
+
+def backoff(controller, reason, now):
+    if now - controller["last_backoff"] < BACKOFF_COOLDOWN or controller["limit"] <= controller["minimum"]:
+        return
+    old = current_limit(controller)
+    controller["limit"] = max(controller["limit"] * BACKOFF_FACTOR, controller["minimum"])
+    controller["last_backoff"] = now
+    controller["stats"]["decreases"] += 1
+    print(f"[{controller['name']}] Concurrency {old} -> {current_limit(controller)} ({reason})")
+
+
+def record_latency(controller, latency_ms):
+    """
+    Record how long a request took to respond (time to first byte, not the
+    whole transfer). Latency far above the baseline is treated like throttling.
+    """
+    smoothed = controller["latency_ms"]
+    smoothed = latency_ms if smoothed is None else (1 - LATENCY_SMOOTHING) * smoothed + LATENCY_SMOOTHING * latency_ms
+    controller["latency_ms"] = smoothed
+    controller["latency_samples"] += 1
+    controller["recent_latencies"].append(smoothed)
+    if controller["latency_samples"] >= LATENCY_WARMUP:
+        controller["baseline_ms"] = min(controller["recent_latencies"])
+
+
+def latency_degraded(controller):
+    baseline = controller["baseline_ms"]
+    return baseline is not None and controller["latency_ms"] > LATENCY_TOLERANCE * baseline
+
+
+def classify_status(status):
+    """Outcome of a request that got an HTTP response."""
+    if status in THROTTLE_STATUSES:
+        return "throttled"
+    if status >= 500:
+        return "server_error"
+    if status >= 400:
+        return "error"
+    return "ok"
+
+
+def classify_error(error):
+    """Outcome of a request that raised, e.g. a timeout or an HTTP error status."""
+    if isinstance(error, asyncio.TimeoutError) or type(error).__name__ == "TimeoutError":
+        return "timeout"  # Also Playwright's TimeoutError, which is not a builtin one
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return classify_status(status)
+    return "error"
+
+
+def rate_metrics(controller):
+    """Return the current limit, its bounds, slots in use, completions per second and outcome counts."""
+    now = time.monotonic()
+    recent = sum(1 for t in controller["completed"] if t >= now - RATE_WINDOW)
+    window = min(RATE_WINDOW, now - controller["started"]) or RATE_WINDOW
+    latency, baseline = controller["latency_ms"], controller["baseline_ms"]
+    return {
+        "name": controller["name"],
+        "limit": current_limit(controller),
+        "minimum": controller["minimum"],
+        "maximum": controller["maximum"],
+        "in_use": controller["in_use"],
+        "requests_per_s": round(recent / window, 2),
+        "latency_ms": round(latency) if latency is not None else None,
+        "baseline_ms": round(baseline) if baseline is not None else None,
+        **controller["stats"],
+    }
@@ -0,0 +1,99 @@
+import time
+from sentence_transformers import SentenceTransformer
+from ingest_to_pgvector_2 import connect_to_db, TABLE_NAME, LOCAL_MODEL_PATH, VECTOR_DIM
+from embedding_cache import open_cache, close_cache, cache_stats, encode_with_cache, model_identifier
+from embedding_migrations import SHADOW_COLUMN, start_migration, migration_coverage, cutover
+
+# Configuration
+TARGET_MODEL_PATH = "../../models/all-MiniLM-L6-v2"
+TARGET_DIM = 384
+BATCH_SIZE = 64
+# Fraction of wall time the job spends encoding and writing; it sleeps the rest
+# so query traffic on the same host and database keeps its latency.
+DUTY_CYCLE = 0.25
+ENCODE_THREADS = 1  # Torch threads for the background encoder
+CUTOVER_RETRY_SECONDS = 5
+
+
+def reembed_batch(cursor, table_name, model, cache, model_id, batch_size=BATCH_SIZE):
+    """
+    Fill the shadow column for the next batch of rows that lack it.
+    :return: Number of rows re-embedded (0 when the backfill has caught up).
+    """
+    cursor.execute(f"""
+        SELECT id, content FROM {table_name}
+        WHERE {SHADOW_COLUMN} IS NULL
+        ORDER BY id
+        LIMIT %s;
+    """, (batch_size,))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    texts = [content or "" for _, content in rows]
+    embeddings = encode_with_cache(
+        cache, model_id, texts,
+        lambda missing: model.encode(missing, batch_size=batch_size, show_progress_bar=False),
+    )
+    # Rows dual-written by a concurrent ingest keep the vector they were given
+    cursor.executemany(f"""
+        UPDATE {table_name} SET {SHADOW_COLUMN} = %s
+        WHERE id = %s AND {SHADOW_COLUMN} IS NULL;
+    """, [(embedding.tolist(), row_id) for (row_id, _), embedding in zip(rows, embeddings)])
+    return len(rows)
+
+
+def reembed_table(table_name=TABLE_NAME, model_path=TARGET_MODEL_PATH, dim=TARGET_DIM,
+                  batch_size=BATCH_SIZE, duty_cycle=DUTY_CYCLE):
+    """
+    Re-embed a pgvector table with a new model while search keeps running.
+
+    Vectors are written to a shadow column in throttled batches. Ingests that run
+    meanwhile dual-write both columns (see ingest_to_pgvector()). Once every row
+    has a shadow vector, the shadow column replaces the live one in a single
+    transaction.
+
+    :param table_name: Table to migrate.
+    :param model_path: New embedding model.
+    :param dim: Embedding dimension of the new model.
+    :param batch_size: Rows re-embedded per batch.
+    :param duty_cycle: Fraction of time spent working; the rest is spent sleeping.
+    """
+    import torch
+    torch.set_num_threads(ENCODE_THREADS)
+
+    print(f"### Re-embedding '{table_name}' with {model_path} ###")
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    start_migration(cursor, table_name, model_path, dim, LOCAL_MODEL_PATH, VECTOR_DIM)
+
+    model = SentenceTransformer(model_path)
+    cache = open_cache()
+    model_id = model_identifier(model_path)
+
+    try:
+        while True:
+            batch_start = time.perf_counter()
+            count = reembed_batch(cursor, table_name, model, cache, model_id, batch_size)
+            if count == 0:
+                if cutover(conn, table_name):
+                    break
+                # Rows were inserted without a shadow vector since the last batch
+                time.sleep(CUTOVER_RETRY_SECONDS)
+                continue
+
+            done, total = migration_coverage(cursor, table_name)
+            print(f"Re-embedded {done}/{total} rows ({done / max(total, 1):.1%})")
+            elapsed = time.perf_counter() - batch_start
+            time.sleep(elapsed * (1 - duty_cycle) / duty_cycle)
+    finally:
+        print(f"Embedding cache: {cache_stats(cache)}")
+        close_cache(cache)
+        cursor.close()
+        conn.close()
+
+    print(f"✅ Cutover complete: '{table_name}' now uses {model_path} ({dim}-d)")
+
+
+if __name__ == "__main__":
+    reembed_table()
@@ -0,0 +1,65 @@
+from urllib.parse import urlparse
+
+# Which requests a crawled page may make. Content is read from the DOM, and
+# images and documents are fetched separately, so the browser does not need
+# to load fonts, media or images, or talk to analytics and ad services.
+# Aborting those requests makes pages ready sooner.
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+# Rendering a page to PDF needs the page to look right
+PDF_BLOCKED_RESOURCE_TYPES = {"media"}
+BLOCKED_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "adobedtm.com", "omtrdc.net", "demdex.net", "everesttech.net", "newrelic.com", "nr-data.net",
+    "hotjar.com", "facebook.net", "facebook.com", "linkedin.com", "bing.com", "twitter.com",
+    "qualtrics.com", "tealiumiq.com", "optimizely.com", "quantummetric.com",
+)
+
+
+def new_request_policy(blocked_resource_types=None, allowed_domains=None, blocked_domains=BLOCKED_DOMAINS):
+    """
+    :param blocked_resource_types: Playwright resource types to abort (e.g. "image", "font").
+    :param allowed_domains: If set, requests to any other domain (and its subdomains) are aborted.
+    :param blocked_domains: Domains always aborted, e.g. analytics.
+    """
+    return {
+        "blocked_resource_types": set(BLOCKED_RESOURCE_TYPES if blocked_resource_types is None else blocked_resource_types),
+        "allowed_domains": tuple(allowed_domains) if allowed_domains else None,
+        "blocked_domains": tuple(blocked_domains),
+        "stats": {"allowed": 0, "blocked_type": 0, "blocked_domain": 0},
+    }
+
+
+def domain_matches(host, domains):
+    return any(host == domain or host.endswith(f".{domain}") for domain in domains)
+
+
+def block_reason(policy, resource_type, url):
+    """Return "blocked_type" or "blocked_domain" if the request should be aborted, else None."""
+    if resource_type in policy["blocked_resource_types"]:
+        return "blocked_type"
+    host = (urlparse(url).hostname or "").lower()
+    if not host:
+        return None  # data:, blob: and about: URLs
+    if domain_matches(host, policy["blocked_domains"]):
+        return "blocked_domain"
+    if policy["allowed_domains"] and not domain_matches(host, policy["allowed_domains"]):
+        return "blocked_domain"
+    return None
+
+
+async def route_request(route, policy):
+    """Playwright route handler applying a request policy."""
+    request = route.request
+    # Never abort the page itself, e.g. after a redirect to a login domain
+    reason = None if request.is_navigation_request() else block_reason(policy, request.resource_type, request.url)
+    if reason:
+        policy["stats"][reason] += 1
+        await route.abort()
+    else:
+        policy["stats"]["allowed"] += 1
+        await route.continue_()
+
+
+async def install_request_policy(context, policy):
+    """Apply a request policy to every page of a browser context."""
+    await context.route("**/*", lambda route: route_request(route, policy))
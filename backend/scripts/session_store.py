@@ -0,0 +1,81 @@
+import os
+import json
+import time
+from urllib.parse import urlparse
+
+# Persisted Playwright login sessions. After a successful login the browser
+# context's storage_state (cookies and local storage) is saved, and later runs
+# start from it instead of replaying the whole login. A saved session is only
+# used while its cookies are unexpired and it is younger than SESSION_MAX_AGE;
+# the caller then confirms it still works before relying on it.
+SESSION_MAX_AGE = 8 * 3600  # Seconds; enterprise SSO sessions rarely outlive a working day
+EXPIRY_MARGIN = 300  # Treat cookies expiring within this many seconds as expired
+# A page redirected to one of these means the session is gone
+LOGIN_HOSTS = ("ilogin.verizon.com",)  # Enterprise SSO
+LOGIN_PATHS = ("/signin",)  # Site sign-in pages, matched as whole path segments
+
+
+def save_session(path, storage_state):
+    """Write a storage_state readable only by the current user, since it holds session cookies."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"saved_at": time.time(), "storage_state": storage_state}, f)
+    os.replace(tmp_path, path)
+    print(f"Session saved to {path}")
+
+
+def session_expired(storage_state, saved_at, domains=None, now=None):
+    """
+    Return True if a saved session is too old or all of its cookies have expired.
+    :param domains: Only consider cookies of these domains (and subdomains), e.g. the site's own.
+    """
+    now = time.time() if now is None else now
+    if now - saved_at > SESSION_MAX_AGE:
+        return True
+    cookies = [
+        cookie for cookie in storage_state.get("cookies", [])
+        if not domains or any(cookie["domain"].lstrip(".").endswith(domain) for domain in domains)
+    ]
+    if not cookies:
+        return True
+    # Session cookies (expires -1) last as long as the saved state. Otherwise the
+    # session is only written off once every cookie has expired; whether the
+    # remaining ones still authenticate is for the caller's live check to tell.
+    return all(0 < cookie.get("expires", -1) < now + EXPIRY_MARGIN for cookie in cookies)
+
+
+def load_session(path, domains=None):
+    """Return a saved storage_state, or None if there is none or it has expired."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error reading session {path}: {e}")
+        return None
+    if session_expired(data["storage_state"], data["saved_at"], domains):
+        print(f"Saved session in {path} has expired")
+        return None
+    return data["storage_state"]
+
+
+def clear_session(path):
+    """Forget a saved session, e.g. after the site rejected it."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def is_login_url(url):
+    """
+    Return True if a navigation ended on a login page. Only the login hosts and
+    paths count, so content pages that merely mention logging in (say
+    /components/login-form) do not.
+    """
+    parsed = urlparse(url.lower())
+    if parsed.hostname in LOGIN_HOSTS:
+        return True
+    path = parsed.path.rstrip("/")
+    return any(path == login_path or path.startswith(f"{login_path}/") for login_path in LOGIN_PATHS)